@@ -6,27 +6,51 @@ Usage:
     python cli.py parse --gml <file.gml> --db <database.sqlite>
     python cli.py parse-dir --dir <folder> --db <database.sqlite>
     python cli.py build-wide --db <database.sqlite> --table <table_name>
+    python cli.py build-wide --db <database.sqlite> --table <table_name> --as-of 2020-12-31
     python cli.py pipeline --gml <file.gml> --db <database.sqlite>
     python cli.py imports --db <database.sqlite>
+    python cli.py imports --db <database.sqlite> --purge <import_id>
+    python cli.py imports --db <database.sqlite> --replace <import_id> --gml <file.gml>
+    python cli.py reparse --db <database.sqlite> --types budynek
+    python cli.py export --db <database.sqlite> --table <table_name> --out <file.csv.gz>
+    python cli.py pipeline --gml "data/*.gml" --shard-by namespace --shard-dir <dir>
+    python cli.py merge-shards --shard-dir <dir> --db <database.sqlite>
+    python cli.py watch --dir <drop_folder> --db <database.sqlite>
+    python cli.py search --db <database.sqlite> "Lublin Szkolna 78"
+    python cli.py serve --db <database.sqlite> --port 8080
+    python cli.py price-index --db <database.sqlite> --region woj_14
+    python cli.py dedup --db <database.sqlite>
 """
 import argparse
 import glob
 import logging
 import os
 import sqlite3
+import time
 
 from src import __version__
 from src.logging_config import setup_logging
-from src.load_rcn import load_rcn
-from src.build_wide import build_wide
+from src.load_rcn import load_rcn, load_parser_config
+from src.build_wide import build_wide, WIDE_PROFILES
+from src.direct_wide import build_wide_direct
+from src.reparse import reparse
+from src.export import export_table, parse_bbox, WRITERS
 from src.import_meta import get_imports, ensure_import_meta_schema
+from src.purge import purge_import
+from src.shards import load_sharded, merge_shards, SHARD_KEYS
+from src.watch import watch
+from src.search import search, build_address_index, has_address_index
+from src.dedup import resolve_duplicates, DUPLICATES_TABLE
+from src.price_index import build_price_index, update_price_index, has_price_index, REGION_KEYS
+from src.serve import serve
 
 logger = logging.getLogger("rcn")
 
 
-def _parse_gml_files(gml_pattern: str, db: str, batch: int, log_every: int, force: bool) -> dict:
+def _parse_gml_files(gml_pattern: str, db: str, batch: int, log_every: int, force: bool, **load_options) -> dict:
     """
     Parse GML file(s) matching pattern into SQLite database.
+    Extra keyword arguments are passed to load_rcn().
 
     Returns dict with 'imported', 'skipped', 'files' counts.
     """
@@ -44,7 +68,7 @@ def _parse_gml_files(gml_pattern: str, db: str, batch: int, log_every: int, forc
 
     for gml_file in sorted(files):
         logger.info(f">>> Processing: {os.path.basename(gml_file)}")
-        result = load_rcn(gml_file, db, batch, log_every, force)
+        result = load_rcn(gml_file, db, batch, log_every, force, **load_options)
         if result.get("skipped"):
             logger.warning(f"Skipped: {result.get('reason')}")
             total_skipped += 1
@@ -61,34 +85,246 @@ def _parse_gml_files(gml_pattern: str, db: str, batch: int, log_every: int, forc
     return {"imported": total_imported, "skipped": total_skipped, "files": len(files)}
 
 
+def _load_options(args) -> dict:
+    """Collect load_rcn() options shared by parse and pipeline."""
+    return {
+        "profile": args.profile,
+        "profile_dir": args.profile_dir,
+        "metrics": args.metrics,
+        "metrics_every": args.metrics_every,
+        "memory_budget_mb": args.memory_budget,
+        "flush_target_seconds": args.flush_target,
+        "types": args.types.split(",") if args.types else None,
+        "limit": args.max_features,
+        "parser_config": load_parser_config(args.parser_config) if args.parser_config else None,
+        "check_refs": not args.no_ref_check,
+        "ref_spill_threshold": args.ref_spill,
+        "wal": args.wal,
+        "commit_seconds": args.commit_every,
+    }
+
+
+def _add_load_arguments(p: argparse.ArgumentParser) -> None:
+    """Add load_rcn() options shared by parse and pipeline."""
+    p.add_argument("--profile", action="store_true", help="Collect timings per feature type and stage (stored in _import_timings)")
+    p.add_argument("--profile-dir", default=None, help="Also write cProfile/tracemalloc dumps to this directory")
+    p.add_argument("--metrics", default=None, help="JSON-lines metrics sink: file path, \"-\" for stdout or \"fd:N\"")
+    p.add_argument("--metrics-every", type=int, default=100000, help="Emit a metrics record every N features")
+    p.add_argument("--memory-budget", type=float, default=None, help="Flush when buffered rows take approx. this many MB")
+    p.add_argument("--flush-target", type=float, default=2.0, help="Desired flush latency in seconds (with --memory-budget)")
+    p.add_argument("--parser-config", default=None, help="JSON file selecting columns per feature type (see README)")
+    p.add_argument("--no-ref-check", action="store_true", help="Skip the referential integrity report")
+    p.add_argument("--ref-spill", type=int, default=5_000_000, help="Ids kept in memory by the reference check before spilling to disk")
+    p.add_argument("--types", default=None, help="Import only these feature types, comma-separated (e.g. \"RCN_Transakcja,RCN_Lokal\" or \"transakcja,lokal\")")
+    p.add_argument("--wal", action="store_true", help="WAL mode with bounded checkpoints: readers can query during the import")
+    p.add_argument("--commit-every", type=float, default=None, help="Also commit every N seconds (time-bounded transactions)")
+    p.add_argument("--shard-by", choices=SHARD_KEYS, default=None, help="Split rows into one database per namespace / voivodeship in --shard-dir")
+    p.add_argument("--shard-dir", default="shards", help="Directory of the shard databases (with --shard-by)")
+    p.add_argument("--workers", type=int, default=None, help="Shard processes (with --shard-by; default: CPU count)")
+
+
+def _sharded(args, wide_table: str | None = None) -> dict:
+    """parse / pipeline --shard-by: import (and wide-build) shards in parallel processes."""
+    files = sorted(glob.glob(args.gml)) if '*' in args.gml else [args.gml]
+    if not files:
+        logger.warning(f"No GML files found matching: {args.gml}")
+        return {"shards": {}}
+    return load_sharded(files, args.shard_dir, args.shard_by, args.workers, args.batch, args.log_every, args.force,
+                        wide_table=wide_table, wide_profile=getattr(args, "wide_profile", "full"),
+                        **_load_options(args))
+
+
 def cmd_parse(args):
     """Parse GML file(s) and load into raw SQLite tables."""
-    _parse_gml_files(args.gml, args.db, args.batch, args.log_every, args.force)
+    if args.shard_by:
+        _sharded(args)
+        return
+    _parse_gml_files(args.gml, args.db, args.batch, args.log_every, args.force, **_load_options(args))
 
 
 def cmd_build_wide(args):
     """Build denormalized wide table from raw tables."""
-    result = build_wide(args.db, args.table, args.limit, args.drop, args.timeout)
-    logger.info(f"Created table: {result['table']} ({result['row_count']} rows)")
+    result = build_wide(args.db, args.table, args.limit, args.drop, args.timeout, args.profile, args.as_of,
+                        args.exclude_duplicates)
+    as_of = f", as of {result['as_of']}" if result["as_of"] else ""
+    logger.info(f"Created table: {result['table']} ({result['row_count']} rows{as_of})")
+
+
+def _direct_wide(args):
+    """pipeline --direct-wide: GML file(s) straight into the wide table."""
+    files = sorted(glob.glob(args.gml)) if '*' in args.gml else [args.gml]
+    if not files:
+        logger.warning(f"No GML files found matching: {args.gml}")
+        return
+    rows = 0
+    for i, gml_file in enumerate(files):
+        logger.info(f">>> Processing: {os.path.basename(gml_file)}")
+        result = build_wide_direct(gml_file, args.db, args.table, args.wide_profile, drop=(i == 0),
+                                   batch_size=args.batch, cache_size=args.cache, log_every=args.log_every)
+        rows += result["rows"]
+    logger.info(f"Pipeline done. Wide table: {args.table} ({rows} rows, no raw tables)")
 
 
 def cmd_pipeline(args):
     """Run full pipeline: parse GML -> build wide table."""
+    if args.direct_wide:
+        _direct_wide(args)
+        return
+    if args.shard_by:
+        result = _sharded(args, wide_table=args.table)
+        touched = [s for s, stats in result["shards"].items() if stats["wide_rows"] is not None]
+        if args.merge and touched:
+            merge_shards(args.shard_dir, args.db, args.table, shards=touched, timeout=args.timeout)
+        logger.info(f"Pipeline done. {len(result['shards'])} shard(s) in {args.shard_dir}, "
+                    f"wide table rebuilt in {len(touched)}")
+        return
 
     # Step 1: Parse GML files
-    parse_result = _parse_gml_files(args.gml, args.db, args.batch, args.log_every, args.force)
+    parse_result = _parse_gml_files(args.gml, args.db, args.batch, args.log_every, args.force, **_load_options(args))
 
     if parse_result["files"] == 0:
         return  # No files to process, skip building wide table
 
     # Step 2: Build wide table
     logger.info(">>> Building wide table...")
-    result = build_wide(args.db, args.table, args.limit, drop=True, timeout=args.timeout)
+    result = build_wide(args.db, args.table, args.limit, drop=True, timeout=args.timeout, profile=args.wide_profile)
     logger.info(f"Pipeline done. Wide table: {result['table']} ({result['row_count']} rows)")
 
 
+def cmd_reparse(args):
+    """Re-extract raw table columns from stored raw_xml."""
+    reparse(
+        args.db,
+        types=args.types.split(",") if args.types else None,
+        import_ids=[int(i) for i in args.import_id.split(",")] if args.import_id else None,
+        workers=args.workers,
+        batch_size=args.batch,
+        restart=args.restart,
+        parser_config=load_parser_config(args.parser_config) if args.parser_config else None,
+    )
+
+
+def cmd_export(args):
+    """Stream a raw or wide table to CSV / NDJSON file(s)."""
+    result = export_table(args.db, args.table, args.out, args.format, args.rotate_rows, args.arraysize, args.log_every,
+                          bbox=args.bbox, wgs84=args.wgs84)
+    logger.info(f"Exported {result['rows']} rows to {len(result['files'])} file(s)")
+
+
+def cmd_merge_shards(args):
+    """Copy a table of all (or some) shard databases into one database."""
+    result = merge_shards(args.shard_dir, args.db, args.table,
+                          shards=args.shards.split(",") if args.shards else None, timeout=args.timeout)
+    logger.info(f"Merged {sum(result['copied'].values())} rows from {len(result['copied'])} shard(s) into {args.db}")
+
+
+def cmd_watch(args):
+    """Import GML files landing in a drop folder, then refresh the wide table."""
+    watch(args.dir, args.db, once=args.once, pattern=args.pattern, interval=args.interval, settle=args.settle,
+          table=None if args.no_wide else args.table, wide_profile=args.wide_profile,
+          batch_size=args.batch, log_every=args.log_every, force=args.force,
+          wal=args.wal, commit_seconds=args.commit_every,
+          parser_config=load_parser_config(args.parser_config) if args.parser_config else None)
+
+
+def cmd_serve(args):
+    """Serve read-only JSON queries over HTTP."""
+    serve(args.db, args.host, args.port, table=args.table, pool_size=args.pool, cache_size=args.cache,
+          mmap_size=args.mmap_mb << 20)
+
+
+def cmd_search(args):
+    """Find transactions by address (FTS5 index over raw_adres)."""
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.build or not has_address_index(conn):
+            build_address_index(conn)
+        if not args.query:
+            return
+        start = time.perf_counter()
+        rows = search(conn, " ".join(args.query), args.limit, args.table)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    finally:
+        conn.close()
+
+    for row in rows:
+        address = " ".join(str(row[k]) for k in ("miejscowosc", "ulica", "numer_porzadkowy") if row.get(k))
+        price = row.get("cena_transakcji_brutto")
+        logger.info(f"{row.get('transakcja_data_wpisu') or '-':<12} {price if price is not None else '-':>14} "
+                    f"{row['via']:<8} {address}  ({row.get('transakcja_id')})")
+    logger.info(f"{len(rows)} row(s) in {elapsed_ms:.1f}ms")
+
+
+def cmd_price_index(args):
+    """Build or update the repeat-sales price index and show it."""
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.rebuild or not has_price_index(conn):
+            types = None if args.transaction_types == "all" else tuple(int(t) for t in args.transaction_types.split(","))
+            build_price_index(conn, args.region_by, types)
+        else:
+            update_price_index(conn)
+        if args.region:
+            rows = conn.execute("SELECT month, index_value, pairs FROM price_index WHERE region = ? ORDER BY month",
+                                (args.region,)).fetchall()
+            for month, value, pairs in rows:
+                logger.info(f"{month}  {value:>9.2f}  {pairs:>6}")
+            return
+        rows = conn.execute("""
+            SELECT region, MIN(month), MAX(month), COUNT(*),
+                   (SELECT COUNT(*) FROM price_index_pairs p WHERE p.region = i.region),
+                   (SELECT index_value FROM price_index l WHERE l.region = i.region ORDER BY month DESC LIMIT 1)
+              FROM price_index i GROUP BY region ORDER BY region
+        """).fetchall()
+    finally:
+        conn.close()
+
+    for region, first, last, months, pairs, value in rows:
+        logger.info(f"{region:<28} {first} .. {last}  {months:>4} months  {pairs:>8} pairs  last {value:.2f}")
+
+
+def cmd_dedup(args):
+    """Find transactions repeated across imports (same number, price, deed and date)."""
+    conn = sqlite3.connect(args.db)
+    try:
+        result = resolve_duplicates(conn)
+        update_price_index(conn)
+        rows = conn.execute(f"""
+            SELECT d.canonical_id, COUNT(*), GROUP_CONCAT(d.transakcja_id, ' ')
+              FROM {DUPLICATES_TABLE} d GROUP BY d.canonical_id ORDER BY COUNT(*) DESC, d.canonical_id LIMIT ?
+        """, (args.show,)).fetchall()
+    finally:
+        conn.close()
+
+    for canonical_id, count, duplicates in rows:
+        logger.info(f"{canonical_id}  +{count}: {duplicates}")
+    logger.info(f"{result['duplicates']} duplicate(s) in {result['clusters']} cluster(s); "
+                f"rebuild the wide table to mark them (build-wide --drop [--exclude-duplicates])")
+
+
+def _purge_or_replace(args):
+    """imports --purge ID / --replace ID --gml FILE"""
+    if args.replace is not None and not args.gml:
+        raise SystemExit("--replace needs --gml")
+    import_id = args.purge if args.purge is not None else args.replace
+    if args.replace is not None:
+        # load first: re-delivered rows move to the new import, the purge then removes only
+        # rows the new file no longer has; a failed load leaves the old import in place
+        logger.info(f">>> Re-importing: {os.path.basename(args.gml)}")
+        result = load_rcn(args.gml, args.db, batch_size=args.batch, force=True)
+        purge_import(args.db, import_id, chunk_size=args.chunk, pause=args.pause)
+        logger.info(f"Import {import_id} replaced by import {result['import_id']} ({result.get('inserted', 0)} records)")
+    else:
+        purge_import(args.db, import_id, chunk_size=args.chunk, pause=args.pause)
+    logger.info("Wide tables only lost the purged rows; rebuild them with build-wide --drop")
+
+
 def cmd_imports(args):
-    """Show import history."""
+    """Show import history, or purge / replace an import."""
+    if args.purge is not None or args.replace is not None:
+        _purge_or_replace(args)
+        return
+
     conn = sqlite3.connect(args.db)
     ensure_import_meta_schema(conn)
     imports = get_imports(conn)
@@ -134,6 +370,8 @@ def main():
     p_parse.add_argument("--batch", type=int, default=100000, help="Batch size for inserts")
     p_parse.add_argument("--log-every", type=int, default=500000, help="Log progress every N features")
     p_parse.add_argument("--force", action="store_true", help="Force re-import even if file was already imported")
+    p_parse.add_argument("--limit", dest="max_features", type=int, default=None, help="Stop reading after N (selected) features")
+    _add_load_arguments(p_parse)
     p_parse.set_defaults(func=cmd_parse)
 
     # build-wide subcommand
@@ -143,6 +381,11 @@ def main():
     p_wide.add_argument("--limit", type=int, default=None, help="Limit rows (for testing)")
     p_wide.add_argument("--drop", action="store_true", help="Drop table if exists")
     p_wide.add_argument("--timeout", type=int, default=30, help="SQLite busy timeout (seconds)")
+    p_wide.add_argument("--profile", choices=list(WIDE_PROFILES), default="full", help="Wide table column profile")
+    p_wide.add_argument("--as-of", default=None, metavar="DATE",
+                        help="Reconstruct the table for a past date (YYYY-MM-DD) from the version history")
+    p_wide.add_argument("--exclude-duplicates", action="store_true",
+                        help="Leave out duplicate transactions (see dedup); otherwise marked in duplicate_of")
     p_wide.set_defaults(func=cmd_build_wide)
 
     # pipeline subcommand (parse + build-wide)
@@ -155,13 +398,112 @@ def main():
     p_pipe.add_argument("--limit", type=int, default=None, help="Limit wide table rows (for testing)")
     p_pipe.add_argument("--timeout", type=int, default=30, help="SQLite busy timeout (seconds)")
     p_pipe.add_argument("--force", action="store_true", help="Force re-import even if file was already imported")
+    p_pipe.add_argument("--direct-wide", action="store_true", help="Stream GML straight into the wide table (no raw tables)")
+    p_pipe.add_argument("--cache", type=int, default=1_000_000, help="--direct-wide: features kept in memory before spilling to disk")
+    p_pipe.add_argument("--wide-profile", choices=list(WIDE_PROFILES), default="full", help="Wide table column profile")
+    p_pipe.add_argument("--merge", action="store_true", help="--shard-by: copy the wide tables of rebuilt shards into --db")
+    p_pipe.add_argument("--parse-limit", dest="max_features", type=int, default=None, help="Stop reading each GML after N (selected) features")
+    _add_load_arguments(p_pipe)
     p_pipe.set_defaults(func=cmd_pipeline)
 
     # imports subcommand
     p_imports = subparsers.add_parser("imports", help="Show import history")
     p_imports.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite database")
+    p_imports.add_argument("--purge", type=int, default=None, metavar="ID", help="Delete all rows of this import")
+    p_imports.add_argument("--replace", type=int, default=None, metavar="ID", help="Purge this import and import --gml instead")
+    p_imports.add_argument("--gml", default=None, help="GML file for --replace")
+    p_imports.add_argument("--chunk", type=int, default=10000, help="Rows deleted per transaction")
+    p_imports.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between chunks")
+    p_imports.add_argument("--batch", type=int, default=100000, help="Batch size for inserts (--replace)")
     p_imports.set_defaults(func=cmd_imports)
 
+    # reparse subcommand
+    p_reparse = subparsers.add_parser("reparse", help="Re-extract raw table columns from stored raw_xml")
+    p_reparse.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite database")
+    p_reparse.add_argument("--types", default=None, help="Feature types, comma-separated (default: all)")
+    p_reparse.add_argument("--import-id", default=None, help="Only rows of these import ids, comma-separated")
+    p_reparse.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count, 1 = no pool)")
+    p_reparse.add_argument("--batch", type=int, default=10000, help="Rows per chunk and transaction")
+    p_reparse.add_argument("--restart", action="store_true", help="Ignore stored progress and start from the first row")
+    p_reparse.add_argument("--parser-config", default=None, help="JSON file selecting columns to re-extract (see README)")
+    p_reparse.set_defaults(func=cmd_reparse)
+
+    # export subcommand
+    p_export = subparsers.add_parser("export", help="Export a raw or wide table to CSV / NDJSON")
+    p_export.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite database")
+    p_export.add_argument("--table", default="rcn_wide", help="Table to export (raw or wide)")
+    p_export.add_argument("--out", required=True, help="Output file; \".gz\" suffix enables gzip (e.g. out/rcn_wide.csv.gz)")
+    p_export.add_argument("--format", choices=list(WRITERS), default="csv", help="Output format")
+    p_export.add_argument("--rotate-rows", type=int, default=None, help="Split output into numbered parts of N rows")
+    p_export.add_argument("--arraysize", type=int, default=10000, help="Rows fetched per batch")
+    p_export.add_argument("--log-every", type=int, default=1000000, help="Log export rate every N rows")
+    p_export.add_argument("--bbox", type=parse_bbox, default=None, help="Only rows intersecting min_x,min_y,max_x,max_y (EPSG:2178, x = easting)")
+    p_export.add_argument("--wgs84", action="store_true", help="geojsonseq: reproject coordinates from EPSG:2178 to WGS84")
+    p_export.set_defaults(func=cmd_export)
+
+    # merge-shards subcommand
+    p_merge = subparsers.add_parser("merge-shards", help="Copy a table of the shard databases into one database")
+    p_merge.add_argument("--shard-dir", default="shards", help="Directory of the shard databases")
+    p_merge.add_argument("--db", default="rcn_wide.sqlite", help="Merged SQLite database")
+    p_merge.add_argument("--table", default="rcn_wide", help="Table to merge")
+    p_merge.add_argument("--shards", default=None, help="Only replace rows of these shards, comma-separated (default: rebuild from all)")
+    p_merge.add_argument("--timeout", type=int, default=30, help="SQLite busy timeout (seconds)")
+    p_merge.set_defaults(func=cmd_merge_shards)
+
+    # search subcommand
+    p_search = subparsers.add_parser("search", help="Find transactions by address")
+    p_search.add_argument("query", nargs="*", help="Address terms, e.g. \"Lublin Szkolna 78\" (prefixes match)")
+    p_search.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite database")
+    p_search.add_argument("--table", default="rcn_wide", help="Wide table joined to the matching addresses")
+    p_search.add_argument("--limit", type=int, default=50, help="Max rows")
+    p_search.add_argument("--build", action="store_true", help="Rebuild the address index (built on first search otherwise)")
+    p_search.set_defaults(func=cmd_search)
+
+    # dedup subcommand
+    p_dedup = subparsers.add_parser("dedup", help="Find duplicate transactions across imports")
+    p_dedup.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite database")
+    p_dedup.add_argument("--show", type=int, default=10, help="Largest clusters listed")
+    p_dedup.set_defaults(func=cmd_dedup)
+
+    # price-index subcommand
+    p_price = subparsers.add_parser("price-index", help="Repeat-sales price index per region and month")
+    p_price.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite database")
+    p_price.add_argument("--rebuild", action="store_true", help="Rebuild the index tables (built on first run, updated after imports)")
+    p_price.add_argument("--region-by", choices=REGION_KEYS, default="voivodeship", help="Region of a sale (used when building)")
+    p_price.add_argument("--transaction-types", default="1", help="rodzaj_transakcji codes used, comma-separated, or \"all\" (used when building)")
+    p_price.add_argument("--region", default=None, help="Show the monthly index of this region")
+    p_price.set_defaults(func=cmd_price_index)
+
+    # watch subcommand
+    p_watch = subparsers.add_parser("watch", help="Import GML files as they land in a folder")
+    p_watch.add_argument("--dir", required=True, help="Drop folder to watch")
+    p_watch.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite database")
+    p_watch.add_argument("--pattern", default="*.gml", help="File name pattern")
+    p_watch.add_argument("--interval", type=float, default=5.0, help="Seconds between folder polls")
+    p_watch.add_argument("--settle", type=float, default=10.0, help="Seconds a file must stay unchanged before it is imported")
+    p_watch.add_argument("--table", default="rcn_wide", help="Wide table refreshed after imports")
+    p_watch.add_argument("--wide-profile", choices=list(WIDE_PROFILES), default="full", help="Wide table column profile")
+    p_watch.add_argument("--no-wide", action="store_true", help="Do not refresh the wide table")
+    p_watch.add_argument("--batch", type=int, default=100000, help="Batch size for inserts")
+    p_watch.add_argument("--log-every", type=int, default=500000, help="Log progress every N features")
+    p_watch.add_argument("--force", action="store_true", help="Re-import files that were already imported")
+    p_watch.add_argument("--wal", action="store_true", help="WAL mode with bounded checkpoints: readers can query during imports")
+    p_watch.add_argument("--commit-every", type=float, default=None, help="Also commit every N seconds (time-bounded transactions)")
+    p_watch.add_argument("--parser-config", default=None, help="JSON file selecting columns per feature type (see README)")
+    p_watch.add_argument("--once", action="store_true", help="Import the files present now, then exit")
+    p_watch.set_defaults(func=cmd_watch)
+
+    # serve subcommand
+    p_serve = subparsers.add_parser("serve", help="HTTP query service (transactions, search, bbox, stats)")
+    p_serve.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite database")
+    p_serve.add_argument("--host", default="127.0.0.1", help="Listen address")
+    p_serve.add_argument("--port", type=int, default=8080, help="Listen port")
+    p_serve.add_argument("--table", default="rcn_wide", help="Wide table")
+    p_serve.add_argument("--pool", type=int, default=4, help="Read-only connections")
+    p_serve.add_argument("--cache", type=int, default=1024, help="Cached results (0 = off)")
+    p_serve.add_argument("--mmap-mb", type=int, default=256, help="PRAGMA mmap_size of the connections (MB)")
+    p_serve.set_defaults(func=cmd_serve)
+
     args = parser.parse_args()
     args.func(args)
 
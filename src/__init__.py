@@ -6,5 +6,6 @@ __version__ = "0.1.0"
 
 from src.load_rcn import load_rcn
 from src.build_wide import build_wide
+from src.reader import read
 
-__all__ = ["load_rcn", "build_wide", "__version__"]
+__all__ = ["load_rcn", "build_wide", "read", "__version__"]
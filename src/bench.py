@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the RCN import path.
+
+Times count_features, iter_features, per-parser parse, insert_many and build_wide
+separately and stores features/sec and peak RSS in a JSON baseline, so that
+later runs can be compared against it.
+
+Usage:
+    python -m src.bench --gml rcn.gml --out bench.json
+    python -m src.bench --generate 50MB --out bench.json
+    python -m src.bench --gml rcn.gml --compare bench.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from src import __version__
+from src.utils import local, peak_rss_mb
+
+logger = logging.getLogger("rcn")
+
+STAGES = ("count_features", "iter_features", "parse", "insert_many", "build_wide")
+
+
+def _rate(count: int, seconds: float) -> float | None:
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+def _stage_count_features(gml_path: str) -> dict:
+    from src.load_rcn import count_features
+    start = time.perf_counter()
+    total = count_features(gml_path)
+    elapsed = time.perf_counter() - start
+    return {"count_features": {"seconds": elapsed, "features": total,
+                               "features_per_sec": _rate(total, elapsed), "peak_rss_mb": peak_rss_mb()}}
+
+
+def _stage_iter_features(gml_path: str) -> dict:
+    from src.load_rcn import iter_features
+    total = 0
+    start = time.perf_counter()
+    for _ in iter_features(gml_path):
+        total += 1
+    elapsed = time.perf_counter() - start
+    return {"iter_features": {"seconds": elapsed, "features": total,
+                              "features_per_sec": _rate(total, elapsed), "peak_rss_mb": peak_rss_mb()}}
+
+
+def _stage_parse_insert(gml_path: str, db_path: str, batch_size: int) -> dict:
+    """
+    Single pass over the file: parse every feature and insert rows into a fresh DB.
+    parse() and insert_many() are timed separately, per feature type.
+    """
+    from src.load_rcn import PARSERS, iter_features
+
+    conn = sqlite3.connect(db_path)
+    for p in PARSERS.values():
+        p.ensure_schema(conn)
+    conn.commit()
+
+    parse_time = {ft: 0.0 for ft in PARSERS}
+    parse_count = {ft: 0 for ft in PARSERS}
+    insert_time = {ft: 0.0 for ft in PARSERS}
+    insert_count = {ft: 0 for ft in PARSERS}
+    commit_time = 0.0
+    buffers = {ft: [] for ft in PARSERS}
+    buffered = 0
+
+    def flush():
+        nonlocal commit_time, buffered
+        for ft, buf in buffers.items():
+            if not buf:
+                continue
+            t0 = time.perf_counter()
+            insert_count[ft] += PARSERS[ft].insert_many(conn, buf)
+            insert_time[ft] += time.perf_counter() - t0
+            buf.clear()
+        t0 = time.perf_counter()
+        conn.commit()
+        commit_time += time.perf_counter() - t0
+        buffered = 0
+
+    for feature in iter_features(gml_path):
+        ftype = local(feature.tag)
+        p = PARSERS.get(ftype)
+        if not p:
+            continue
+        t0 = time.perf_counter()
+        row = p.parse(feature)
+        parse_time[ftype] += time.perf_counter() - t0
+        parse_count[ftype] += 1
+        if row is not None:
+            buffers[ftype].append(row + (0,))
+            buffered += 1
+            if buffered >= batch_size:
+                flush()
+    flush()
+    conn.close()
+
+    rss = peak_rss_mb()
+    total_parsed = sum(parse_count.values())
+    total_parse_time = sum(parse_time.values())
+    total_inserted = sum(insert_count.values())
+    total_insert_time = sum(insert_time.values()) + commit_time
+    return {
+        "parse": {
+            "seconds": total_parse_time, "features": total_parsed,
+            "features_per_sec": _rate(total_parsed, total_parse_time), "peak_rss_mb": rss,
+            "by_type": {ft: {"seconds": parse_time[ft], "features": parse_count[ft],
+                             "features_per_sec": _rate(parse_count[ft], parse_time[ft])}
+                        for ft in PARSERS if parse_count[ft]},
+        },
+        "insert_many": {
+            "seconds": total_insert_time, "features": total_inserted,
+            "features_per_sec": _rate(total_inserted, total_insert_time), "peak_rss_mb": rss,
+            "commit_seconds": commit_time,
+            "by_type": {ft: {"seconds": insert_time[ft], "features": insert_count[ft],
+                             "features_per_sec": _rate(insert_count[ft], insert_time[ft])}
+                        for ft in PARSERS if insert_count[ft]},
+        },
+    }
+
+
+def _stage_build_wide(db_path: str) -> dict:
+    from src.build_wide import build_wide
+    start = time.perf_counter()
+    result = build_wide(db_path, "rcn_wide", drop=True)
+    elapsed = time.perf_counter() - start
+    rows = result["row_count"]
+    return {"build_wide": {"seconds": elapsed, "features": rows,
+                           "features_per_sec": _rate(rows, elapsed), "peak_rss_mb": peak_rss_mb()}}
+
+
+def _run_stage(isolate: bool, func, *args) -> dict:
+    """
+    Run a benchmark stage. With isolate=True the stage runs in a fresh process,
+    so peak RSS is measured per stage and not as a high-water mark of the whole run.
+    """
+    if not isolate:
+        return func(*args)
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+def run_benchmark(gml_path: str, db_path: str | None = None, batch_size: int = 100000,
+                  isolate: bool = True) -> dict:
+    """
+    Benchmark all import stages on a GML file.
+
+    Args:
+        gml_path: Path to the RCN GML file
+        db_path: SQLite DB used for insert_many/build_wide (temporary file if None)
+        batch_size: Rows buffered before each insert_many/commit
+        isolate: Run every stage in a separate process (per-stage peak RSS)
+
+    Returns:
+        dict with run metadata and per-stage results
+    """
+    tmp_dir = None
+    if db_path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp_dir.name, "bench.sqlite")
+    elif os.path.exists(db_path):
+        os.unlink(db_path)
+
+    logger.info(f"Benchmarking {gml_path} ({os.path.getsize(gml_path) / 1_000_000:.1f}MB)")
+    stages = {}
+    try:
+        stages.update(_run_stage(isolate, _stage_count_features, gml_path))
+        stages.update(_run_stage(isolate, _stage_iter_features, gml_path))
+        stages.update(_run_stage(isolate, _stage_parse_insert, gml_path, db_path, batch_size))
+        stages.update(_run_stage(isolate, _stage_build_wide, db_path))
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    for name in STAGES:
+        s = stages[name]
+        logger.info(f"[bench] {name}: {s['seconds']:.2f}s, {s['features_per_sec']} features/s, peak_rss={s['peak_rss_mb']}MB")
+
+    return {
+        "rcn2sql_version": __version__,
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "gml": os.path.basename(gml_path),
+        "file_size": os.path.getsize(gml_path),
+        "batch_size": batch_size,
+        "isolated": isolate,
+        "stages": stages,
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float = 0.1) -> list[str]:
+    """
+    Compare benchmark result with a baseline.
+
+    Returns a list of regressions: stages slower (features/sec) or using more
+    memory (peak RSS) than the baseline by more than `tolerance` (fraction).
+    """
+    regressions = []
+    for name in STAGES:
+        cur = result["stages"].get(name)
+        base = baseline.get("stages", {}).get(name)
+        if not cur or not base:
+            continue
+        if cur.get("features_per_sec") and base.get("features_per_sec"):
+            ratio = cur["features_per_sec"] / base["features_per_sec"]
+            logger.info(f"[compare] {name}: {ratio:.2f}x throughput vs baseline")
+            if ratio < 1 - tolerance:
+                regressions.append(f"{name}: features/sec {cur['features_per_sec']} < baseline {base['features_per_sec']}")
+        if cur.get("peak_rss_mb") and base.get("peak_rss_mb"):
+            if cur["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+                regressions.append(f"{name}: peak RSS {cur['peak_rss_mb']:.0f}MB > baseline {base['peak_rss_mb']:.0f}MB")
+    return regressions
+
+
+def main() -> None:
+    from src.logging_config import setup_logging
+    from src.synth import generate_gml, _parse_size
+    setup_logging()
+
+    ap = argparse.ArgumentParser(description="Benchmark RCN import stages")
+    src_group = ap.add_mutually_exclusive_group(required=True)
+    src_group.add_argument("--gml", help="Path to the RCN GML file")
+    src_group.add_argument("--generate", type=_parse_size, help="Generate a synthetic GML of this size (e.g. 50MB)")
+    ap.add_argument("--seed", type=int, default=0, help="Seed for --generate")
+    ap.add_argument("--db", default=None, help="SQLite DB for insert/build stages (temporary if omitted)")
+    ap.add_argument("--batch", type=int, default=100000, help="Batch size for inserts")
+    ap.add_argument("--no-isolate", action="store_true", help="Run all stages in this process")
+    ap.add_argument("--out", default=None, help="Write results as JSON baseline")
+    ap.add_argument("--compare", default=None, help="Compare with a JSON baseline")
+    ap.add_argument("--tolerance", type=float, default=0.1, help="Allowed regression (fraction)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gml_path = args.gml
+        if args.generate:
+            gml_path = os.path.join(tmp, "synthetic.gml")
+            logger.info(f"Generating synthetic GML ({args.generate / 1_000_000:.0f}MB, seed={args.seed})...")
+            generate_gml(gml_path, target_bytes=args.generate, seed=args.seed)
+        result = run_benchmark(gml_path, args.db, args.batch, isolate=not args.no_isolate)
+        if args.generate:
+            result["generated"] = {"bytes": args.generate, "seed": args.seed}
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        for r in regressions:
+            logger.warning(f"[regression] {r}")
+        if regressions:
+            sys.exit(1)
+        logger.info("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,99 +1,243 @@
 #!/usr/bin/env python3
 import argparse
 import logging
+import re
 import sqlite3
 import time
 
+from src.wal import is_wal, ensure_completed_views
 
 logger = logging.getLogger("rcn")
 
 
-def build_select_sql(limit: int | None) -> str:
-    base_sql = """
-    SELECT
-        tx.id AS transakcja_id,
-        tx.nieruchomosc_fk,
-        tx.dokument_fk,
-        tx.cena_transakcji_brutto,
-        tx.data_wpisu AS transakcja_data_wpisu,
-        tx.import_id,
-
-        nier.id AS nieruchomosc_id,
-        nier.rodzaj_nieruchomosci,
-        nier.rodzaj_prawa_do_nieruchomosci,
-        nier.udzial_w_prawie_do_nieruchomosci,
-        nier.cena_nieruchomosci_brutto,
-        nier.data_wpisu AS nieruchomosc_data_wpisu,
-
-        dok.id AS dokument_id,
-        dok.oznaczenie_dokumentu,
-        dok.data_sporzadzenia_dokumentu,
-        dok.tworca_dokumentu,
-
-        dzi.id AS dzialka_id,
-        dzi.id_dzialki,
-        dzi.pole_powierzchni_ewidencyjnej,
-        dzi.sposob_uzytkowania,
-
-        bud.id AS budynek_id,
-        bud.id_budynku,
-        bud.liczba_kondygnacji,
-        bud.liczba_mieszkan,
-        bud.rodzaj_budynku,
-
-        lok.id AS lokal_id,
-        lok.id_lokalu,
-        lok.numer_lokalu,
-        lok.funkcja_lokalu,
-        lok.liczba_izb,
-        lok.nr_kondygnacji,
-        lok.pow_uzytkowo_lokalu,
-        lok.cena_lokalu_brutto,
-
-        adr_dzi.id AS adres_dzialki_id,
-        adr_dzi.miejscowosc AS adres_dzialki_miejscowosc,
-        adr_dzi.ulica AS adres_dzialki_ulica,
-        adr_dzi.numer_porzadkowy AS adres_dzialki_numer,
-
-        adr_bud.id AS adres_budynku_id,
-        adr_bud.miejscowosc AS adres_budynku_miejscowosc,
-        adr_bud.ulica AS adres_budynku_ulica,
-        adr_bud.numer_porzadkowy AS adres_budynku_numer,
-
-        adr_lok.id AS adres_lokalu_id,
-        adr_lok.miejscowosc AS adres_lokalu_miejscowosc,
-        adr_lok.ulica AS adres_lokalu_ulica,
-        adr_lok.numer_porzadkowy AS adres_lokalu_numer
-    FROM raw_transakcja tx
-    LEFT JOIN raw_nieruchomosc nier ON tx.nieruchomosc_fk = nier.id
-    LEFT JOIN raw_dokument dok ON tx.dokument_fk = dok.id
-    LEFT JOIN raw_nieruchomosc_dzialka nd ON nier.id = nd.nieruchomosc_id
-    LEFT JOIN raw_dzialka dzi ON nd.dzialka_id = dzi.id
-    LEFT JOIN raw_nieruchomosc_budynek nb ON nier.id = nb.nieruchomosc_id
-    LEFT JOIN raw_budynek bud ON nb.budynek_id = bud.id
-    LEFT JOIN raw_nieruchomosc_lokal nl ON nier.id = nl.nieruchomosc_id
-    LEFT JOIN raw_lokal lok ON nl.lokal_id = lok.id
-    LEFT JOIN raw_adres adr_dzi ON dzi.adres_dzialki_fk = adr_dzi.id
-    LEFT JOIN raw_adres adr_bud ON bud.adres_budynku_fk = adr_bud.id
-    LEFT JOIN raw_adres adr_lok ON lok.adres_budynku_z_lokalem_fk = adr_lok.id
+# Joins of the wide table: (alias, table, join condition, parent alias)
+WIDE_JOINS = (
+    ("tx", "raw_transakcja", None, None),
+    ("nier", "raw_nieruchomosc", "tx.nieruchomosc_fk = nier.id", "tx"),
+    ("dok", "raw_dokument", "tx.dokument_fk = dok.id", "tx"),
+    ("dup", "transakcja_duplicates", "tx.id = dup.transakcja_id", "tx"),
+    ("nd", "raw_nieruchomosc_dzialka", "nier.id = nd.nieruchomosc_id", "nier"),
+    ("dzi", "raw_dzialka", "nd.dzialka_id = dzi.id", "nd"),
+    ("nb", "raw_nieruchomosc_budynek", "nier.id = nb.nieruchomosc_id", "nier"),
+    ("bud", "raw_budynek", "nb.budynek_id = bud.id", "nb"),
+    ("nl", "raw_nieruchomosc_lokal", "nier.id = nl.nieruchomosc_id", "nier"),
+    ("lok", "raw_lokal", "nl.lokal_id = lok.id", "nl"),
+    ("adr_dzi", "raw_adres", "dzi.adres_dzialki_fk = adr_dzi.id", "dzi"),
+    ("adr_bud", "raw_adres", "bud.adres_budynku_fk = adr_bud.id", "bud"),
+    ("adr_lok", "raw_adres", "lok.adres_budynku_z_lokalem_fk = adr_lok.id", "lok"),
+)
+
+# Columns of the wide table: (alias, source column, output name)
+WIDE_COLUMNS = (
+    ("tx", "id", "transakcja_id"),
+    ("tx", "nieruchomosc_fk", "nieruchomosc_fk"),
+    ("tx", "dokument_fk", "dokument_fk"),
+    ("tx", "cena_transakcji_brutto", "cena_transakcji_brutto"),
+    ("tx", "oznaczenie_transakcji", "oznaczenie_transakcji"),
+    ("tx", "rodzaj_transakcji", "rodzaj_transakcji"),
+    ("tx", "rodzaj_rynku", "rodzaj_rynku"),
+    ("tx", "strona_sprzedajaca", "strona_sprzedajaca"),
+    ("tx", "strona_kupujaca", "strona_kupujaca"),
+    ("tx", "data_wpisu", "transakcja_data_wpisu"),
+    ("tx", "import_id", "import_id"),
+    ("dup", "canonical_id", "duplicate_of"),
+
+    ("nier", "id", "nieruchomosc_id"),
+    ("nier", "rodzaj_nieruchomosci", "rodzaj_nieruchomosci"),
+    ("nier", "rodzaj_prawa_do_nieruchomosci", "rodzaj_prawa_do_nieruchomosci"),
+    ("nier", "udzial_w_prawie_do_nieruchomosci", "udzial_w_prawie_do_nieruchomosci"),
+    ("nier", "cena_nieruchomosci_brutto", "cena_nieruchomosci_brutto"),
+    ("nier", "data_wpisu", "nieruchomosc_data_wpisu"),
+
+    ("dok", "id", "dokument_id"),
+    ("dok", "oznaczenie_dokumentu", "oznaczenie_dokumentu"),
+    ("dok", "data_sporzadzenia_dokumentu", "data_sporzadzenia_dokumentu"),
+    ("dok", "tworca_dokumentu", "tworca_dokumentu"),
+
+    ("dzi", "id", "dzialka_id"),
+    ("dzi", "id_dzialki", "id_dzialki"),
+    ("dzi", "pole_powierzchni_ewidencyjnej", "pole_powierzchni_ewidencyjnej"),
+    ("dzi", "sposob_uzytkowania", "sposob_uzytkowania"),
+
+    ("bud", "id", "budynek_id"),
+    ("bud", "id_budynku", "id_budynku"),
+    ("bud", "liczba_kondygnacji", "liczba_kondygnacji"),
+    ("bud", "liczba_mieszkan", "liczba_mieszkan"),
+    ("bud", "rodzaj_budynku", "rodzaj_budynku"),
+
+    ("lok", "id", "lokal_id"),
+    ("lok", "id_lokalu", "id_lokalu"),
+    ("lok", "numer_lokalu", "numer_lokalu"),
+    ("lok", "funkcja_lokalu", "funkcja_lokalu"),
+    ("lok", "liczba_izb", "liczba_izb"),
+    ("lok", "nr_kondygnacji", "nr_kondygnacji"),
+    ("lok", "pow_uzytkowo_lokalu", "pow_uzytkowo_lokalu"),
+    ("lok", "cena_lokalu_brutto", "cena_lokalu_brutto"),
+
+    ("adr_dzi", "id", "adres_dzialki_id"),
+    ("adr_dzi", "miejscowosc", "adres_dzialki_miejscowosc"),
+    ("adr_dzi", "ulica", "adres_dzialki_ulica"),
+    ("adr_dzi", "numer_porzadkowy", "adres_dzialki_numer"),
+
+    ("adr_bud", "id", "adres_budynku_id"),
+    ("adr_bud", "miejscowosc", "adres_budynku_miejscowosc"),
+    ("adr_bud", "ulica", "adres_budynku_ulica"),
+    ("adr_bud", "numer_porzadkowy", "adres_budynku_numer"),
+
+    ("adr_lok", "id", "adres_lokalu_id"),
+    ("adr_lok", "miejscowosc", "adres_lokalu_miejscowosc"),
+    ("adr_lok", "ulica", "adres_lokalu_ulica"),
+    ("adr_lok", "numer_porzadkowy", "adres_lokalu_numer"),
+)
+
+# Named column sets (output names). "full" = all WIDE_COLUMNS.
+WIDE_PROFILES = {
+    "full": None,
+    "lokal-sales": (
+        "transakcja_id", "cena_transakcji_brutto", "transakcja_data_wpisu", "import_id", "duplicate_of",
+        "rodzaj_transakcji", "rodzaj_rynku", "strona_sprzedajaca", "strona_kupujaca",
+        "nieruchomosc_id", "rodzaj_nieruchomosci", "rodzaj_prawa_do_nieruchomosci", "cena_nieruchomosci_brutto",
+        "lokal_id", "id_lokalu", "numer_lokalu", "funkcja_lokalu", "liczba_izb", "nr_kondygnacji",
+        "pow_uzytkowo_lokalu", "cena_lokalu_brutto",
+        "adres_lokalu_id", "adres_lokalu_miejscowosc", "adres_lokalu_ulica", "adres_lokalu_numer",
+    ),
+    "parcels": (
+        "transakcja_id", "cena_transakcji_brutto", "transakcja_data_wpisu", "import_id", "duplicate_of",
+        "rodzaj_transakcji", "rodzaj_rynku", "strona_sprzedajaca", "strona_kupujaca",
+        "nieruchomosc_id", "rodzaj_nieruchomosci", "rodzaj_prawa_do_nieruchomosci", "cena_nieruchomosci_brutto",
+        "dzialka_id", "id_dzialki", "pole_powierzchni_ewidencyjnej", "sposob_uzytkowania",
+        "adres_dzialki_id", "adres_dzialki_miejscowosc", "adres_dzialki_ulica", "adres_dzialki_numer",
+    ),
+}
+
+_JOIN_COLUMN_RE = re.compile(r"(\w+)\.(\w+)")
+
+
+def table_columns(conn: sqlite3.Connection) -> dict[str, set[str]]:
+    """Return existing columns of every table used by the wide table."""
+    available = {}
+    for table in {table for _, table, _, _ in WIDE_JOINS}:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if columns:
+            available[table] = columns
+    return available
+
+
+def profile_columns(profile: str) -> tuple:
+    """Return WIDE_COLUMNS entries of a named profile."""
+    if profile not in WIDE_PROFILES:
+        raise ValueError(f"Unknown wide profile: {profile}. Known: {', '.join(WIDE_PROFILES)}")
+    names = WIDE_PROFILES[profile]
+    if names is None:
+        return WIDE_COLUMNS
+    return tuple(c for c in WIDE_COLUMNS if c[2] in names)
+
+
+def needed_aliases(selected: tuple) -> set[str]:
+    """Return join aliases used by the selected columns, including their parent joins."""
+    parents = {alias: parent for alias, _, _, parent in WIDE_JOINS}
+    needed = set()
+    for alias in {alias for alias, _, _ in selected}:
+        while alias is not None and alias not in needed:
+            needed.add(alias)
+            alias = parents[alias]
+    return needed
+
+
+def build_select_sql(limit: int | None, available: dict[str, set[str]] | None = None,
+                     profile: str = "full", exclude_duplicates: bool = False) -> str:
     """
+    Build the wide table SELECT.
+
+    Args:
+        limit: Limit rows
+        profile: Column profile (see WIDE_PROFILES); only joins needed by its columns are generated
+        available: Existing columns per raw table (see table_columns). When given, the SQL
+                   adapts to the parser projection: columns missing in the raw tables are
+                   left out, and so are joins whose key columns are missing (with their columns).
+                   None means all columns exist.
+        exclude_duplicates: Leave out transactions found to be duplicates (see src/dedup.py)
+    """
+    aliases = {alias: table for alias, table, _, _ in WIDE_JOINS}
+    selected = profile_columns(profile)
+    needed = needed_aliases(selected)
+    if exclude_duplicates:
+        needed.add("dup")
+
+    def has(alias: str, column: str) -> bool:
+        return available is None or column in available.get(aliases[alias], ())
+
+    usable = set()
+    joins = []
+    for alias, table, condition, parent in WIDE_JOINS:
+        if alias not in needed:
+            continue
+        if available is not None and table not in available:
+            continue
+        if parent is not None and parent not in usable:
+            continue
+        if condition and not all(has(a, c) for a, c in _JOIN_COLUMN_RE.findall(condition)):
+            continue
+        usable.add(alias)
+        if condition is None:
+            joins.append(f"FROM {table} {alias}")
+        else:
+            joins.append(f"LEFT JOIN {table} {alias} ON {condition}")
+
+    columns = [
+        f"{alias}.{column}" if column == output else f"{alias}.{column} AS {output}"
+        for alias, column, output in selected
+        if alias in usable and has(alias, column)
+    ]
+
+    base_sql = "\n    SELECT\n        " + ",\n        ".join(columns) + "\n    " + "\n    ".join(joins) + "\n    "
+    if exclude_duplicates and "dup" in usable:
+        base_sql += "WHERE dup.transakcja_id IS NULL\n    "
 
     if limit is not None:
         return base_sql + f"\nLIMIT {int(limit)}"
     return base_sql
 
 
+def as_of_references() -> dict[str, dict[str, str]]:
+    """Return {table: {column: referenced table}} of the wide joins (conditions child.column = parent.id)."""
+    tables = {alias: table for alias, table, _, _ in WIDE_JOINS}
+    references = {}
+    for alias, table, condition, _ in WIDE_JOINS:
+        if condition is None:
+            continue
+        (left, column), (right, key) = _JOIN_COLUMN_RE.findall(condition)
+        if right == alias and key == "id":
+            references.setdefault(tables[left], {})[column] = table
+    return references
+
+
+WIDE_INDEXED_COLUMNS = ("transakcja_id", "nieruchomosc_id", "dzialka_id", "budynek_id", "lokal_id", "import_id",
+                        "adres_dzialki_id", "adres_budynku_id", "adres_lokalu_id", "duplicate_of")
+
+# Covering indexes for filtered aggregates over coded columns, e.g. median price per
+# rodzaj_rynku and month: (index suffix, columns); the code column goes first.
+WIDE_AGGREGATE_INDEXES = (
+    ("rynek_agg", ("rodzaj_rynku", "rodzaj_nieruchomosci", "transakcja_data_wpisu", "cena_transakcji_brutto")),
+    ("rodzaj_agg", ("rodzaj_nieruchomosci", "transakcja_data_wpisu", "cena_nieruchomosci_brutto")),
+    ("funkcja_agg", ("funkcja_lokalu", "transakcja_data_wpisu", "cena_lokalu_brutto", "pow_uzytkowo_lokalu")),
+    ("sposob_agg", ("sposob_uzytkowania", "transakcja_data_wpisu", "pole_powierzchni_ewidencyjnej")),
+)
+
+
 def create_indexes(conn: sqlite3.Connection, table: str) -> None:
-    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_transakcja_id ON {table}(transakcja_id);")
-    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_nieruchomosc_id ON {table}(nieruchomosc_id);")
-    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_dzialka_id ON {table}(dzialka_id);")
-    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_budynek_id ON {table}(budynek_id);")
-    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_lokal_id ON {table}(lokal_id);")
-    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_import_id ON {table}(import_id);")
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for column in WIDE_INDEXED_COLUMNS:
+        if column in existing:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column});")
+    for suffix, columns in WIDE_AGGREGATE_INDEXES:
+        if all(column in existing for column in columns):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{suffix} ON {table}({', '.join(columns)});")
 
 
 def build_wide(db_path: str, table: str = "rcn_wide", limit: int | None = None,
-               drop: bool = False, timeout: int = 30) -> dict:
+               drop: bool = False, timeout: int = 30, profile: str = "full", as_of: str | None = None,
+               exclude_duplicates: bool = False) -> dict:
     """
     Build denormalized wide table from raw tables.
 
@@ -103,9 +247,15 @@ def build_wide(db_path: str, table: str = "rcn_wide", limit: int | None = None,
         limit: Limit rows (for testing)
         drop: Drop table if exists
         timeout: SQLite busy timeout in seconds
+        profile: Column profile (see WIDE_PROFILES)
+        as_of: Reconstruct the table for a past date (YYYY-MM-DD, end of day) or datetime from
+               the version history: transactions valid then, with the feature versions valid
+               then (see src/history.py)
+        exclude_duplicates: Leave out duplicate transactions (transakcja_duplicates, see src/dedup.py);
+                            otherwise they are kept with duplicate_of set
 
     Returns:
-        dict with statistics: table, row_count
+        dict with statistics: table, row_count, as_of
     """
     logger.info("=" * 60)
     logger.info("RCN Build Wide started")
@@ -115,21 +265,41 @@ def build_wide(db_path: str, table: str = "rcn_wide", limit: int | None = None,
     logger.info(f"Limit: {limit}")
     logger.info(f"Drop existing: {drop}")
     logger.info(f"Timeout: {timeout}s")
+    logger.info(f"Profile: {profile}")
+    if exclude_duplicates:
+        logger.info("Excluding duplicate transactions")
+    if as_of:
+        from src.history import as_of_moment, as_of_views, drop_as_of_views, ensure_history
+        as_of = as_of_moment(as_of)
+        logger.info(f"As of: {as_of}")
 
     start = time.time()
     conn = sqlite3.connect(db_path, timeout=timeout)
     conn.execute(f"PRAGMA busy_timeout = {timeout * 1000};")
 
     try:
+        # one transaction: readers (WAL) keep seeing the previous table until the new one is complete
+        conn.execute("BEGIN")
         if drop:
             conn.execute(f"DROP TABLE IF EXISTS {table};")
             logger.info(f"Dropped existing table: {table}")
 
         logger.info("Building wide table...")
-        select_sql = build_select_sql(limit)
+        as_of_objects = []
+        if as_of:
+            # history of databases loaded before it was kept is backfilled once
+            for raw_table, columns in sorted(table_columns(conn).items()):
+                if "id" in columns:
+                    ensure_history(conn, raw_table)
+            as_of_objects = as_of_views(conn, as_of, "raw_transakcja", as_of_references())
+        select_sql = build_select_sql(limit, table_columns(conn), profile, exclude_duplicates)
         conn.execute(f"CREATE TABLE {table} AS {select_sql};")
+        if as_of_objects:
+            drop_as_of_views(conn, as_of_objects)
         logger.info("Creating indexes...")
         create_indexes(conn, table)
+        if is_wal(conn):
+            ensure_completed_views(conn)
         conn.commit()
 
         row_count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
@@ -142,6 +312,7 @@ def build_wide(db_path: str, table: str = "rcn_wide", limit: int | None = None,
             "table": table,
             "row_count": row_count,
             "elapsed": elapsed,
+            "as_of": as_of,
         }
     except sqlite3.OperationalError as exc:
         logger.error(f"SQLite error: {exc}")
@@ -160,9 +331,13 @@ def main() -> None:
     ap.add_argument("--limit", type=int, default=None, help="Limit rows (useful for testing)")
     ap.add_argument("--drop", action="store_true", help="Drop table if exists before creating")
     ap.add_argument("--timeout", type=int, default=30, help="SQLite busy timeout in seconds")
+    ap.add_argument("--profile", choices=list(WIDE_PROFILES), default="full", help="Column profile")
+    ap.add_argument("--as-of", default=None, help="Reconstruct the table for a past date (YYYY-MM-DD)")
+    ap.add_argument("--exclude-duplicates", action="store_true", help="Leave out duplicate transactions")
     args = ap.parse_args()
 
-    result = build_wide(args.db, args.table, args.limit, args.drop, args.timeout)
+    result = build_wide(args.db, args.table, args.limit, args.drop, args.timeout, args.profile, args.as_of,
+                        args.exclude_duplicates)
     print(f"Created table: {result['table']} ({result['row_count']} rows)")
 
 
@@ -0,0 +1,220 @@
+"""
+Duplicate transactions across imports (the same transaction in several county exports).
+
+Parsers compute a fingerprint per feature at parse time (indexed `fingerprint` columns):
+    raw_transakcja - oznaczenie_transakcji and cena_transakcji_brutto
+    raw_dokument   - oznaczenie_dokumentu and data_sporzadzenia_dokumentu
+Values are normalized first: case and diacritics folded, whitespace dropped, prices in
+grosze, dates in ISO form. A transaction is identified by both fingerprints, so the
+same deed with the same number and price under different gml:ids is one transaction.
+
+resolve_duplicates() groups transactions by (transaction, dokument) fingerprint in one
+window pass, restricted through the fingerprint index to fingerprints occurring more
+than once. In every cluster the transaction of the earliest import is kept (canonical),
+the others are written to transakcja_duplicates (transakcja_id -> canonical_id).
+Superseded versions of a transaction are left out.
+
+Once resolved, update_duplicates() runs after every import and resolves again only the
+transaction fingerprints the new imports touched: those of their transactions, of the
+transactions referring to their dokumenty, of the versions they superseded and of the
+clusters their transactions were in. A purge resolves everything again, since it can
+bring back older versions of transactions. The resolved fingerprints stay in a temp
+table (TOUCHED_TABLE) of the connection, so the price index can add back sales of
+transactions that stopped being duplicates.
+
+The wide table gets a duplicate_of column from it (NULL = canonical); /stats of the
+query service and the price index skip duplicates.
+"""
+import hashlib
+import logging
+import sqlite3
+import time
+import unicodedata
+from datetime import date
+
+logger = logging.getLogger("rcn")
+
+DUPLICATES_TABLE = "transakcja_duplicates"
+# imports the duplicates are up to date with
+_IMPORTS_TABLE = "_dedup_imports"
+# transaction fingerprints resolved by the last resolve / update on a connection (read by the price index)
+TOUCHED_TABLE = "temp._dedup_touched"
+
+_FOLD = str.maketrans({"ł": "l", "Ł": "l"})
+
+
+def normalize_text(value: str | None) -> str | None:
+    """Fold case and diacritics and drop whitespace ("Rep. A nr 12 / 2020" -> "rep.anr12/2020")."""
+    if value is None:
+        return None
+    decomposed = unicodedata.normalize("NFKD", value.translate(_FOLD).casefold())
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch) and not ch.isspace())
+    return folded or None
+
+
+def normalize_price(value: str | None) -> str | None:
+    """Price in grosze ("1 250 000,5" -> "125000050"), or None when it is not a number."""
+    if value is None:
+        return None
+    try:
+        return str(round(float("".join(value.split()).replace(",", ".")) * 100))
+    except ValueError:
+        return None
+
+
+def normalize_date(value: str | None) -> str | None:
+    """ISO date of a date or datetime value, or None."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value.strip()[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+def fingerprint(*parts: str | None) -> str | None:
+    """64-bit hash (hex) of normalized parts, or None when any part is missing."""
+    if any(part is None for part in parts):
+        return None
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=8).hexdigest()
+
+
+def has_duplicates_table(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (DUPLICATES_TABLE,)).fetchone() is not None
+
+
+def _has_table(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def _check_sources(conn: sqlite3.Connection) -> None:
+    for table in ("raw_transakcja", "raw_dokument"):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if "fingerprint" not in columns:
+            raise ValueError(f"{table} has no fingerprint column; import or reparse it "
+                             f"(reparse --types transakcja,dokument)")
+
+
+def has_touched_fingerprints(conn: sqlite3.Connection) -> bool:
+    """True if duplicates were resolved or updated on this connection (TOUCHED_TABLE exists)."""
+    return conn.execute("SELECT 1 FROM temp.sqlite_master WHERE type = 'table' AND name = ?",
+                        (TOUCHED_TABLE.split(".", 1)[1],)).fetchone() is not None
+
+
+def _reset_touched(conn: sqlite3.Connection) -> None:
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TOUCHED_TABLE} (fingerprint TEXT PRIMARY KEY)")
+    conn.execute(f"DELETE FROM {TOUCHED_TABLE}")
+
+
+def _resolve(conn: sqlite3.Connection) -> int:
+    """Insert the duplicates among transactions whose fingerprint is in TOUCHED_TABLE."""
+    current = ""
+    if _has_table(conn, "raw_transakcja_history"):
+        current = ("AND NOT EXISTS (SELECT 1 FROM raw_transakcja_history h"
+                   " WHERE h.id = tx.id AND h.valid_to IS NOT NULL)")
+    return conn.execute(f"""
+        INSERT INTO {DUPLICATES_TABLE} (transakcja_id, canonical_id, cluster, fingerprint)
+        SELECT id, canonical_id, cluster, fingerprint
+          FROM (SELECT tx.id, tx.fingerprint,
+                       tx.fingerprint || '-' || dok.fingerprint AS cluster,
+                       FIRST_VALUE(tx.id) OVER (PARTITION BY tx.fingerprint, dok.fingerprint
+                                                ORDER BY tx.import_id, tx.id) AS canonical_id
+                  FROM raw_transakcja tx
+                  JOIN raw_dokument dok ON dok.id = tx.dokument_fk
+                 WHERE tx.fingerprint IN (SELECT fingerprint FROM {TOUCHED_TABLE})
+                   AND dok.fingerprint IS NOT NULL {current})
+         WHERE id != canonical_id
+    """).rowcount
+
+
+def resolve_duplicates(conn: sqlite3.Connection) -> dict:
+    """
+    (Re)compute transakcja_duplicates from the fingerprints in one pass.
+
+    Returns:
+        dict with clusters (groups with duplicates) and duplicates (rows not kept)
+    """
+    _check_sources(conn)
+    start = time.time()
+    for table in (DUPLICATES_TABLE, _IMPORTS_TABLE):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute(f"""
+        CREATE TABLE {DUPLICATES_TABLE} (
+            transakcja_id TEXT PRIMARY KEY,
+            canonical_id  TEXT NOT NULL,
+            cluster       TEXT NOT NULL,
+            fingerprint   TEXT NOT NULL
+        )
+    """)
+    conn.execute(f"CREATE INDEX idx_{DUPLICATES_TABLE}_canonical ON {DUPLICATES_TABLE}(canonical_id)")
+    conn.execute(f"CREATE INDEX idx_{DUPLICATES_TABLE}_fingerprint ON {DUPLICATES_TABLE}(fingerprint)")
+    conn.execute(f"CREATE TABLE {_IMPORTS_TABLE} (id INTEGER PRIMARY KEY)")
+    conn.execute(f"INSERT INTO {_IMPORTS_TABLE} SELECT id FROM _import_meta WHERE status = 'completed'")
+    # candidates: transaction fingerprints seen more than once (grouped on the index, no sort)
+    _reset_touched(conn)
+    conn.execute(f"""
+        INSERT INTO {TOUCHED_TABLE} SELECT fingerprint FROM raw_transakcja
+         WHERE fingerprint IS NOT NULL GROUP BY fingerprint HAVING COUNT(*) > 1""")
+    duplicates = _resolve(conn)
+    clusters = conn.execute(f"SELECT COUNT(DISTINCT cluster) FROM {DUPLICATES_TABLE}").fetchone()[0]
+    conn.commit()
+    logger.info(f"[dedup] {duplicates} duplicate transaction(s) in {clusters} cluster(s) in {time.time() - start:.1f}s")
+    return {"clusters": clusters, "duplicates": duplicates}
+
+
+def _touch(conn: sqlite3.Connection, import_ids: list[int]) -> int:
+    """Collect the transaction fingerprints the given imports may have changed; returns their count."""
+    marks = ", ".join("?" for _ in import_ids)
+    queries = [
+        # transactions of the imports and transactions referring to their dokumenty
+        f"SELECT fingerprint FROM raw_transakcja WHERE import_id IN ({marks})",
+        f"""SELECT tx.fingerprint FROM raw_dokument dok JOIN raw_transakcja tx ON tx.dokument_fk = dok.id
+             WHERE dok.import_id IN ({marks})""",
+        # clusters the transactions were in (a replaced row may have a new fingerprint)
+        f"""SELECT d.fingerprint FROM raw_transakcja tx JOIN {DUPLICATES_TABLE} d ON d.transakcja_id = tx.id
+             WHERE tx.import_id IN ({marks})""",
+        f"""SELECT d.fingerprint FROM raw_transakcja tx JOIN {DUPLICATES_TABLE} d ON d.canonical_id = tx.id
+             WHERE tx.import_id IN ({marks})""",
+    ]
+    if _has_table(conn, "raw_transakcja_history"):
+        # versions the imports superseded
+        queries.append(f"""
+            SELECT old.fingerprint FROM raw_transakcja_history h
+              JOIN raw_transakcja_history v ON v.lokalny_id = h.lokalny_id
+              JOIN raw_transakcja old ON old.id = v.id
+             WHERE h.import_id IN ({marks})""")
+    for query in queries:
+        conn.execute(f"INSERT OR IGNORE INTO {TOUCHED_TABLE} SELECT fingerprint FROM ({query}) WHERE fingerprint IS NOT NULL",
+                     import_ids)
+    return conn.execute(f"SELECT COUNT(*) FROM {TOUCHED_TABLE}").fetchone()[0]
+
+
+def update_duplicates(conn: sqlite3.Connection) -> dict | None:
+    """
+    Bring transakcja_duplicates up to date (after an import or purge); None if duplicates were never resolved.
+    New imports resolve the fingerprints they touched only, a purge resolves everything again.
+    """
+    if not has_duplicates_table(conn):
+        return None
+    _reset_touched(conn)
+    purged = not _has_table(conn, _IMPORTS_TABLE) or conn.execute(f"""
+        SELECT COUNT(*) FROM _import_meta m JOIN {_IMPORTS_TABLE} p ON p.id = m.id
+         WHERE m.status = 'purged'""").fetchone()[0]
+    if purged:
+        return resolve_duplicates(conn)
+    start = time.time()
+    new_imports = [i for (i,) in conn.execute(f"""
+        SELECT id FROM _import_meta WHERE status = 'completed' AND id NOT IN (SELECT id FROM {_IMPORTS_TABLE})
+         ORDER BY id""")]
+    if not new_imports:
+        return {"imports": 0, "fingerprints": 0, "removed": 0, "duplicates": 0}
+    fingerprints = _touch(conn, new_imports)
+    removed = conn.execute(f"DELETE FROM {DUPLICATES_TABLE} WHERE fingerprint IN (SELECT fingerprint FROM {TOUCHED_TABLE})"
+                           ).rowcount
+    duplicates = _resolve(conn)
+    conn.executemany(f"INSERT INTO {_IMPORTS_TABLE} VALUES (?)", [(i,) for i in new_imports])
+    conn.commit()
+    logger.info(f"[dedup] {fingerprints} fingerprint(s) of {len(new_imports)} import(s) resolved: "
+                f"-{removed} / +{duplicates} duplicate(s) in {time.time() - start:.1f}s")
+    return {"imports": len(new_imports), "fingerprints": fingerprints, "removed": removed, "duplicates": duplicates}
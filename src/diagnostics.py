@@ -0,0 +1,59 @@
+"""
+Aggregated parse diagnostics.
+
+Parsers report problems (missing gml:id, missing href, empty text...) here instead
+of logging every bad element. Issues are counted per (feature type, field, kind);
+only the first few occurrences of each key are logged, with sample ids.
+"""
+import logging
+
+logger = logging.getLogger("rcn")
+
+
+class ParseDiagnostics:
+    """
+    Counters of parse issues keyed by (feature_type, field, kind).
+
+    Args:
+        max_samples: Sample ids kept per key
+        log_first: Occurrences logged per key before it goes quiet (rest is in the summary)
+    """
+
+    def __init__(self, max_samples: int = 5, log_first: int = 3):
+        self.max_samples = max_samples
+        self.log_first = log_first
+        self.counts = {}
+        self.samples = {}
+
+    def record(self, feature_type: str, field: str, kind: str, sample: str | None = None) -> None:
+        key = (feature_type, field, kind)
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+
+        samples = self.samples.setdefault(key, [])
+        if sample and len(samples) < self.max_samples:
+            samples.append(sample)
+
+        if count <= self.log_first:
+            logger.warning(f"[issue] {feature_type}.{field}: {kind} (id={sample})")
+            if count == self.log_first:
+                logger.warning(f"[issue] {feature_type}.{field}: {kind} - further occurrences are only counted")
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def rows(self) -> list[tuple]:
+        """Return (feature_type, field, kind, count, sample_ids) sorted by key."""
+        return [(ft, field, kind, self.counts[(ft, field, kind)], ",".join(self.samples.get((ft, field, kind), [])))
+                for ft, field, kind in sorted(self.counts)]
+
+    def log_summary(self) -> None:
+        if not self.counts:
+            return
+        logger.info(f"[summary] parse issues ({self.total()}):")
+        for ft, field, kind, count, samples in self.rows():
+            logger.info(f"  {ft}.{field} {kind}: {count} (e.g. {samples or '-'})")
+
+    def clear(self) -> None:
+        self.counts.clear()
+        self.samples.clear()
@@ -0,0 +1,101 @@
+"""
+Code lists of dictionary-coded RCN attributes and their lookup tables.
+
+Coded attributes (Field kind "code") are stored as INTEGER codes; labels live in
+one lookup table per code list, dict_<name> (code INTEGER PRIMARY KEY, label TEXT),
+e.g. SELECT r.label, AVG(t.cena_transakcji_brutto) FROM raw_transakcja t
+JOIN dict_rodzaj_rynku r ON r.code = t.rodzaj_rynku GROUP BY r.label.
+
+Lookup tables are filled with INSERT OR IGNORE, so labels edited in the database
+are kept. Codes missing from a list are stored as they are (no label).
+rodzaj_budynku covers both the KST group codes (101-110) and PKOB classes (111-127).
+"""
+import sqlite3
+
+DICTIONARIES = {
+    "rodzaj_transakcji": {
+        1: "wolnorynkowa",
+        2: "sprzedaż w drodze przetargu",
+        3: "sprzedaż bezprzetargowa",
+        4: "inna",
+    },
+    "rodzaj_rynku": {
+        1: "pierwotny",
+        2: "wtórny",
+    },
+    "strona": {
+        1: "osoba fizyczna",
+        2: "osoba prawna",
+        3: "Skarb Państwa",
+        4: "jednostka samorządu terytorialnego",
+        5: "jednostka organizacyjna bez osobowości prawnej",
+        6: "inna",
+    },
+    "rodzaj_nieruchomosci": {
+        1: "gruntowa niezabudowana",
+        2: "gruntowa zabudowana",
+        3: "budynkowa",
+        4: "lokalowa",
+    },
+    "rodzaj_prawa": {
+        1: "własność",
+        2: "użytkowanie wieczyste",
+        3: "spółdzielcze własnościowe prawo do lokalu",
+        4: "inne",
+    },
+    "sposob_uzytkowania": {
+        1: "rolna",
+        2: "leśna",
+        3: "mieszkaniowa",
+        4: "przemysłowa",
+        5: "handlowo-usługowa",
+        6: "komunikacyjna",
+        7: "rekreacyjna",
+        8: "infrastruktury technicznej",
+        9: "nieużytek",
+        10: "inna",
+    },
+    "rodzaj_budynku": {
+        101: "przemysłowy",
+        102: "transportu i łączności",
+        103: "handlowo-usługowy",
+        104: "zbiorniki, silosy i magazyny",
+        105: "biurowy",
+        106: "szpitali i opieki zdrowotnej",
+        107: "oświaty, nauki i kultury",
+        108: "produkcyjny, usługowy i gospodarczy dla rolnictwa",
+        109: "inny niemieszkalny",
+        110: "mieszkalny",
+        111: "mieszkalny jednorodzinny",
+        112: "mieszkalny o dwóch i więcej mieszkaniach",
+        113: "zbiorowego zamieszkania",
+        121: "hotel lub budynek zakwaterowania turystycznego",
+        122: "biurowy",
+        123: "handlowo-usługowy",
+        124: "transportu i łączności",
+        125: "przemysłowy lub magazynowy",
+        126: "kultury, oświaty, szpitala lub opieki zdrowotnej",
+        127: "pozostały niemieszkalny",
+    },
+    "funkcja_lokalu": {
+        1: "mieszkalny",
+        2: "handlowo-usługowy",
+        3: "biurowy",
+        4: "produkcyjny",
+        5: "garaż",
+        6: "inny",
+    },
+}
+
+
+def lookup_table(name: str) -> str:
+    return f"dict_{name}"
+
+
+def ensure_lookup_tables(conn: sqlite3.Connection, names) -> None:
+    """Create lookup tables of the given code lists and add missing labels."""
+    for name in sorted(names):
+        table = lookup_table(name)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (code INTEGER PRIMARY KEY, label TEXT)")
+        conn.executemany(f"INSERT OR IGNORE INTO {table} (code, label) VALUES (?, ?)",
+                         sorted(DICTIONARIES[name].items()))
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Direct-to-wide mode: stream GML straight into the wide table, without raw tables.
+
+Features referenced by transactions (nieruchomosc, dokument, dzialka, budynek, lokal,
+adres) are kept in a FeatureCache with only the columns the wide profile needs. The
+cache holds up to cache_size features in memory; older ones are spilled to a temporary
+SQLite file. A transaction is expanded into wide rows (same columns and LEFT JOIN
+semantics as build_select_sql) as soon as everything it references has arrived;
+otherwise it waits until the end of the file, when missing references become NULLs.
+
+Only the feature types used by the profile are parsed; the rest are skipped on raw bytes.
+
+Each run is registered in _import_meta (mode 'direct_wide') and its id fills the
+import_id column, so purge_import() and the <table>_completed views work on the rows.
+Such imports do not count as imports of the file into the raw tables.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+from src.build_wide import WIDE_JOINS, WIDE_PROFILES, profile_columns, needed_aliases, create_indexes
+from src.diagnostics import ParseDiagnostics
+from src.dictionaries import ensure_lookup_tables
+from src.import_meta import ensure_import_meta_schema, start_import, complete_import, fail_import
+from src.load_rcn import build_parsers, iter_features, PARSERS
+from src.utils import local
+from src.wal import is_wal, ensure_completed_views
+
+logger = logging.getLogger("rcn")
+
+# How wide join aliases are resolved from streamed features: alias -> (parent alias, key)
+#   key "<column>":      the parent's column holds the referenced id
+#   key "links:<field>": the parent nieruchomosc's links of that field (one row per link)
+# Link table aliases (nd, nb, nl) have no columns of their own and are folded into the links.
+DIRECT_JOINS = {
+    "nier": ("tx", "nieruchomosc_fk"),
+    "dok": ("tx", "dokument_fk"),
+    "dzi": ("nier", "links:dzialka"),
+    "bud": ("nier", "links:budynek"),
+    "lok": ("nier", "links:lokal"),
+    "adr_dzi": ("dzi", "adres_dzialki_fk"),
+    "adr_bud": ("bud", "adres_budynku_fk"),
+    "adr_lok": ("lok", "adres_budynku_z_lokalem_fk"),
+}
+_LINK_ALIASES = {"nd": "dzi", "nb": "bud", "nl": "lok"}
+
+
+class FeatureCache:
+    """
+    Parsed features by (feature type, id) plus transactions waiting for references.
+
+    Args:
+        max_items: Features kept in memory; beyond that the oldest are spilled to disk
+        spill_dir: Directory for the temporary SQLite file (default: system temp dir)
+    """
+
+    def __init__(self, max_items: int, spill_dir: str | None = None):
+        self.max_items = max_items
+        self.max_pending = max(1, max_items // 4)
+        self.spill_dir = spill_dir
+        self.spilled = 0
+        self._mem = {}
+        self._pending = []
+        self._db = None
+        self._path = None
+
+    def _open(self) -> sqlite3.Connection:
+        if self._db is None:
+            fd, self._path = tempfile.mkstemp(prefix="rcn_direct_", suffix=".sqlite", dir=self.spill_dir)
+            os.close(fd)
+            self._db = sqlite3.connect(self._path)
+            self._db.execute("PRAGMA journal_mode = OFF")
+            self._db.execute("PRAGMA synchronous = OFF")
+            self._db.execute("CREATE TABLE features (ftype TEXT, id TEXT, data TEXT, PRIMARY KEY (ftype, id)) WITHOUT ROWID")
+            self._db.execute("CREATE TABLE pending (data TEXT)")
+            logger.info(f"[direct] spilling features to {self._path}")
+        return self._db
+
+    def put(self, ftype: str, fid: str, record: dict) -> None:
+        key = (ftype, fid)
+        self._mem.pop(key, None)
+        self._mem[key] = record
+        if len(self._mem) > self.max_items:
+            # spill the oldest tenth in one statement
+            keys = list(itertools.islice(self._mem, max(1, self.max_items // 10)))
+            evict = [(k[0], k[1], json.dumps(self._mem.pop(k))) for k in keys]
+            db = self._open()
+            db.executemany("INSERT OR REPLACE INTO features VALUES (?, ?, ?)", evict)
+            self.spilled += len(evict)
+
+    def get(self, ftype: str, fid: str) -> dict | None:
+        record = self._mem.get((ftype, fid))
+        if record is None and self._db is not None:
+            row = self._db.execute("SELECT data FROM features WHERE ftype = ? AND id = ?", (ftype, fid)).fetchone()
+            if row:
+                record = json.loads(row[0])
+        return record
+
+    def defer(self, record: dict) -> None:
+        self._pending.append(record)
+        if len(self._pending) >= self.max_pending:
+            self._open().executemany("INSERT INTO pending VALUES (?)", ((json.dumps(r),) for r in self._pending))
+            self._pending.clear()
+
+    def iter_pending(self):
+        if self._db is not None:
+            for (data,) in self._db.execute("SELECT data FROM pending").fetchall():
+                yield json.loads(data)
+        yield from self._pending
+        self._pending = []
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._path:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+
+class DirectWideBuilder:
+    """Resolve references of streamed features into wide rows of a profile."""
+
+    def __init__(self, profile: str = "full", cache: FeatureCache | None = None):
+        by_table = {p.TABLE: ft for ft, p in PARSERS.items()}
+        self.alias_type = {alias: by_table[table] for alias, table, _, _ in WIDE_JOINS if table in by_table}
+        # columns of aliases that are not features (duplicates, resolved from the raw tables) are left out
+        self.selected = tuple(c for c in profile_columns(profile) if c[0] in self.alias_type)
+        needed = needed_aliases(self.selected)
+        # link aliases only matter through their target alias
+        self.aliases = [alias for alias, _, _, _ in WIDE_JOINS
+                        if alias in needed and alias != "tx" and alias not in _LINK_ALIASES]
+        self.cache = cache or FeatureCache(1_000_000)
+
+        # columns kept per feature type: output columns + keys of child aliases
+        keep = {self.alias_type["tx"]: {"id"}}
+        for alias in self.aliases:
+            keep.setdefault(self.alias_type[alias], set()).add("id")
+        for alias, column, _ in self.selected:
+            keep.setdefault(self.alias_type[alias], set()).add(column)
+        for alias in self.aliases:
+            parent, key = DIRECT_JOINS[alias]
+            keep[self.alias_type[parent]].add(key)
+        self.keep = keep
+        self.types = set(keep)
+
+        # parsers extract only the kept columns (no raw_xml / geometry)
+        config = {}
+        for ftype, columns in keep.items():
+            known = {f.column for f in PARSERS[ftype].FIELDS}
+            config[ftype] = {"include": sorted(columns & known)}
+        self.parsers = build_parsers(config)
+        # parsed rows have no import_id (last column)
+        self._positions = {ftype: [(c, p.columns.index(c)) for c in keep[ftype] if c in p.columns[:-1]]
+                           for ftype, p in self.parsers.items() if ftype in keep}
+        self._links = {ftype: [c.split(":", 1)[1] for c in keep[ftype] if c.startswith("links:")] for ftype in keep}
+        self.deferred = 0
+
+    def column_types(self) -> list[tuple[str, str]]:
+        """(output name, SQL type) of the wide columns, with the raw column types."""
+        types = {(ft, f.column): f.sql_type for ft, p in PARSERS.items() for f in p.FIELDS}
+        out = []
+        for alias, column, output in self.selected:
+            if column == "id":
+                sql_type = "TEXT"
+            elif column == "import_id":
+                sql_type = "INTEGER"
+            else:
+                sql_type = types[(self.alias_type[alias], column)]
+            out.append((output, sql_type))
+        return out
+
+    def add(self, feature, import_id: int | None = None) -> list[tuple]:
+        """Parse a feature; return wide rows that became complete (only transactions produce rows)."""
+        ftype = local(feature.tag)
+        parser = self.parsers.get(ftype)
+        if parser is None or ftype not in self.keep:
+            return []
+        row = parser.parse(feature)
+        links = parser.take_links()
+        if row is None:
+            return []
+        record = {column: row[pos] for column, pos in self._positions[ftype]}
+        for field in self._links[ftype]:
+            record[f"links:{field}"] = [target for _, f, target in links if f == field]
+
+        if ftype != self.alias_type["tx"]:
+            self.cache.put(ftype, row[0], record)
+            return []
+        record["import_id"] = import_id
+        rows = self._expand(record, final=False)
+        if rows is None:
+            self.cache.defer(record)
+            self.deferred += 1
+            return []
+        return rows
+
+    def finish(self) -> list[tuple]:
+        """Expand waiting transactions; references that never arrived become NULLs."""
+        rows = []
+        for record in self.cache.iter_pending():
+            rows.extend(self._expand(record, final=True))
+        return rows
+
+    def _expand(self, tx: dict, final: bool) -> list[tuple] | None:
+        """Wide rows of a transaction, or None if a reference is still missing (and not final)."""
+        bindings = [{"tx": tx}]
+        for alias in self.aliases:
+            parent, key = DIRECT_JOINS[alias]
+            ftype = self.alias_type[alias]
+            expanded = []
+            for binding in bindings:
+                parent_record = binding[parent]
+                if parent_record is None:
+                    ids = [None]
+                elif key.startswith("links:"):
+                    ids = parent_record[key] or [None]
+                else:
+                    ids = [parent_record[key]]
+                for target_id in ids:
+                    record = self.cache.get(ftype, target_id) if target_id else None
+                    if target_id and record is None and not final:
+                        return None
+                    expanded.append({**binding, alias: record})
+            bindings = expanded
+        return [tuple(b[alias][column] if b.get(alias) is not None else None for alias, column, _ in self.selected)
+                for b in bindings]
+
+
+def build_wide_direct(gml_path: str, db_path: str, table: str = "rcn_wide", profile: str = "full",
+                      drop: bool = True, batch_size: int = 100000, cache_size: int = 1_000_000,
+                      log_every: int = 500000) -> dict:
+    """
+    Stream a GML file into the wide table without raw tables.
+
+    Args:
+        gml_path: Path to the RCN GML file
+        db_path: Path to SQLite database
+        table: Wide table name
+        profile: Column profile (see WIDE_PROFILES)
+        drop: Drop the wide table first (False appends, e.g. for further files)
+        batch_size: Wide rows per insert batch
+        cache_size: Referenced features kept in memory before spilling to disk
+        log_every: Log progress every N features
+
+    Returns:
+        dict with table, rows, processed, deferred, spilled, elapsed, import_id
+    """
+    logger.info("=" * 60)
+    logger.info("RCN Direct Wide started")
+    logger.info("=" * 60)
+    logger.info(f"GML file: {gml_path}")
+    logger.info(f"Database: {db_path}, table: {table}, profile: {profile}")
+    logger.info(f"Feature cache: {cache_size}")
+
+    start = time.time()
+    cache = FeatureCache(cache_size, spill_dir=os.path.dirname(os.path.abspath(db_path)))
+    builder = DirectWideBuilder(profile, cache)
+    diagnostics = ParseDiagnostics()
+    for p in builder.parsers.values():
+        p.diagnostics = diagnostics
+    logger.info(f"Feature types: {', '.join(sorted(builder.types))}")
+
+    columns = builder.column_types()
+    insert_sql = f"INSERT INTO {table} VALUES ({', '.join('?' for _ in columns)})"
+    conn = sqlite3.connect(db_path)
+    ensure_import_meta_schema(conn)
+    import_id = start_import(conn, gml_path, mode="direct_wide")
+    logger.info(f"Import ID: {import_id}")
+    processed = 0
+    written = 0
+    try:
+        if drop:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(f'{c} {t}' for c, t in columns)})")
+        ensure_lookup_tables(conn, {f.dictionary for p in builder.parsers.values() for f in p.fields if f.dictionary})
+
+        buffer = []
+
+        def flush():
+            nonlocal written
+            conn.executemany(insert_sql, buffer)
+            conn.commit()
+            written += len(buffer)
+            buffer.clear()
+
+        for feature in iter_features(gml_path, builder.types):
+            processed += 1
+            buffer.extend(builder.add(feature, import_id))
+            if len(buffer) >= batch_size:
+                flush()
+            if log_every and processed % log_every == 0:
+                logger.info(f"[progress] {processed} features, rows={written + len(buffer)}, "
+                            f"deferred={builder.deferred}, spilled={cache.spilled}")
+
+        buffer.extend(builder.finish())
+        flush()
+        create_indexes(conn, table)
+        if is_wal(conn):
+            ensure_completed_views(conn)
+        elapsed = time.time() - start
+        stats = {"processed": processed, "table": table, "deferred": builder.deferred, "spilled": cache.spilled}
+        complete_import(conn, import_id, written, elapsed, stats)
+    except Exception:
+        fail_import(conn, import_id)
+        raise
+    finally:
+        cache.close()
+        conn.close()
+
+    diagnostics.log_summary()
+    logger.info("=" * 60)
+    logger.info(f"Done. table={table}, rows={written}, features={processed}, deferred transactions={builder.deferred}, "
+                f"spilled features={cache.spilled}, time={elapsed:.1f}s")
+    return {"table": table, "rows": written, "processed": processed, "deferred": builder.deferred,
+            "spilled": cache.spilled, "elapsed": elapsed, "import_id": import_id}
+
+
+def main() -> None:
+    from src.logging_config import setup_logging
+    setup_logging()
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gml", required=True, help="Path to the RCN GML file")
+    ap.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite DB")
+    ap.add_argument("--table", default="rcn_wide", help="Wide table name")
+    ap.add_argument("--profile", choices=list(WIDE_PROFILES), default="full", help="Column profile")
+    ap.add_argument("--cache", type=int, default=1_000_000, help="Features kept in memory before spilling")
+    args = ap.parse_args()
+
+    build_wide_direct(args.gml, args.db, args.table, args.profile, cache_size=args.cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Streaming export of raw and wide tables.
+
+Rows are read with cursor.fetchmany(arraysize) and written straight to the output,
+so memory use does not depend on table size. Output is compressed with gzip when
+the path ends with ".gz". With rotate_rows, output is split into numbered parts
+(rcn_wide.csv.gz -> rcn_wide-00001.csv.gz, rcn_wide-00002.csv.gz, ...).
+
+Formats:
+    csv         - header + rows (csv module, all fields as text, NULL as empty)
+    ndjson      - one JSON object per row
+    geojsonseq  - GeoJSON text sequence (RFC 8142) of raw_dzialka / raw_budynek / raw_lokal
+                  features from the parsed geometria column, with their transaction attributes
+
+A bbox (min_x, min_y, max_x, max_y in EPSG:2178, x = easting) filters rows of tables
+with geometry columns using the stored bounding boxes.
+"""
+import argparse
+import csv
+import functools
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from src import geometry
+
+logger = logging.getLogger("rcn")
+
+
+class CsvWriter:
+    """Write rows as CSV with a header line in every part."""
+
+    def __init__(self, f, columns: list[str]):
+        self._writer = csv.writer(f)
+        self._writer.writerow(columns)
+
+    def write(self, rows: list[tuple]) -> int:
+        self._writer.writerows(rows)
+        return len(rows)
+
+
+class NdjsonWriter:
+    """Write rows as JSON objects, one per line."""
+
+    def __init__(self, f, columns: list[str]):
+        self._f = f
+        self._columns = columns
+
+    def write(self, rows: list[tuple]) -> int:
+        columns = self._columns
+        dumps = json.dumps
+        self._f.write("".join(dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n" for row in rows))
+        return len(rows)
+
+
+class GeoJsonSeqWriter:
+    """
+    Write rows as GeoJSON features (RFC 8142: RS + JSON + LF).
+    The geometria column becomes the geometry, other columns the properties
+    (bbox columns are left out). With wgs84, coordinates of the whole batch
+    are transformed from EPSG:2178 in one pass.
+    """
+
+    def __init__(self, f, columns: list[str], wgs84: bool = False):
+        self._f = f
+        self._wgs84 = wgs84
+        self._geom_index = columns.index("geometria")
+        self._id_index = columns.index("id") if "id" in columns else None
+        self._properties = [(i, c) for i, c in enumerate(columns) if c not in _GEOMETRY_COLUMNS]
+
+    def write(self, rows: list[tuple]) -> int:
+        loads = json.loads
+        geometries = [loads(row[self._geom_index]) if row[self._geom_index] else None for row in rows]
+        if self._wgs84:
+            geometry.to_wgs84([p for g in geometries if g for p in geometry.iter_points(g)])
+
+        dumps = json.dumps
+        lines = []
+        for row, geom in zip(rows, geometries):
+            feature = {"type": "Feature"}
+            if self._id_index is not None:
+                feature["id"] = row[self._id_index]
+            feature["geometry"] = geom
+            feature["properties"] = {c: row[i] for i, c in self._properties}
+            lines.append("\x1e" + dumps(feature, ensure_ascii=False, default=str) + "\n")
+        self._f.write("".join(lines))
+        return len(rows)
+
+
+WRITERS = {
+    "csv": CsvWriter,
+    "ndjson": NdjsonWriter,
+    "geojsonseq": GeoJsonSeqWriter,
+}
+
+_GEOMETRY_COLUMNS = ("geometria", "min_x", "min_y", "max_x", "max_y")
+
+# Geometry tables -> (link table, link column) used to attach transaction attributes
+GEO_TABLES = {
+    "raw_dzialka": ("raw_nieruchomosc_dzialka", "dzialka_id"),
+    "raw_budynek": ("raw_nieruchomosc_budynek", "budynek_id"),
+    "raw_lokal": ("raw_nieruchomosc_lokal", "lokal_id"),
+}
+
+# Transaction attributes added to geojsonseq features: (alias, column, output name)
+GEO_TRANSACTION_COLUMNS = (
+    ("nier", "id", "nieruchomosc_id"),
+    ("nier", "rodzaj_nieruchomosci", "rodzaj_nieruchomosci"),
+    ("nier", "cena_nieruchomosci_brutto", "cena_nieruchomosci_brutto"),
+    ("tx", "id", "transakcja_id"),
+    ("tx", "cena_transakcji_brutto", "cena_transakcji_brutto"),
+    ("tx", "data_wpisu", "transakcja_data_wpisu"),
+)
+
+
+def part_path(path: str, part: int) -> str:
+    """Insert a part number before the extensions: out/x.csv.gz -> out/x-00001.csv.gz."""
+    directory, name = os.path.split(path)
+    stem, dot, ext = name.partition(".")
+    return os.path.join(directory, f"{stem}-{part:05d}{dot}{ext}")
+
+
+def _open_output(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6)
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def build_query(conn: sqlite3.Connection, table: str, fmt: str, bbox: tuple | None = None) -> tuple[str, tuple]:
+    """Return (sql, params) selecting the exported rows."""
+    columns = _columns(conn, table)
+    where = ""
+    params = ()
+    if bbox is not None:
+        if not set(_GEOMETRY_COLUMNS[1:]) <= set(columns):
+            raise ValueError(f"Table {table} has no bbox columns (min_x, min_y, max_x, max_y)")
+        min_x, min_y, max_x, max_y = bbox
+        where = " WHERE f.max_x >= ? AND f.min_x <= ? AND f.max_y >= ? AND f.min_y <= ?"
+        params = (min_x, max_x, min_y, max_y)
+
+    if fmt != "geojsonseq":
+        return f'SELECT f.* FROM "{table}" f{where}', params
+
+    if "geometria" not in columns:
+        raise ValueError(f"Table {table} has no geometria column; re-import or reparse it with the geometry fields")
+    select = [f"f.{c}" for c in columns if c != "raw_xml"]
+    joins = ""
+    link = GEO_TABLES.get(table)
+    if link and all(_columns(conn, t) for t in (link[0], "raw_nieruchomosc", "raw_transakcja")):
+        link_table, link_column = link
+        available = {"nier": set(_columns(conn, "raw_nieruchomosc")), "tx": set(_columns(conn, "raw_transakcja"))}
+        select += [f"{alias}.{column} AS {output}" for alias, column, output in GEO_TRANSACTION_COLUMNS
+                   if column in available[alias] and output not in columns]
+        joins = (f" LEFT JOIN {link_table} l ON l.{link_column} = f.id"
+                 f" LEFT JOIN raw_nieruchomosc nier ON nier.id = l.nieruchomosc_id"
+                 f" LEFT JOIN raw_transakcja tx ON tx.nieruchomosc_fk = nier.id")
+    return f'SELECT {", ".join(select)} FROM "{table}" f{joins}{where}', params
+
+
+def export_table(db_path: str, table: str, out_path: str, fmt: str = "csv",
+                 rotate_rows: int | None = None, arraysize: int = 10000, log_every: int = 1000000,
+                 bbox: tuple[float, float, float, float] | None = None, wgs84: bool = False) -> dict:
+    """
+    Stream a table to CSV / NDJSON file(s).
+
+    Args:
+        db_path: Path to SQLite database
+        table: Raw or wide table name
+        out_path: Output file; ".gz" suffix enables gzip
+        fmt: Output format (see WRITERS)
+        rotate_rows: Start a new part file after this many rows (None = single file)
+        arraysize: Rows fetched per cursor.fetchmany()
+        log_every: Log export rate every N rows (0 = only the summary)
+        bbox: (min_x, min_y, max_x, max_y) in EPSG:2178 - only rows whose bbox intersects it
+        wgs84: geojsonseq - transform coordinates from EPSG:2178 to WGS84 (lon, lat)
+
+    Returns:
+        dict with table, rows, files, bytes, elapsed, rows_per_sec, mb_per_sec
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}. Known: {', '.join(WRITERS)}")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        if not _table_exists(conn, table):
+            raise ValueError(f"Table not found: {table}")
+
+        cursor = conn.cursor()
+        cursor.arraysize = arraysize
+        cursor.execute(*build_query(conn, table, fmt, bbox))
+        columns = [d[0] for d in cursor.description]
+        if fmt == "geojsonseq":
+            make_writer = functools.partial(GeoJsonSeqWriter, wgs84=wgs84)
+        else:
+            make_writer = WRITERS[fmt]
+
+        out_dir = os.path.dirname(out_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+        logger.info(f"Exporting {table} -> {out_path} (format={fmt}, rotate={rotate_rows or '-'})")
+        start = time.time()
+        files = []
+        total = 0
+        part_rows = 0
+        next_log = log_every
+        f = None
+        writer = None
+        try:
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                while rows:
+                    if f is None:
+                        path = part_path(out_path, len(files) + 1) if rotate_rows else out_path
+                        f = _open_output(path)
+                        files.append(path)
+                        writer = make_writer(f, columns)
+                        part_rows = 0
+                    take = rows if not rotate_rows else rows[:rotate_rows - part_rows]
+                    rows = rows[len(take):]
+                    n = writer.write(take)
+                    part_rows += n
+                    total += n
+                    if rotate_rows and part_rows >= rotate_rows:
+                        f.close()
+                        f = None
+                if log_every and total >= next_log:
+                    elapsed = time.time() - start
+                    logger.info(f"  {total} rows, {total / elapsed if elapsed else 0:.0f} rows/s")
+                    next_log += log_every
+        finally:
+            if f is not None:
+                f.close()
+
+        if not files:
+            # empty table: still write a file (header only for CSV)
+            path = part_path(out_path, 1) if rotate_rows else out_path
+            with _open_output(path) as f:
+                make_writer(f, columns)
+            files.append(path)
+
+        elapsed = time.time() - start
+        size = sum(os.path.getsize(p) for p in files)
+        result = {
+            "table": table,
+            "rows": total,
+            "files": files,
+            "bytes": size,
+            "elapsed": elapsed,
+            "rows_per_sec": total / elapsed if elapsed else 0.0,
+            "mb_per_sec": size / 1_000_000 / elapsed if elapsed else 0.0,
+        }
+        logger.info(f"Done. rows={total}, files={len(files)}, size={size / 1_000_000:.1f}MB, time={elapsed:.1f}s, "
+                    f"{result['rows_per_sec']:.0f} rows/s, {result['mb_per_sec']:.1f} MB/s (written)")
+        return result
+    finally:
+        conn.close()
+
+
+def parse_bbox(text: str) -> tuple[float, float, float, float]:
+    """Parse 'min_x,min_y,max_x,max_y'."""
+    values = tuple(float(v) for v in text.split(","))
+    if len(values) != 4:
+        raise ValueError(f"bbox needs 4 numbers: {text}")
+    return values
+
+
+def main() -> None:
+    from src.logging_config import setup_logging
+    setup_logging()
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite DB")
+    ap.add_argument("--table", default="rcn_wide", help="Table to export")
+    ap.add_argument("--out", required=True, help="Output file (.gz = gzip)")
+    ap.add_argument("--format", choices=list(WRITERS), default="csv", help="Output format")
+    ap.add_argument("--rotate-rows", type=int, default=None, help="Split output into parts of N rows")
+    ap.add_argument("--arraysize", type=int, default=10000, help="Rows fetched per batch")
+    ap.add_argument("--bbox", type=parse_bbox, default=None, help="min_x,min_y,max_x,max_y in EPSG:2178")
+    ap.add_argument("--wgs84", action="store_true", help="geojsonseq: reproject to WGS84")
+    args = ap.parse_args()
+
+    export_table(args.db, args.table, args.out, args.format, args.rotate_rows, args.arraysize,
+                 bbox=args.bbox, wgs84=args.wgs84)
+
+
+if __name__ == "__main__":
+    main()
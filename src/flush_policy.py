@@ -0,0 +1,85 @@
+"""
+Flush policy for the loader's row buffers.
+
+Row mode (default): flush when any buffer reaches batch_size rows.
+Memory mode (memory_budget): additionally track approximate buffered bytes and flush
+when they reach a limit. The limit starts at the budget and is tuned after every
+flush from the measured flush latency, so that one flush takes about
+target_flush_seconds (never more than the budget).
+
+Time mode (max_interval): additionally flush when max_interval seconds have passed
+since the last flush, so each write transaction covers a bounded time slice. The
+clock is read every _CLOCK_EVERY rows.
+
+Every check is O(1): counters are updated per appended row, buffers are never scanned.
+"""
+import sys
+import time
+
+# Smoothing factor for the measured flush cost (seconds per byte)
+_EMA_ALPHA = 0.5
+# The adaptive limit never drops below this fraction of the budget
+_MIN_LIMIT_FRACTION = 1 / 64
+# Rows between clock reads in time mode
+_CLOCK_EVERY = 256
+
+
+def estimate_row_bytes(row: tuple) -> int:
+    """Approximate memory used by a buffered row (tuple + its values)."""
+    getsizeof = sys.getsizeof
+    return getsizeof(row) + sum(getsizeof(v) for v in row)
+
+
+class FlushPolicy:
+    """
+    Decide when the loader flushes its buffers.
+
+    Args:
+        batch_size: Max rows in a single buffer
+        memory_budget: Max approximate buffered bytes (None = row mode only)
+        target_flush_seconds: Desired flush latency used to tune the byte limit
+        max_interval: Max seconds between flushes (None = no time limit)
+    """
+
+    def __init__(self, batch_size: int, memory_budget: int | None = None, target_flush_seconds: float = 2.0,
+                 max_interval: float | None = None):
+        self.batch_size = batch_size
+        self.memory_budget = memory_budget
+        self.target_flush_seconds = target_flush_seconds
+        self.max_interval = max_interval
+        self.limit_bytes = memory_budget
+        self.buffered_bytes = 0
+        self.buffered_rows = 0
+        self._last_flush = time.monotonic()
+        self._cost_per_byte = None
+
+    def add(self, row: tuple, buffer_len: int) -> bool:
+        """
+        Account for a row appended to a buffer that now has buffer_len rows.
+        Returns True if the buffers should be flushed.
+        """
+        self.buffered_rows += 1
+        # counted before any trigger, so flushed() divides by the bytes actually written
+        if self.limit_bytes is not None:
+            self.buffered_bytes += estimate_row_bytes(row)
+        if buffer_len >= self.batch_size:
+            return True
+        if (self.max_interval is not None and self.buffered_rows % _CLOCK_EVERY == 0
+                and time.monotonic() - self._last_flush >= self.max_interval):
+            return True
+        return self.limit_bytes is not None and self.buffered_bytes >= self.limit_bytes
+
+    def flushed(self, seconds: float) -> None:
+        """Reset counters after a flush and tune the byte limit from its latency."""
+        if self.memory_budget is not None and self.buffered_bytes > 0 and seconds > 0:
+            cost = seconds / self.buffered_bytes
+            if self._cost_per_byte is None:
+                self._cost_per_byte = cost
+            else:
+                self._cost_per_byte = _EMA_ALPHA * cost + (1 - _EMA_ALPHA) * self._cost_per_byte
+            wanted = int(self.target_flush_seconds / self._cost_per_byte)
+            lowest = int(self.memory_budget * _MIN_LIMIT_FRACTION)
+            self.limit_bytes = max(lowest, min(self.memory_budget, wanted))
+        self.buffered_bytes = 0
+        self.buffered_rows = 0
+        self._last_flush = time.monotonic()
@@ -0,0 +1,188 @@
+"""
+Geometry helpers: GML -> GeoJSON geometry, planar metrics (area, perimeter, centroid)
+and EPSG:2178 -> WGS84 transform.
+
+RCN geometries use EPSG:2178 (ETRS89 / Poland CS2000 zone 7) with axis order
+northing, easting. Stored geometries are GeoJSON dicts in EPSG:2178 with
+coordinates swapped to [x=easting, y=northing], so only the CRS changes on export.
+
+The inverse transverse Mercator uses the Krueger series (as in UTM), accurate
+to well below a millimetre inside a 2000 zone. Pure Python, no pyproj.
+"""
+import math
+import xml.etree.ElementTree as ET
+
+from src.utils import local
+
+# GRS80 ellipsoid
+_A = 6378137.0
+_F = 1 / 298.257222101
+
+# PL-2000 zone 7 (EPSG:2178)
+_LON0 = math.radians(21.0)
+_K0 = 0.999923
+_FALSE_EASTING = 7_500_000.0
+
+_N = _F / (2 - _F)
+_A_RECT = _A / (1 + _N) * (1 + _N ** 2 / 4 + _N ** 4 / 64)
+_BETA = (
+    _N / 2 - 2 * _N ** 2 / 3 + 37 * _N ** 3 / 96,
+    _N ** 2 / 48 + _N ** 3 / 15,
+    17 * _N ** 3 / 480,
+)
+_DELTA = (
+    2 * _N - 2 * _N ** 2 / 3 - 2 * _N ** 3,
+    7 * _N ** 2 / 3 - 8 * _N ** 3 / 5,
+    56 * _N ** 3 / 15,
+)
+
+
+def _pairs(text: str | None) -> list[list[float]]:
+    """'n1 e1 n2 e2 ...' -> [[e1, n1], [e2, n2], ...]"""
+    values = (text or "").split()
+    return [[float(values[i + 1]), float(values[i])] for i in range(0, len(values) - 1, 2)]
+
+
+def _ring(ring_elem: ET.Element) -> list[list[float]]:
+    coords = []
+    for node in ring_elem.iter():
+        tag = local(node.tag)
+        if tag == "posList":
+            coords.extend(_pairs(node.text))
+        elif tag == "pos":
+            coords.extend(_pairs(node.text))
+    return coords
+
+
+def read_geometry(feature_elem: ET.Element) -> dict | None:
+    """
+    Return the first gml:Point / gml:Polygon of a feature as a GeoJSON geometry
+    in EPSG:2178 ([easting, northing]), or None if there is none.
+    """
+    for node in feature_elem.iter():
+        tag = local(node.tag)
+        if tag == "Point":
+            for child in node.iter():
+                if local(child.tag) == "pos":
+                    coords = _pairs(child.text)
+                    return {"type": "Point", "coordinates": coords[0]} if coords else None
+            return None
+        if tag == "Polygon":
+            rings = []
+            for child in node:
+                if local(child.tag) in ("exterior", "interior"):
+                    ring = _ring(child)
+                    if ring:
+                        rings.append(ring)
+            return {"type": "Polygon", "coordinates": rings} if rings else None
+    return None
+
+
+def iter_points(geometry: dict):
+    """Yield the coordinate lists ([x, y]) of a Point / Polygon geometry."""
+    if geometry["type"] == "Point":
+        yield geometry["coordinates"]
+    else:
+        for ring in geometry["coordinates"]:
+            yield from ring
+
+
+def bbox(geometry: dict | None) -> tuple[float, float, float, float] | None:
+    """Return (min_x, min_y, max_x, max_y) of a geometry."""
+    if not geometry:
+        return None
+    xs = []
+    ys = []
+    for x, y in iter_points(geometry):
+        xs.append(x)
+        ys.append(y)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _ring_moments(ring: list[list[float]], x0: float, y0: float) -> tuple[float, float, float]:
+    """
+    Signed area and first moments (shoelace) of a ring, relative to (x0, y0).
+    Shifting to a local origin keeps the products small: PL-2000 coordinates are ~1e6-1e7.
+    """
+    area = mx = my = 0.0
+    x1, y1 = ring[-1][0] - x0, ring[-1][1] - y0
+    for x, y in ring:
+        x2, y2 = x - x0, y - y0
+        cross = x1 * y2 - x2 * y1
+        area += cross
+        mx += (x1 + x2) * cross
+        my += (y1 + y2) * cross
+        x1, y1 = x2, y2
+    return area / 2, mx / 6, my / 6
+
+
+def _ring_length(ring: list[list[float]]) -> float:
+    hypot = math.hypot
+    length = 0.0
+    x1, y1 = ring[-1]
+    for x, y in ring:
+        length += hypot(x - x1, y - y1)
+        x1, y1 = x, y
+    return length
+
+
+def metrics(geometry: dict | None) -> tuple[float | None, float | None, float | None, float | None]:
+    """
+    Return (area, perimeter, centroid_x, centroid_y) of a geometry in EPSG:2178 units (m2, m).
+
+    Polygon area is the exterior ring minus holes, whatever the ring orientation; the
+    perimeter includes the hole boundaries. A Point has no area / perimeter, its centroid
+    is the point itself.
+    """
+    if not geometry:
+        return None, None, None, None
+    if geometry["type"] == "Point":
+        x, y = geometry["coordinates"]
+        return None, None, x, y
+    rings = geometry["coordinates"]
+    x0, y0 = rings[0][0]
+    area = mx = my = 0.0
+    for i, ring in enumerate(rings):
+        a, rx, ry = _ring_moments(ring, x0, y0)
+        # exterior counts positive, holes negative
+        sign = (1.0 if a >= 0 else -1.0) * (1.0 if i == 0 else -1.0)
+        area += sign * a
+        mx += sign * rx
+        my += sign * ry
+    perimeter = sum(_ring_length(ring) for ring in rings)
+    if area > 0:
+        cx, cy = x0 + mx / area, y0 + my / area
+    else:
+        # degenerate polygon: mean of the exterior vertices
+        exterior = rings[0]
+        cx = sum(p[0] for p in exterior) / len(exterior)
+        cy = sum(p[1] for p in exterior) / len(exterior)
+    return round(area, 2), round(perimeter, 2), round(cx, 2), round(cy, 2)
+
+
+def to_wgs84(points: list[list[float]], digits: int = 7) -> None:
+    """
+    Transform [easting, northing] points (EPSG:2178) to [lon, lat] in place.
+    Meant for whole batches: all points of many geometries in one call.
+    """
+    sin, cos, sinh, cosh = math.sin, math.cos, math.sinh, math.cosh
+    asin, atan2, degrees = math.asin, math.atan2, math.degrees
+    b1, b2, b3 = _BETA
+    d1, d2, d3 = _DELTA
+    scale = _K0 * _A_RECT
+    for p in points:
+        xi = p[1] / scale
+        eta = (p[0] - _FALSE_EASTING) / scale
+        xi_p = (xi
+                - b1 * sin(2 * xi) * cosh(2 * eta)
+                - b2 * sin(4 * xi) * cosh(4 * eta)
+                - b3 * sin(6 * xi) * cosh(6 * eta))
+        eta_p = (eta
+                 - b1 * cos(2 * xi) * sinh(2 * eta)
+                 - b2 * cos(4 * xi) * sinh(4 * eta)
+                 - b3 * cos(6 * xi) * sinh(6 * eta))
+        chi = asin(sin(xi_p) / cosh(eta_p))
+        lat = chi + d1 * sin(2 * chi) + d2 * sin(4 * chi) + d3 * sin(6 * chi)
+        lon = _LON0 + atan2(sinh(eta_p), cos(xi_p))
+        p[0] = round(degrees(lon), digits)
+        p[1] = round(degrees(lat), digits)
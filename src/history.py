@@ -0,0 +1,208 @@
+"""
+Version history of RCN features and as-of reconstruction of the raw tables.
+
+A gml:id is <przestrzenNazw>_<lokalnyId>_<wersjaId>, e.g.
+PL.PZGiK.1465.RCN_00001-001_2018-02-09T11-17-20, and every version of a feature is a
+separate raw table row. <table>_history maps (lokalny_id, wersja_id) to the row id with
+the validity range of that version: valid_from is the version timestamp, valid_to the
+timestamp of the next version (NULL = current). lokalny_id keeps the namespace, so ids
+of different data providers do not collide.
+
+Versions are recorded with every flushed batch; valid_to is set once the import is
+complete, for the identities the import touched only. After a purge, versions whose
+successor is gone are reopened. Features whose gml:id has no version are not recorded.
+
+as_of_views() reconstructs the raw tables for a past moment inside one connection:
+TEMP views named like the raw tables shadow them in unqualified names. The root table
+keeps only versions valid at that moment, and references resolve to the version of the
+referenced feature valid at that moment (or stay as they are when none was).
+"""
+import logging
+import sqlite3
+from datetime import date, datetime
+
+logger = logging.getLogger("rcn")
+
+_BACKFILL_CHUNK = 100000
+
+
+def history_table(table: str) -> str:
+    return f"{table}_history"
+
+
+def split_version(fid: str | None) -> tuple[str, str, str] | None:
+    """
+    Split a gml:id into (lokalny_id, wersja_id, valid_from), or None if it has no version.
+    Example: 'NS_00001-001_2018-02-09T11-17-20' -> ('NS_00001-001', '2018-02-09T11-17-20', '2018-02-09T11:17:20')
+    """
+    head, sep, tail = (fid or "").rpartition("_")
+    if not sep or not head:
+        return None
+    try:
+        valid_from = datetime.strptime(tail, "%Y-%m-%dT%H-%M-%S").isoformat()
+    except ValueError:
+        try:
+            valid_from = date.fromisoformat(tail).isoformat() + "T00:00:00"
+        except ValueError:
+            return None
+    return head, tail, valid_from
+
+
+def _lokalny_id(fid: str | None) -> str | None:
+    version = split_version(fid)
+    return version[0] if version else None
+
+
+def as_of_moment(value: str) -> str:
+    """Normalize an as-of date ('2020-06-30' = end of that day) or datetime to 'YYYY-MM-DDTHH:MM:SS'."""
+    try:
+        if len(value) == 10:
+            return date.fromisoformat(value).isoformat() + "T23:59:59"
+        return datetime.fromisoformat(value).isoformat(timespec="seconds")
+    except ValueError:
+        raise ValueError(f"Invalid as-of date: {value!r} (expected YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)")
+
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                        (table,)).fetchone() is not None
+
+
+def ensure_history(conn: sqlite3.Connection, table: str) -> int:
+    """
+    Create the history table of a raw table if it doesn't exist. Rows already in the raw
+    table (database created before history was kept) are backfilled. Returns backfilled rows.
+    """
+    history = history_table(table)
+    created = not _table_exists(conn, history)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {history} (
+          lokalny_id  TEXT NOT NULL,
+          wersja_id   TEXT NOT NULL,
+          id          TEXT NOT NULL UNIQUE,
+          valid_from  TEXT NOT NULL,
+          valid_to    TEXT,
+          import_id   INTEGER REFERENCES _import_meta(id),
+          PRIMARY KEY (lokalny_id, wersja_id)
+        );
+    """)
+    # covers as-of lookups: versions with valid_from <= moment, then valid_to checked in the index
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{history}_asof ON {history}(valid_from, valid_to, lokalny_id, id);")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{history}_import ON {history}(import_id);")
+    if not created:
+        return 0
+
+    backfilled = 0
+    cur = conn.execute(f"SELECT id, import_id FROM {table}")
+    while True:
+        rows = cur.fetchmany(_BACKFILL_CHUNK)
+        if not rows:
+            break
+        backfilled += record_versions(conn, table, rows)
+    if backfilled:
+        close_versions(conn, table)
+        logger.info(f"[history] {history}: {backfilled} versions backfilled from {table}")
+    return backfilled
+
+
+def record_versions(conn: sqlite3.Connection, table: str, rows) -> int:
+    """Record versions of (id, ..., import_id) rows (as buffered by the loader). Returns recorded rows."""
+    values = []
+    for row in rows:
+        version = split_version(row[0])
+        if version:
+            values.append(version + (row[0], row[-1]))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {history_table(table)} (lokalny_id, wersja_id, valid_from, id, import_id) "
+        f"VALUES (?, ?, ?, ?, ?)", values
+    )
+    return len(values)
+
+
+def _next_version_sql(history: str) -> str:
+    return (f"(SELECT MIN(n.valid_from) FROM {history} n "
+            f"WHERE n.lokalny_id = {history}.lokalny_id AND n.valid_from > {history}.valid_from)")
+
+
+def close_versions(conn: sqlite3.Connection, table: str, import_id: int | None = None) -> int:
+    """Set valid_to of every version of the identities recorded by an import (all if None)."""
+    history = history_table(table)
+    sql = f"UPDATE {history} SET valid_to = {_next_version_sql(history)}"
+    if import_id is None:
+        return conn.execute(sql).rowcount
+    return conn.execute(
+        sql + f" WHERE lokalny_id IN (SELECT lokalny_id FROM {history} WHERE import_id = ?)", (import_id,)
+    ).rowcount
+
+
+def reopen_versions(conn: sqlite3.Connection, table: str) -> int:
+    """Recompute valid_to of versions whose next version is gone (after a purge)."""
+    history = history_table(table)
+    return conn.execute(f"""
+        UPDATE {history} SET valid_to = {_next_version_sql(history)}
+         WHERE valid_to IS NOT NULL
+           AND NOT EXISTS (SELECT 1 FROM {history} n
+                            WHERE n.lokalny_id = {history}.lokalny_id AND n.valid_from = {history}.valid_to)
+    """).rowcount
+
+
+def history_tables(conn: sqlite3.Connection) -> list[str]:
+    """Return raw tables that have a history table."""
+    names = {row[0] for row in conn.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")}
+    return sorted(name for name in names if history_table(name) in names)
+
+
+def as_of_views(conn: sqlite3.Connection, moment: str, root: str, references: dict[str, dict[str, str]]) -> list[str]:
+    """
+    Shadow the raw tables with TEMP views reconstructing them at `moment` (see as_of_moment).
+
+    Args:
+        conn: Connection; the views exist only in it
+        moment: 'YYYY-MM-DDTHH:MM:SS'
+        root: Table filtered to versions valid at moment (e.g. raw_transakcja)
+        references: {table: {column: referenced table}} of columns resolved to as-of versions
+
+    Returns:
+        list of TEMP objects created (see drop_as_of_views)
+    """
+    conn.create_function("rcn_lokalny_id", 1, _lokalny_id, deterministic=True)
+    created = []
+    versioned = history_tables(conn)
+    if root not in versioned:
+        raise ValueError(f"No version history for {root}")
+    for table in versioned:
+        current = f"asof_{table}"
+        conn.execute(f"CREATE TEMP TABLE {current} (lokalny_id TEXT PRIMARY KEY, id TEXT UNIQUE)")
+        conn.execute(f"""
+            INSERT OR REPLACE INTO temp.{current} (lokalny_id, id)
+            SELECT lokalny_id, id FROM main.{history_table(table)}
+             WHERE valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)
+             ORDER BY valid_from
+        """, (moment, moment))
+        created.append(current)
+
+    for table in sorted(set(references) | {root}):
+        if not _table_exists(conn, table):
+            continue
+        resolved = {column: target for column, target in references.get(table, {}).items() if target in versioned}
+        columns = []
+        for row in conn.execute(f"PRAGMA main.table_info({table})"):
+            column = row[1]
+            if column in resolved:
+                # most references already point to the version valid then: no id parsing for them
+                current = f"temp.asof_{resolved[column]}"
+                columns.append(f"CASE WHEN t.{column} IN (SELECT id FROM {current}) THEN t.{column} "
+                               f"ELSE COALESCE((SELECT a.id FROM {current} a WHERE a.lokalny_id = "
+                               f"rcn_lokalny_id(t.{column})), t.{column}) END AS {column}")
+            else:
+                columns.append(f"t.{column}")
+        where = f" WHERE t.id IN (SELECT id FROM temp.asof_{root})" if table == root else ""
+        conn.execute(f"CREATE TEMP VIEW {table} AS SELECT {', '.join(columns)} FROM main.{table} t{where}")
+        created.append(table)
+    return created
+
+
+def drop_as_of_views(conn: sqlite3.Connection, created: list[str]) -> None:
+    for name in reversed(created):
+        kind = "TABLE" if name.startswith("asof_") else "VIEW"
+        conn.execute(f"DROP {kind} IF EXISTS temp.{name}")
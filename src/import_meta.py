@@ -1,7 +1,28 @@
+import json
 import sqlite3
 import os
 from datetime import datetime
 
+# Columns added after the first release; created on existing databases by ensure_import_meta_schema()
+_IMPORT_META_EXTRA_COLUMNS = {
+    "features_processed": "INTEGER",
+    "features_per_sec": "REAL",
+    "peak_rss_mb": "REAL",
+    "stats_json": "TEXT",
+    # NULL = raw tables (load_rcn), 'direct_wide' = wide table only (build_wide_direct)
+    "mode": "TEXT",
+    # set once the derived tables (address index, duplicates, price index) are updated for the import or its purge
+    "indexed_at": "TEXT",
+}
+
+
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns: dict) -> None:
+    """Add missing columns (name -> SQL type) to an existing table."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, sql_type in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+
 
 def ensure_import_meta_schema(conn: sqlite3.Connection) -> None:
     """Create import metadata table."""
@@ -17,10 +38,95 @@ def ensure_import_meta_schema(conn: sqlite3.Connection) -> None:
         duration_seconds REAL
     );
     """)
+    _ensure_columns(conn, "_import_meta", _IMPORT_META_EXTRA_COLUMNS)
     conn.execute("CREATE INDEX IF NOT EXISTS idx_import_source ON _import_meta(source_file);")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_import_status ON _import_meta(status);")
 
 
+def ensure_import_timings_schema(conn: sqlite3.Connection) -> None:
+    """Create per-import timings table (filled when importing with --profile)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS _import_timings (
+        import_id INTEGER NOT NULL REFERENCES _import_meta(id),
+        feature_type TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        calls INTEGER,
+        seconds REAL,
+        PRIMARY KEY (import_id, feature_type, stage)
+    );
+    """)
+
+
+def ensure_import_issues_schema(conn: sqlite3.Connection) -> None:
+    """Create per-import parse issues table (aggregated counts, see src/diagnostics.py)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS _import_issues (
+        import_id INTEGER NOT NULL REFERENCES _import_meta(id),
+        feature_type TEXT NOT NULL,
+        field TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        sample_ids TEXT,
+        PRIMARY KEY (import_id, feature_type, field, kind)
+    );
+    """)
+
+
+def ensure_import_integrity_schema(conn: sqlite3.Connection) -> None:
+    """Create per-import referential integrity table (see src/integrity.py)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS _import_integrity (
+        import_id INTEGER NOT NULL REFERENCES _import_meta(id),
+        kind TEXT NOT NULL,
+        name TEXT NOT NULL,
+        target_type TEXT,
+        total INTEGER,
+        distinct_ids INTEGER,
+        count INTEGER NOT NULL,
+        sample_ids TEXT,
+        PRIMARY KEY (import_id, kind, name)
+    );
+    """)
+
+
+def save_import_integrity(conn: sqlite3.Connection, import_id: int, report: dict) -> None:
+    """
+    Store an integrity report: 'dangling' rows per relation (name = 'Type.field', total = references)
+    and 'orphan' rows per referenced type (total = seen features).
+    """
+    ensure_import_integrity_schema(conn)
+    rows = [(import_id, "dangling", f"{source}.{field}", target, references, distinct, dangling, samples)
+            for source, field, target, references, distinct, dangling, samples in report["relations"]]
+    rows += [(import_id, "orphan", target, target, seen, seen, count, samples)
+             for target, seen, count, samples in report["orphans"]]
+    conn.executemany(
+        "INSERT OR REPLACE INTO _import_integrity (import_id, kind, name, target_type, total, distinct_ids, count, sample_ids) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+
+
+def save_import_issues(conn: sqlite3.Connection, import_id: int, rows: list[tuple]) -> None:
+    """Store (feature_type, field, kind, count, sample_ids) rows for an import."""
+    ensure_import_issues_schema(conn)
+    conn.executemany(
+        "INSERT OR REPLACE INTO _import_issues (import_id, feature_type, field, kind, count, sample_ids) VALUES (?, ?, ?, ?, ?, ?)",
+        [(import_id,) + tuple(row) for row in rows]
+    )
+    conn.commit()
+
+
+def save_import_timings(conn: sqlite3.Connection, import_id: int, rows: list[tuple]) -> None:
+    """Store (feature_type, stage, calls, seconds) rows for an import."""
+    ensure_import_timings_schema(conn)
+    conn.executemany(
+        "INSERT OR REPLACE INTO _import_timings (import_id, feature_type, stage, calls, seconds) VALUES (?, ?, ?, ?, ?)",
+        [(import_id,) + tuple(row) for row in rows]
+    )
+    conn.commit()
+
+
 def is_file_imported(conn: sqlite3.Connection, source_file: str) -> dict | None:
     """
     Check if file was already successfully imported (exact match by name).
@@ -31,7 +137,7 @@ def is_file_imported(conn: sqlite3.Connection, source_file: str) -> dict | None:
     filename = os.path.basename(source_file)
 
     cursor = conn.execute(
-        "SELECT id, file_size, records_inserted FROM _import_meta WHERE source_file = ? AND status = 'completed' ORDER BY id DESC LIMIT 1",
+        "SELECT id, file_size, records_inserted FROM _import_meta WHERE source_file = ? AND status = 'completed' AND mode IS NULL ORDER BY id DESC LIMIT 1",
         (filename,)
     )
     row = cursor.fetchone()
@@ -59,7 +165,7 @@ def find_suspected_duplicate(conn: sqlite3.Connection, source_file: str) -> dict
     cursor = conn.execute(
         """SELECT id, source_file, file_size, records_inserted 
            FROM _import_meta 
-           WHERE file_size = ? AND source_file != ? AND status = 'completed' 
+           WHERE file_size = ? AND source_file != ? AND status = 'completed' AND mode IS NULL
            ORDER BY id DESC LIMIT 1""",
         (file_size, filename)
     )
@@ -77,31 +183,51 @@ def find_suspected_duplicate(conn: sqlite3.Connection, source_file: str) -> dict
     }
 
 
-def start_import(conn: sqlite3.Connection, source_file: str) -> int:
-    """Start an import and return the import_id."""
+def start_import(conn: sqlite3.Connection, source_file: str, mode: str | None = None) -> int:
+    """Start an import and return the import_id (mode: see _IMPORT_META_EXTRA_COLUMNS)."""
     file_size = os.path.getsize(source_file) if os.path.exists(source_file) else None
     cursor = conn.execute(
-        "INSERT INTO _import_meta (source_file, file_size, status, started_at) VALUES (?, ?, 'pending', ?)",
-        (os.path.basename(source_file), file_size, datetime.now().isoformat())
+        "INSERT INTO _import_meta (source_file, file_size, status, started_at, mode) VALUES (?, ?, 'pending', ?, ?)",
+        (os.path.basename(source_file), file_size, datetime.now().isoformat(), mode)
     )
     conn.commit()
     return cursor.lastrowid
 
 
-def complete_import(conn: sqlite3.Connection, import_id: int, records: int, duration: float) -> None:
-    """Mark import as completed."""
+def complete_import(conn: sqlite3.Connection, import_id: int, records: int, duration: float,
+                    stats: dict | None = None) -> None:
+    """
+    Mark import as completed.
+
+    Args:
+        stats: Optional final statistics; 'processed', 'features_per_sec' and 'peak_rss_mb'
+               go to their own columns, the whole dict is stored as JSON in stats_json
+    """
+    stats = stats or {}
     conn.execute(
         """UPDATE _import_meta 
            SET status = 'completed', 
                completed_at = ?, 
                records_inserted = ?, 
-               duration_seconds = ?
+               duration_seconds = ?,
+               features_processed = ?,
+               features_per_sec = ?,
+               peak_rss_mb = ?,
+               stats_json = ?
            WHERE id = ?""",
-        (datetime.now().isoformat(), records, duration, import_id)
+        (datetime.now().isoformat(), records, duration,
+         stats.get("processed"), stats.get("features_per_sec"), stats.get("peak_rss_mb"),
+         json.dumps(stats) if stats else None, import_id)
     )
     conn.commit()
 
 
+def mark_indexed(conn: sqlite3.Connection, import_id: int) -> None:
+    """Record that the derived tables are up to date with an import (or its purge)."""
+    conn.execute("UPDATE _import_meta SET indexed_at = ? WHERE id = ?", (datetime.now().isoformat(), import_id))
+    conn.commit()
+
+
 def fail_import(conn: sqlite3.Connection, import_id: int, error: str = None) -> None:
     """Mark import as failed."""
     conn.execute(
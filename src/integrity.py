@@ -0,0 +1,163 @@
+"""
+Referential integrity of one import, computed while streaming.
+
+The loader passes every parsed row to ReferenceTracker.track(): the feature id goes
+to the set of seen ids of its type, ids referenced by its href fields (and nieruchomosc
+links) go to the set of referenced ids of the relation. At the end of the import,
+report() returns per relation the dangling references (ids that never arrived) and per
+referenced type the orphan features (never referenced) - no anti-join over the raw
+tables is needed.
+
+When the sets grow beyond spill_threshold entries they are moved to a temporary SQLite
+file and the final report is computed there.
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+
+logger = logging.getLogger("rcn")
+
+
+class ReferenceTracker:
+    """
+    Seen and referenced ids per feature type / relation.
+
+    Args:
+        relations: (source feature type, field, target feature type) to check
+        spill_threshold: Ids kept in memory before moving them to disk
+        spill_dir: Directory for the spill file (default: system temp dir)
+        max_samples: Sample ids reported per relation / type
+    """
+
+    def __init__(self, relations: list[tuple[str, str, str]], spill_threshold: int = 5_000_000,
+                 spill_dir: str | None = None, max_samples: int = 5):
+        self.relations = list(relations)
+        self.targets = {target for _, _, target in self.relations}
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.max_samples = max_samples
+        self.seen = {}
+        self.refs = {(source, field): set() for source, field, _ in self.relations}
+        self.ref_counts = {(source, field): 0 for source, field, _ in self.relations}
+        self._in_memory = 0
+        self._spill = None
+        self._spill_path = None
+        self.spills = 0
+
+    def track(self, parser, row: tuple) -> None:
+        """Record the id of a parsed row and the ids it references."""
+        ftype = parser.FEATURE_TYPE
+        if ftype in self.targets:
+            seen = self.seen.get(ftype)
+            if seen is None:
+                seen = self.seen[ftype] = set()
+            seen.add(row[0])
+            self._in_memory += 1
+        for field, target, target_id in parser.references(row):
+            key = (ftype, field)
+            refs = self.refs.get(key)
+            if refs is None:
+                continue
+            refs.add(target_id)
+            self.ref_counts[key] += 1
+            self._in_memory += 1
+        if self._in_memory >= self.spill_threshold:
+            self._spill_sets()
+
+    def _spill_sets(self) -> None:
+        """Move in-memory sets to the spill database."""
+        if self._spill is None:
+            fd, self._spill_path = tempfile.mkstemp(prefix="rcn_refs_", suffix=".sqlite", dir=self.spill_dir)
+            os.close(fd)
+            self._spill = sqlite3.connect(self._spill_path)
+            self._spill.execute("PRAGMA journal_mode = OFF")
+            self._spill.execute("PRAGMA synchronous = OFF")
+            self._spill.execute("CREATE TABLE seen (feature_type TEXT, id TEXT, PRIMARY KEY (feature_type, id)) WITHOUT ROWID")
+            self._spill.execute("CREATE TABLE refs (source TEXT, field TEXT, target_id TEXT, "
+                                "PRIMARY KEY (source, field, target_id)) WITHOUT ROWID")
+            logger.info(f"[integrity] spilling id sets to {self._spill_path}")
+        for ftype, ids in self.seen.items():
+            self._spill.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?)", ((ftype, i) for i in ids))
+            ids.clear()
+        for (source, field), ids in self.refs.items():
+            self._spill.executemany("INSERT OR IGNORE INTO refs VALUES (?, ?, ?)", ((source, field, i) for i in ids))
+            ids.clear()
+        self._spill.commit()
+        self._in_memory = 0
+        self.spills += 1
+
+    def report(self) -> dict:
+        """
+        Return {"relations": [(source, field, target, references, distinct_targets, dangling, sample_ids)],
+                "orphans": [(feature_type, seen, orphans, sample_ids)]}.
+        """
+        if self._spill is not None:
+            self._spill_sets()
+            return self._report_spilled()
+
+        relations = []
+        referenced = {}
+        for source, field, target in self.relations:
+            ids = self.refs[(source, field)]
+            missing = ids - self.seen.get(target, set())
+            referenced.setdefault(target, set()).update(ids)
+            relations.append((source, field, target, self.ref_counts[(source, field)], len(ids),
+                              len(missing), ",".join(sorted(missing)[:self.max_samples])))
+        orphans = []
+        for target in sorted(self.targets):
+            seen = self.seen.get(target, set())
+            unreferenced = seen - referenced.get(target, set())
+            orphans.append((target, len(seen), len(unreferenced), ",".join(sorted(unreferenced)[:self.max_samples])))
+        return {"relations": relations, "orphans": orphans}
+
+    def _report_spilled(self) -> dict:
+        db = self._spill
+        relations = []
+        for source, field, target in self.relations:
+            distinct = db.execute("SELECT COUNT(*) FROM refs WHERE source = ? AND field = ?", (source, field)).fetchone()[0]
+            missing = """FROM refs r WHERE r.source = ? AND r.field = ?
+                         AND NOT EXISTS (SELECT 1 FROM seen s WHERE s.feature_type = ? AND s.id = r.target_id)"""
+            params = (source, field, target)
+            dangling = db.execute(f"SELECT COUNT(*) {missing}", params).fetchone()[0]
+            samples = [r[0] for r in db.execute(f"SELECT r.target_id {missing} ORDER BY r.target_id LIMIT ?",
+                                                params + (self.max_samples,))]
+            relations.append((source, field, target, self.ref_counts[(source, field)], distinct, dangling, ",".join(samples)))
+
+        orphans = []
+        for target in sorted(self.targets):
+            keys = [(s, f) for s, f, t in self.relations if t == target]
+            ref_filter = " OR ".join("(r.source = ? AND r.field = ?)" for _ in keys) or "0"
+            key_params = tuple(v for key in keys for v in key)
+            unreferenced = f"""FROM seen s WHERE s.feature_type = ?
+                               AND NOT EXISTS (SELECT 1 FROM refs r WHERE r.target_id = s.id AND ({ref_filter}))"""
+            seen = db.execute("SELECT COUNT(*) FROM seen WHERE feature_type = ?", (target,)).fetchone()[0]
+            count = db.execute(f"SELECT COUNT(*) {unreferenced}", (target,) + key_params).fetchone()[0]
+            samples = [r[0] for r in db.execute(f"SELECT s.id {unreferenced} ORDER BY s.id LIMIT ?",
+                                                (target,) + key_params + (self.max_samples,))]
+            orphans.append((target, seen, count, ",".join(samples)))
+        return {"relations": relations, "orphans": orphans}
+
+    def log_summary(self, report: dict) -> None:
+        logger.info("[summary] references:")
+        for source, field, target, references, distinct, dangling, samples in report["relations"]:
+            line = f"  {source}.{field} -> {target}: {references} refs ({distinct} distinct), {dangling} dangling"
+            if dangling:
+                logger.warning(line + f" (e.g. {samples})")
+            else:
+                logger.info(line)
+        logger.info("[summary] orphan features (never referenced):")
+        for target, seen, count, samples in report["orphans"]:
+            logger.info(f"  {target}: {count} of {seen}" + (f" (e.g. {samples})" if count else ""))
+
+    def close(self) -> None:
+        """Remove the spill file."""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        if self._spill_path:
+            try:
+                os.remove(self._spill_path)
+            except OSError:
+                pass
+            self._spill_path = None
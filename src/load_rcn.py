@@ -1,14 +1,26 @@
 #!/usr/bin/env python3
 import argparse
 import logging
+import json
 import os
+import re
 import sqlite3
 import time
 import xml.etree.ElementTree as ET
 
 from src.logging_config import setup_logging
-from src.utils import local
-from src.import_meta import ensure_import_meta_schema, start_import, complete_import, fail_import, is_file_imported, find_suspected_duplicate
+from src.utils import local, current_rss_mb, peak_rss_mb
+from src.import_meta import ensure_import_meta_schema, start_import, complete_import, fail_import, mark_indexed, is_file_imported, find_suspected_duplicate, save_import_timings, save_import_issues, save_import_integrity
+from src.profiling import ImportProfiler, ALL_TYPES
+from src.metrics import MetricsSink
+from src.diagnostics import ParseDiagnostics
+from src.flush_policy import FlushPolicy
+from src.integrity import ReferenceTracker
+from src.wal import enable_wal, ensure_completed_views, checkpoint
+from src.history import ensure_history, record_versions, close_versions
+from src.dedup import update_duplicates
+from src.price_index import update_price_index
+from src.search import update_address_index
 from src.parsers.transakcja import TransakcjaParser
 from src.parsers.lokal import LokalParser
 from src.parsers.dokument import DokumentParser
@@ -19,24 +31,147 @@ from src.parsers.budynek import BudynekParser
 
 
 # Parsers composition: add parsers explicitly.
-_parsers_instances = [
-    TransakcjaParser(config={}),
-    LokalParser(config={}),
-    DokumentParser(config={}),
-    NieruchomoscParser(config={}),
-    DzialkaParser(config={}),
-    AdresParser(config={}),
-    BudynekParser(config={}),
-]
-
-PARSERS = {
-    parser.FEATURE_TYPE: parser for parser in _parsers_instances
-}
-
-
-def iter_features(gml_path: str):
+_PARSER_CLASSES = (
+    TransakcjaParser,
+    LokalParser,
+    DokumentParser,
+    NieruchomoscParser,
+    DzialkaParser,
+    AdresParser,
+    BudynekParser,
+)
+
+
+def build_parsers(config: dict | None = None) -> dict:
+    """
+    Create parser instances keyed by feature type.
+
+    Args:
+        config: Parser configs keyed by feature type (full or short name), e.g.
+                {"RCN_Lokal": {"include": ["cena_lokalu_brutto", "pow_uzytkowo_lokalu"]},
+                 "*": {"exclude": ["raw_xml"]}}
+                "*" applies to all types (only "exclude"; unknown columns are ignored there).
+    """
+    config = dict(config or {})
+    common = config.pop("*", {})
+    if set(common) - {"exclude"}:
+        raise ValueError('Parser config "*" supports only "exclude"')
+    by_type = {}
+    for name, type_config in config.items():
+        (ftype,) = resolve_types([name])
+        by_type[ftype] = type_config
+
+    parsers = {}
+    for cls in _PARSER_CLASSES:
+        known = {f.column for f in cls.FIELDS}
+        type_config = dict(by_type.get(cls.FEATURE_TYPE, {}))
+        common_exclude = [c for c in common.get("exclude", ()) if c in known]
+        if common_exclude:
+            type_config["exclude"] = list(type_config.get("exclude", ())) + common_exclude
+        parsers[cls.FEATURE_TYPE] = cls(config=type_config)
+    return parsers
+
+
+def load_parser_config(path: str) -> dict:
+    """Read parser config (see build_parsers) from a JSON file."""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"Parser config must be a JSON object: {path}")
+    return config
+
+
+PARSERS = build_parsers()
+
+
+def resolve_types(names: list[str] | None) -> set[str] | None:
+    """
+    Map feature type names to PARSERS keys. Accepts full names ('RCN_Lokal')
+    or short ones ('lokal'), case-insensitive. Returns None for no filter.
+    """
+    if not names:
+        return None
+    by_name = {}
+    for ft in (cls.FEATURE_TYPE for cls in _PARSER_CLASSES):
+        by_name[ft.lower()] = ft
+        by_name[ft.lower().removeprefix("rcn_")] = ft
+    types = set()
+    for name in names:
+        ft = by_name.get(name.strip().lower())
+        if ft is None:
+            raise ValueError(f"Unknown feature type: {name}. Known: {', '.join(cls.FEATURE_TYPE for cls in _PARSER_CLASSES)}")
+        types.add(ft)
+    return types
+
+
+_READ_CHUNK = 1 << 20
+
+
+def _iter_member_chunks(f):
+    """
+    Split raw GML bytes into featureMember chunks without parsing XML.
+
+    Yields (kind, data, feature_type):
+        ("head", bytes, None)   - everything before the first featureMember (root start tag)
+        ("member", bytes, str)  - one <gml:featureMember>...</gml:featureMember> with whitespace after it;
+                                  feature_type is the local name of its child, read from the start tag
+        ("tail", bytes, None)   - closing root tag
+    """
+    buf = f.read(_READ_CHUNK)
+    idx = buf.find(b"featureMember")
+    while idx == -1:
+        more = f.read(_READ_CHUNK)
+        if not more:
+            yield "tail", buf, None
+            return
+        buf += more
+        idx = buf.find(b"featureMember")
+
+    start = buf.rfind(b"<", 0, idx)
+    prefix = buf[start + 1:idx]  # e.g. b"gml:"
+    # member start tag, but not <gml:featureMembers>
+    member_re = re.compile(b"<" + re.escape(prefix) + rb"featureMember(?=[\s>/])")
+    close_tag = b"</" + prefix + b"featureMember>"
+    yield "head", buf[:start], None
+
+    pos = start
+    eof = False
+    while True:
+        m = member_re.search(buf, pos + 1)
+        if m is None and not eof:
+            # need more data: drop consumed bytes, read next chunk
+            buf = buf[pos:]
+            pos = 0
+            more = f.read(_READ_CHUNK)
+            if more:
+                buf += more
+            else:
+                eof = True
+            continue
+        if m is None:
+            # last member: split off the closing root tag
+            end = buf.rfind(close_tag)
+            end = end + len(close_tag) if end != -1 else len(buf)
+            yield "member", buf[pos:end], _child_type(buf, pos)
+            yield "tail", buf[end:], None
+            return
+        yield "member", buf[pos:m.start()], _child_type(buf, pos)
+        pos = m.start()
+
+
+_CHILD_RE = re.compile(rb"<(?:!--.*?-->\s*<)?(?:[\w.\-]+:)?([\w.\-]+)", re.S)
+
+
+def _child_type(buf: bytes, member_pos: int) -> str | None:
+    """Local name of the first child element of the featureMember starting at member_pos."""
+    m = _CHILD_RE.search(buf, buf.find(b">", member_pos) + 1)
+    return m.group(1).decode("ascii", "replace") if m else None
+
+
+def iter_features(gml_path, types: set[str] | None = None):
     """
     Streaming: yields the first child element of each gml:featureMember.
+    gml_path can be a path or a binary file object (e.g. to track bytes read with tell()).
     Structure is like:
     <gml:FeatureCollection gml:id="fc_12345">
         <gml:featureMember>
@@ -50,7 +185,14 @@ def iter_features(gml_path: str):
             </rcn:RCN_Adres>
         </gml:featureMember>
     </gml:FeatureCollection>
+
+    With `types`, members are split on raw bytes first and features of other types are
+    recognized from their start tag and skipped without being parsed at all.
     """
+    if types:
+        yield from _iter_filtered_features(gml_path, types)
+        return
+
     context = ET.iterparse(gml_path, events=("start", "end"))
     _, root = next(context)  # root element for <gml:FeatureCollection .../>
 
@@ -70,7 +212,32 @@ def iter_features(gml_path: str):
             root.clear()
 
 
-def count_features(gml_path: str) -> int:
+def _iter_filtered_features(gml_path, types: set[str]):
+    """iter_features() restricted to given feature types (see _iter_member_chunks)."""
+    f = open(gml_path, "rb") if isinstance(gml_path, str) else gml_path
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    try:
+        for kind, data, ftype in _iter_member_chunks(f):
+            if kind == "member" and ftype not in types:
+                continue
+            parser.feed(data)
+            for event, elem in parser.read_events():
+                if root is None and event == "start":
+                    root = elem
+                if event == "end" and local(elem.tag) == "featureMember":
+                    children = list(elem)
+                    if children:
+                        yield children[0]
+                    elem.clear()
+                    root.clear()
+        parser.close()
+    finally:
+        if f is not gml_path:
+            f.close()
+
+
+def count_features(gml_path: str, types: set[str] | None = None) -> int:
     """
     Count total number of featureMember elements in GML file.
     Coule be `grep`, but we want to avoid external dependencies and be portable across platforms.
@@ -80,7 +247,13 @@ def count_features(gml_path: str) -> int:
         capture_output=True,
         text=True
     ).stdout.strip())
+
+    With `types`, only members of given feature types are counted (raw byte scan, no XML parsing).
     """
+    if types:
+        with open(gml_path, "rb") as f:
+            return sum(1 for kind, _, ftype in _iter_member_chunks(f) if kind == "member" and ftype in types)
+
     count = 0
     context = ET.iterparse(gml_path, events=("end",))
     for event, elem in context:
@@ -90,7 +263,30 @@ def count_features(gml_path: str) -> int:
     return count
 
 
-def load_rcn(gml_path: str, db_path: str, batch_size: int = 100000, log_every: int = 500000, force: bool = False) -> dict:
+def _update_indexes(conn: sqlite3.Connection, import_id: int) -> None:
+    """
+    Keep the derived tables (address index, duplicates, price index) up to date after an import.
+    The import is already completed: a failure is logged and leaves its status alone.
+    indexed_at is set last, so the query service clears its cache once more after the updates.
+    """
+    logger = logging.getLogger("rcn")
+    for update in (update_address_index, update_duplicates, update_price_index):
+        try:
+            update(conn)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"{update.__name__} failed after import {import_id} (run it again with its command): {e}")
+    mark_indexed(conn, import_id)
+
+
+def load_rcn(gml_path: str, db_path: str, batch_size: int = 100000, log_every: int = 500000, force: bool = False,
+             profile: bool = False, profile_dir: str | None = None,
+             metrics: str | None = None, metrics_every: int = 100000,
+             memory_budget_mb: float | None = None, flush_target_seconds: float = 2.0,
+             types: list[str] | None = None, limit: int | None = None,
+             parser_config: dict | None = None,
+             check_refs: bool = True, ref_spill_threshold: int = 5_000_000,
+             wal: bool = False, commit_seconds: float | None = None) -> dict:
     """
     Load RCN GML file into SQLite database.
 
@@ -100,6 +296,20 @@ def load_rcn(gml_path: str, db_path: str, batch_size: int = 100000, log_every: i
         batch_size: Batch size for inserts
         log_every: Log progress every N features
         force: Force re-import even if file was already imported
+        profile: Collect timings per feature type and stage (stored in _import_timings)
+        profile_dir: Also write cProfile/tracemalloc dumps to this directory (implies profile)
+        metrics: JSON-lines metrics sink: file path, "-" for stdout or "fd:N" (see src/metrics.py)
+        metrics_every: Emit a progress metrics record every N features
+        memory_budget_mb: Flush when buffered rows take approx. this many MB (limit tuned from flush latency)
+        flush_target_seconds: Desired flush latency in memory budget mode
+        types: Import only these feature types; others are skipped without parsing
+        limit: Stop reading after N (selected) features
+        parser_config: Column projection per feature type (see build_parsers)
+        check_refs: Track seen/referenced ids and report dangling references and orphans (see src/integrity.py)
+        ref_spill_threshold: Ids kept in memory by the reference check before spilling to disk
+        wal: Switch the database to WAL mode with bounded checkpoints and create <table>_completed
+             views, so readers can query completed imports while this one runs (see src/wal.py)
+        commit_seconds: Also commit when this many seconds passed since the last commit
 
     Returns:
         dict with statistics: processed, inserted, by_type, elapsed
@@ -113,13 +323,41 @@ def load_rcn(gml_path: str, db_path: str, batch_size: int = 100000, log_every: i
     logger.info(f"Database: {db_path}")
     logger.info(f"Batch size: {batch_size}")
     logger.info(f"Log every N features: {log_every}")
-
-    logger.info("Counting features in GML file...")
-    total_features = count_features(gml_path)
+    types = resolve_types(types)
+    parsers = build_parsers(parser_config) if parser_config else PARSERS
+    if parser_config:
+        for ft, p in parsers.items():
+            skipped = [f.column for f in p.FIELDS if f not in p.fields]
+            if skipped:
+                logger.info(f"{ft}: skipping columns {', '.join(skipped)}")
+    if types:
+        logger.info(f"Feature types: {', '.join(sorted(types))}")
+    if limit:
+        logger.info(f"Limit: {limit} features")
+    if wal or commit_seconds:
+        logger.info(f"WAL: {'on' if wal else 'off'}, commit every: {commit_seconds or '-'}s")
+    if memory_budget_mb:
+        logger.info(f"Memory budget: {memory_budget_mb}MB, flush target: {flush_target_seconds}s")
+
+    profiler = ImportProfiler(profile_dir) if (profile or profile_dir) else None
+    if profiler:
+        logger.info(f"Profiling: on, dumps: {profile_dir or '-'}")
+
+    if limit:
+        # no need to scan the whole file when only the first N features are read
+        total_features = limit
+    else:
+        logger.info("Counting features in GML file...")
+        count_start = time.perf_counter()
+        total_features = count_features(gml_path, types)
+        if profiler:
+            profiler.add(ALL_TYPES, "count", time.perf_counter() - count_start)
     logger.info(f"Total features to process: {total_features}")
     logger.info("=" * 60)
 
     conn = sqlite3.connect(db_path)
+    if wal:
+        enable_wal(conn)
 
     # Create import metadata table
     ensure_import_meta_schema(conn)
@@ -143,64 +381,144 @@ def load_rcn(gml_path: str, db_path: str, batch_size: int = 100000, log_every: i
         conn.close()
         return {"skipped": True, "reason": "suspected_duplicate", "similar_to": other_file}
 
-    for p in PARSERS.values():
+    for p in parsers.values():
         p.ensure_schema(conn)
+        ensure_history(conn, p.TABLE)
+    if wal:
+        ensure_completed_views(conn)
     conn.commit()
 
     # Start import - get import_id
     import_id = start_import(conn, gml_path)
     logger.info(f"Started import with id={import_id}")
 
-    buffers = {ft: [] for ft in PARSERS.keys()}
+    buffers = {ft: [] for ft in parsers.keys()}
     processed = 0
     inserted = 0
     inserted_by_type = {}
     seen_by_type = {}
+    file_size = os.path.getsize(gml_path)
+    gml_file = open(gml_path, "rb")
+    sink = MetricsSink(metrics) if metrics else None
+    policy = FlushPolicy(batch_size, int(memory_budget_mb * 1_000_000) if memory_budget_mb else None, flush_target_seconds,
+                         commit_seconds)
+    diagnostics = ParseDiagnostics()
+    for p in parsers.values():
+        p.diagnostics = diagnostics
+    tracker = None
+    if check_refs:
+        loaded = set(types) if types else set(parsers)
+        relations = [(ft, field, target) for ft, p in parsers.items() if ft in loaded
+                     for field, target in p.relations() if target in loaded]
+        tracker = ReferenceTracker(relations, ref_spill_threshold, spill_dir=os.path.dirname(os.path.abspath(db_path)))
+
+    def metrics_record() -> dict:
+        """Common fields of metrics records (rates are cumulative since start)."""
+        elapsed = time.time() - start
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        bytes_read = gml_file.tell() if not gml_file.closed else file_size
+        eta = (total_features - processed) / rate if rate > 0 else None
+        return {
+            "import_id": import_id,
+            "source_file": os.path.basename(gml_path),
+            "elapsed": round(elapsed, 3),
+            "processed": processed,
+            "total_features": total_features,
+            "pct_features": round(processed / total_features * 100, 2) if total_features else None,
+            "bytes_read": bytes_read,
+            "file_size": file_size,
+            "pct_bytes": round(bytes_read / file_size * 100, 2) if file_size else None,
+            "features_per_sec": round(rate, 1),
+            "inserted": inserted,
+            "rows_per_sec_by_type": {ft: round(n / elapsed, 1) for ft, n in inserted_by_type.items()} if elapsed > 0 else {},
+            "buffer_rows": {ft: len(b) for ft, b in buffers.items()},
+            "buffer_bytes": policy.buffered_bytes,
+            "flush_limit_bytes": policy.limit_bytes,
+            "rss_mb": current_rss_mb(),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+        }
 
     def flush():
         nonlocal inserted
+        flush_start = time.perf_counter()
+        buffered_rows = {ft: len(b) for ft, b in buffers.items() if b}
+        buffered_bytes = policy.buffered_bytes
         batch_inserted = 0
         batch_details = []
-        for ft, parser in PARSERS.items():
+        for ft, parser in parsers.items():
             buf = buffers[ft]
             if not buf:
                 continue
-            num_inserted = parser.insert_many(conn, buf)
+            if profiler:
+                num_inserted = profiler.insert_many(parser, conn, buf)
+            else:
+                num_inserted = parser.insert_many(conn, buf)
+            record_versions(conn, parser.TABLE, buf)
             batch_inserted += num_inserted
             inserted += num_inserted
             inserted_by_type[ft] = inserted_by_type.get(ft, 0) + num_inserted
             batch_details.append(f"{ft}={num_inserted}")
             buf.clear()
-        conn.commit()
+        if profiler:
+            profiler.commit(conn)
+        else:
+            conn.commit()
+        flush_seconds = time.perf_counter() - flush_start
+        policy.flushed(flush_seconds)
         details_str = ", ".join(batch_details)
+        if policy.memory_budget:
+            details_str += f"; {buffered_bytes / 1_000_000:.1f}MB in {flush_seconds:.2f}s, next limit {policy.limit_bytes / 1_000_000:.1f}MB"
         logger.info(f"[flush] batch_rows={batch_inserted} ({details_str}), total_inserted={inserted}")
+        if sink:
+            record = metrics_record()
+            record["buffer_rows"] = buffered_rows
+            record["buffer_bytes"] = buffered_bytes
+            sink.emit("flush", flush_rows=batch_inserted, flush_seconds=round(flush_seconds, 4), **record)
+
+    features = iter_features(gml_file, types)
+    if profiler:
+        features = profiler.iter_features(features)
+        for p in parsers.values():
+            p.profiler = profiler
+        profiler.start()
 
     start = time.time()
+    if sink:
+        sink.emit("start", **metrics_record())
     try:
-        for feature in iter_features(gml_path):
+        for feature in features:
+            if limit and processed >= limit:
+                logger.info(f"Limit of {limit} features reached, stopping.")
+                break
             processed += 1
 
             ftype = local(feature.tag)
             seen_by_type[ftype] = seen_by_type.get(ftype, 0) + 1
 
-            p = PARSERS.get(ftype)
+            p = parsers.get(ftype)
             if not p:
-                logger.warning(f"unknown feature type: {ftype}")
+                diagnostics.record(ftype, "-", "unknown_feature_type")
                 continue
 
-            row = p.parse(feature)
+            row = profiler.parse(p, feature) if profiler else p.parse(feature)
             if row is not None:
+                if tracker:
+                    tracker.track(p, row)
                 # Add import_id to each row
                 row_with_import = row + (import_id,)
-                buffers[ftype].append(row_with_import)
-
-            if any(len(b) >= batch_size for b in buffers.values()):
-                flush()
+                buf = buffers[ftype]
+                buf.append(row_with_import)
+                # only the buffer we just appended to can cross the limit: O(1) check
+                if policy.add(row_with_import, len(buf)):
+                    flush()
 
             if log_every and processed % log_every == 0:
                 pct = (processed / total_features) * 100
                 logger.info(f"[progress] {pct:.1f}% ({processed}/{total_features}), inserted={inserted}")
 
+            if sink and metrics_every and processed % metrics_every == 0:
+                sink.emit("progress", **metrics_record())
+
         flush()
 
         logger.info("[summary] processed by type:")
@@ -211,28 +529,88 @@ def load_rcn(gml_path: str, db_path: str, batch_size: int = 100000, log_every: i
         for k in sorted(inserted_by_type):
             logger.info(f"  {k}: {inserted_by_type[k]}")
 
+        diagnostics.log_summary()
+        save_import_issues(conn, import_id, diagnostics.rows())
+
+        integrity = None
+        if tracker:
+            integrity = tracker.report()
+            tracker.log_summary(integrity)
+            if limit and processed >= limit:
+                logger.info("[summary] import stopped at --limit: dangling references may point past it")
+            save_import_integrity(conn, import_id, integrity)
+
+        if profiler:
+            profiler.stop(import_id)
+            profiler.log_summary()
+            save_import_timings(conn, import_id, profiler.rows())
+
         elapsed = time.time() - start
+        stats = {
+            "processed": processed,
+            "inserted": inserted,
+            "features_per_sec": round(processed / elapsed, 1) if elapsed > 0 else None,
+            "rows_per_sec_by_type": {ft: round(n / elapsed, 1) for ft, n in inserted_by_type.items()} if elapsed > 0 else {},
+            "seen_by_type": seen_by_type,
+            "inserted_by_type": inserted_by_type,
+            "file_size": file_size,
+            "peak_rss_mb": peak_rss_mb(),
+            "issues": diagnostics.total(),
+            "dangling_refs": sum(r[5] for r in integrity["relations"]) if integrity else None,
+            "types": sorted(types) if types else None,
+            "limit": limit,
+        }
+
+        # valid_to of the versions this import added or superseded
+        for p in parsers.values():
+            close_versions(conn, p.TABLE, import_id)
 
         # Complete import
-        complete_import(conn, import_id, inserted, elapsed)
+        complete_import(conn, import_id, inserted, elapsed, stats)
+        if sink:
+            sink.emit("end", status="completed", **metrics_record())
         logger.info(f"Import completed: id={import_id}, records={inserted}, time={elapsed:.0f}s")
+        _update_indexes(conn, import_id)
+        if wal:
+            busy, pages, done = checkpoint(conn)
+            logger.info(f"WAL checkpoint: {done}/{pages} pages" + (" (readers active, rest later)" if busy or done < pages else ""))
 
         logger.info(f"Done. processed={processed}, inserted={inserted}, db={db_path}, time={elapsed:.0f}s")
 
-        return {
+        result = {
             "processed": processed,
             "inserted": inserted,
             "seen_by_type": seen_by_type,
             "inserted_by_type": inserted_by_type,
             "elapsed": elapsed,
             "import_id": import_id,
+            "issues": diagnostics.total(),
         }
+        if profiler:
+            result["timings"] = profiler.rows()
+        if integrity:
+            result["integrity"] = integrity
+        return result
     except Exception as e:
         # Mark import as failed
         fail_import(conn, import_id)
         logger.error(f"Import failed: id={import_id}, error={e}")
+        if sink:
+            sink.emit("end", status="failed", error=str(e), **metrics_record())
         raise
     finally:
+        for p in parsers.values():
+            p.diagnostics = ParseDiagnostics()
+            p.take_links()  # links left by a failed import must not be written with the next one
+        if tracker:
+            tracker.close()
+        gml_file.close()
+        if sink:
+            sink.close()
+        if profiler:
+            profiler.stop(import_id)  # no-op if already stopped; keeps dumps of failed imports
+            for p in parsers.values():
+                p.profiler = None
         conn.close()
 
 
@@ -51,3 +51,21 @@ def setup_logging(log_file: str = None) -> logging.Logger:
 
     return logger
 
+
+
+def setup_worker_logging() -> logging.Logger:
+    """
+    Console-only logging for pool workers: spawned processes start without handlers,
+    and each of them opening its own log file would leave one file per worker.
+    """
+    logger = logging.getLogger("rcn")
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s - %(levelname)s - %(processName)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        ))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
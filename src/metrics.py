@@ -0,0 +1,58 @@
+"""
+Machine-readable metrics stream (JSON lines) for monitoring long imports.
+
+Each line is one JSON object with an "event" field:
+    start     - import started
+    progress  - every N processed features
+    flush     - after each buffer flush (with flush latency)
+    end       - import finished (status completed/failed)
+"""
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+logger = logging.getLogger("rcn")
+
+
+class MetricsSink:
+    """
+    JSON-lines writer.
+
+    Args:
+        target: File path (appended to), "-" for stdout or "fd:N" for an open file descriptor
+    """
+
+    def __init__(self, target: str):
+        self.target = target
+        if target == "-":
+            self._file = sys.stdout
+            self._owned = False
+        elif target.startswith("fd:"):
+            self._file = os.fdopen(int(target[3:]), "w", encoding="utf-8", closefd=False)
+            self._owned = True
+        else:
+            self._file = open(target, "a", encoding="utf-8")
+            self._owned = True
+
+    def emit(self, event: str, **fields) -> None:
+        """Write one record. A broken sink disables metrics but never fails the import."""
+        if self._file is None:
+            return
+        record = {"event": event, "ts": datetime.now().isoformat()}
+        record.update(fields)
+        try:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+        except OSError as e:
+            logger.warning(f"metrics sink {self.target} failed, metrics disabled: {e}")
+            self._file = None
+
+    def close(self) -> None:
+        if self._owned and self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._owned = False
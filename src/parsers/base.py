@@ -1,35 +1,169 @@
+import json
 import logging
 import sqlite3
-from abc import ABC, abstractmethod
+from abc import ABC
 import xml.etree.ElementTree as ET
 from datetime import date
+from typing import NamedTuple
+
+from src.diagnostics import ParseDiagnostics
+from src.dictionaries import ensure_lookup_tables
+from src import geometry
 
 # Logger for all parsers to use. Configured via setup_logging().
 logger = logging.getLogger("rcn")
 
 
+class Field(NamedTuple):
+    """
+    Column of a raw table and where its value comes from.
+
+    kind:
+        "text"    - text of the first descendant with local name `source`
+        "href"    - id from xlink:href of the first descendant with local name `source`
+        "code"    - integer code of a dictionary-coded attribute (text of `source`)
+        "derived" - computed by the parser method `_derive_<column>(feature_elem, values)`
+
+    target: feature type referenced by the column (checked by src/integrity.py)
+    dictionary: code list of a "code" field (lookup table dict_<dictionary>, see src/dictionaries.py)
+    """
+    column: str
+    sql_type: str
+    kind: str = "text"
+    source: str | None = None
+    required: bool = False
+    index: str | None = None
+    target: str | None = None
+    dictionary: str | None = None
+
+
+def geometry_fields(bbox_index: str) -> tuple[Field, ...]:
+    """
+    Geometry columns: GeoJSON geometry in EPSG:2178 ([easting, northing], see src/geometry.py)
+    and its bounding box, indexed for bbox filters.
+    """
+    return (
+        Field("geometria", "TEXT", "derived"),
+        Field("min_x", "REAL", "derived", index=bbox_index),
+        Field("min_y", "REAL", "derived"),
+        Field("max_x", "REAL", "derived"),
+        Field("max_y", "REAL", "derived"),
+    )
+
+
+def geometry_metric_fields() -> tuple[Field, ...]:
+    """
+    Planar metrics of the geometry (m2 / m in EPSG:2178, see geometry.metrics), computed
+    from the coordinates already read for the geometria and bbox columns.
+    """
+    return (
+        Field("geom_area", "REAL", "derived"),
+        Field("geom_perimeter", "REAL", "derived"),
+        Field("centroid_x", "REAL", "derived"),
+        Field("centroid_y", "REAL", "derived"),
+    )
+
+
 class BaseParser(ABC):
     """
     Abstract base class for GML feature parsers.
 
+    Subclasses declare FEATURE_TYPE, TABLE, FIELDS and IMPORT_INDEX; table schema,
+    INSERT_SQL and parse() are generated from FIELDS. The parser config can project
+    the optional columns: {"include": [...]} or {"exclude": [...]} (the id and
+    import_id columns are always kept). Skipped fields are not looked up at all.
+
     Helper methods (_local, _get_gml_id, _find_first_href etd.) provide common
     XML parsing utilities used by all parsers to extract data from GML elements
     """
 
     XLINK_NS = "http://www.w3.org/1999/xlink"
 
+    FEATURE_TYPE: str
+    TABLE: str
+    FIELDS: tuple[Field, ...]
+    IMPORT_INDEX: str
+
     def __init__(self, config):
         self.config = config
+        # Set by the loader when profiling is enabled (see src/profiling.py)
+        self.profiler = None
+        # Parse issues are counted here; the loader sets a shared collector per import
+        self.diagnostics = ParseDiagnostics()
+
+        self.fields = self._project_fields(config or {})
+        self.columns = ("id",) + tuple(f.column for f in self.fields) + ("import_id",)
+        self.INSERT_SQL = (
+            f"INSERT OR REPLACE INTO {self.TABLE} ({', '.join(self.columns)}) "
+            f"VALUES ({', '.join('?' for _ in self.columns)});"
+        )
+        self._extractors = [(f.column, self._extractor(f)) for f in self.fields]
+        # (position in parsed row, column, target feature type) of reference columns
+        self._ref_positions = [(i + 1, f.column, f.target) for i, f in enumerate(self.fields) if f.target]
+
+    def _project_fields(self, config: dict) -> tuple[Field, ...]:
+        """Select fields according to config {"include": [...]} / {"exclude": [...]}."""
+        known = {f.column for f in self.FIELDS}
+        include = config.get("include")
+        exclude = set(config.get("exclude") or ())
+        unknown = (set(include or ()) | exclude) - known
+        if unknown:
+            raise ValueError(f"{self.FEATURE_TYPE}: unknown columns in parser config: {', '.join(sorted(unknown))}. "
+                             f"Known: {', '.join(f.column for f in self.FIELDS)}")
+        return tuple(f for f in self.FIELDS
+                     if (include is None or f.column in include) and f.column not in exclude)
+
+    def _extractor(self, field: Field):
+        """Return function (feature_elem, values) -> value for a field."""
+        if field.kind == "text":
+            return lambda elem, values: self._find_first_text(elem, field.source, field.required)
+        if field.kind == "href":
+            return lambda elem, values: self._find_first_ref(elem, field.source, field.required)
+        if field.kind == "code":
+            return lambda elem, values: self._find_first_code(elem, field.source, field.required)
+        if field.kind == "derived":
+            return getattr(self, f"_derive_{field.column}")
+        raise ValueError(f"unknown field kind: {field.kind}")
 
-    @abstractmethod
     def ensure_schema(self, conn: sqlite3.Connection) -> None:
-        """ Create the necessary tables and indexes if they don't exist """
-        raise NotImplementedError
+        """ Create the table (projected columns) and indexes if they don't exist, add missing columns """
+        column_defs = ",\n          ".join(
+            ["id TEXT PRIMARY KEY"]
+            + [f"{f.column} {f.sql_type}" for f in self.fields]
+            + ["import_id INTEGER REFERENCES _import_meta(id)"]
+        )
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} (\n          {column_defs}\n        );")
+
+        # table may exist from an import with a different projection
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({self.TABLE})")}
+        for f in self.fields:
+            if f.column not in existing:
+                conn.execute(f"ALTER TABLE {self.TABLE} ADD COLUMN {f.column} {f.sql_type}")
+
+        for f in self.fields:
+            if f.index:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {f.index} ON {self.TABLE}({f.column});")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.IMPORT_INDEX} ON {self.TABLE}(import_id);")
+
+        dictionaries = {f.dictionary for f in self.fields if f.dictionary}
+        if dictionaries:
+            ensure_lookup_tables(conn, dictionaries)
+
+    def parse(self, feature_elem: ET.Element) -> tuple | None:
+        """ Return a tuple of values (id + projected fields) to be inserted into the database, or None to skip """
+        fid = self._get_gml_id(feature_elem)
+        if not fid:
+            # already recorded as missing_id issue by _get_gml_id
+            return None
 
-    @abstractmethod
-    def parse(self, feature_elem: ET.Element):
-        """ Return a tuple of values to be inserted into the database, or None to skip """
-        raise NotImplementedError
+        values = self._start_values(feature_elem, fid)
+        for column, extract in self._extractors:
+            values[column] = extract(feature_elem, values)
+        return (fid,) + tuple(values[column] for column, _ in self._extractors)
+
+    def _start_values(self, feature_elem: ET.Element, fid: str) -> dict:
+        """Initial values passed to extractors; subclasses may add shared lookups."""
+        return {"id": fid}
 
     def insert_many(self, conn: sqlite3.Connection, rows) -> int:
         if not rows:
@@ -37,6 +171,74 @@ class BaseParser(ABC):
         conn.executemany(self.INSERT_SQL, rows)
         return len(rows)
 
+    def relations(self) -> list[tuple[str, str]]:
+        """Return (field, target feature type) of references made by this parser."""
+        return [(column, target) for _, column, target in self._ref_positions]
+
+    def references(self, row: tuple) -> list[tuple[str, str, str]]:
+        """Return (field, target feature type, target id) referenced by a parsed row."""
+        return [(column, target, row[pos]) for pos, column, target in self._ref_positions if row[pos]]
+
+    def take_links(self) -> list[tuple]:
+        """Return and forget link rows collected by parse() (parsers with link tables override this)."""
+        return []
+
+    def add_links(self, links: list[tuple]) -> None:
+        """Queue link rows returned by take_links() (e.g. in another process) for write_links()."""
+
+    def write_links(self, conn: sqlite3.Connection, import_ids: dict) -> None:
+        """Write queued links of the given ids (id -> import_id)."""
+
+    def _derive_data_wpisu(self, feature_elem: ET.Element, values: dict) -> str | None:
+        return self._extract_date_from_gml_id(values["id"])
+
+    def _derive_raw_xml(self, feature_elem: ET.Element, values: dict) -> str:
+        return self._raw_xml(feature_elem)
+
+    def _bbox(self, feature_elem: ET.Element, values: dict) -> tuple:
+        """Read the geometry once per feature; shared by the geometria and bbox columns."""
+        if "_geometry" not in values:
+            values["_geometry"] = geometry.read_geometry(feature_elem)
+            values["_bbox"] = geometry.bbox(values["_geometry"]) or (None, None, None, None)
+        return values["_bbox"]
+
+    def _derive_geometria(self, feature_elem: ET.Element, values: dict) -> str | None:
+        self._bbox(feature_elem, values)
+        if values["_geometry"] is None:
+            return None
+        return json.dumps(values["_geometry"], separators=(",", ":"))
+
+    def _derive_min_x(self, feature_elem: ET.Element, values: dict) -> float | None:
+        return self._bbox(feature_elem, values)[0]
+
+    def _derive_min_y(self, feature_elem: ET.Element, values: dict) -> float | None:
+        return self._bbox(feature_elem, values)[1]
+
+    def _derive_max_x(self, feature_elem: ET.Element, values: dict) -> float | None:
+        return self._bbox(feature_elem, values)[2]
+
+    def _derive_max_y(self, feature_elem: ET.Element, values: dict) -> float | None:
+        return self._bbox(feature_elem, values)[3]
+
+    def _metrics(self, feature_elem: ET.Element, values: dict) -> tuple:
+        """Geometry metrics, computed once per feature from the shared geometry."""
+        if "_metrics" not in values:
+            self._bbox(feature_elem, values)
+            values["_metrics"] = geometry.metrics(values["_geometry"])
+        return values["_metrics"]
+
+    def _derive_geom_area(self, feature_elem: ET.Element, values: dict) -> float | None:
+        return self._metrics(feature_elem, values)[0]
+
+    def _derive_geom_perimeter(self, feature_elem: ET.Element, values: dict) -> float | None:
+        return self._metrics(feature_elem, values)[1]
+
+    def _derive_centroid_x(self, feature_elem: ET.Element, values: dict) -> float | None:
+        return self._metrics(feature_elem, values)[2]
+
+    def _derive_centroid_y(self, feature_elem: ET.Element, values: dict) -> float | None:
+        return self._metrics(feature_elem, values)[3]
+
     def _local(self, tag: str) -> str:
         """
         Return tag name without XML namespace.
@@ -58,9 +260,26 @@ class BaseParser(ABC):
         if value:
             return value.strip()
         else:
-            logger.error(f"missing gml:id for element, skipping. Element: {ET.tostring(elem, encoding='unicode')}")
+            self._report(elem, "gml:id", "missing_id")
             return None
 
+    def _report(self, elem: ET.Element, field: str, kind: str) -> None:
+        """
+        Record a parse issue. Sample id is the gml:id of the element (or its lokalnyId).
+        Only called on the error path, so the id lookup cost does not matter.
+        """
+        sample = None
+        for attr_name, attr_value in elem.attrib.items():
+            if (attr_name == "id" or attr_name.endswith("}id")) and attr_value:
+                sample = attr_value
+                break
+        if sample is None:
+            for node in elem.iter():
+                if self._local(node.tag) == "lokalnyId" and node.text:
+                    sample = f"lokalnyId={node.text.strip()}"
+                    break
+        self.diagnostics.record(getattr(self, "FEATURE_TYPE", "?"), field, kind, sample)
+
     def _find_first_href(self, elem: ET.Element, field_localname: str, required: bool = True) -> str | None:
         """
         Find xlink:href value inside the first descendant with a given local tag name.
@@ -82,16 +301,42 @@ class BaseParser(ABC):
                 return href.strip()
             else:
                 if required:
-                    logger.error(f"missing xlink:href for {field_localname} reference, skipping. Element: {ET.tostring(node, encoding='unicode')}")
+                    self._report(elem, field_localname, "missing_href")
                 return None
 
         return None
 
+    def _find_first_ref(self, elem: ET.Element, field_localname: str, required: bool = True) -> str | None:
+        """Return the id referenced by the first href with a given local tag name (see _find_first_href)."""
+        href = self._find_first_href(elem, field_localname, required)
+        ref_id = self._href_to_id(href, field_localname)
+        if href and not ref_id:
+            self._report(elem, field_localname, "empty_href_id")
+        return ref_id
+
+    def _find_all_hrefs(self, elem: ET.Element, field_localname: str) -> list[str]:
+        """
+        Return ids of all xlink:href references with a given local tag name (in document order).
+        Empty or missing hrefs are skipped silently.
+        """
+        xlink_href_attr = f"{{{self.XLINK_NS}}}href"
+        ids = []
+        for node in elem.iter():
+            if self._local(node.tag) != field_localname:
+                continue
+            href = node.attrib.get(xlink_href_attr) or node.attrib.get("href")
+            ref_id = self._href_to_id(href, field_localname)
+            if href and not ref_id:
+                self._report(elem, field_localname, "empty_href_id")
+            if ref_id and ref_id not in ids:
+                ids.append(ref_id)
+        return ids
+
     def _href_to_id(self, href: str | None, field_name: str = "unknown") -> str | None:
         """
         Convert href to id.
         Example: '#ABC' or 'file.gml#ABC' -> 'ABC'
-        Returns None silently if href is None.
+        Returns None if href is None or has an empty id ('#'); callers report the latter.
         """
         if not href:
             return None
@@ -102,7 +347,6 @@ class BaseParser(ABC):
             if after_hash:
                 return after_hash.strip()
             else:
-                logger.error(f"empty id in href for {field_name}, skipping. href: {href}")
                 return None
 
         return href
@@ -120,10 +364,32 @@ class BaseParser(ABC):
                     return txt
                 else:
                     if required:
-                        logger.error(f"missing {child_localname} text for element, skipping. Element: {ET.tostring(node, encoding='unicode')}")
+                        self._report(elem, child_localname, "missing_text")
                     return None
         return None
 
+    def _find_first_code(self, elem: ET.Element, child_localname: str, required: bool = False) -> int | None:
+        """
+        Return the integer code of a dictionary-coded attribute, or None when it is empty.
+        Non-numeric values are recorded as bad_code issues and stored as NULL.
+        """
+        txt = self._find_first_text(elem, child_localname, required)
+        if txt is None:
+            return None
+        try:
+            return int(txt)
+        except ValueError:
+            self._report(elem, child_localname, "bad_code")
+            return None
+
+    def _raw_xml(self, feature_elem: ET.Element) -> str:
+        """
+        Serialize the feature element to XML text (stored in the raw_xml column).
+        """
+        if self.profiler is None:
+            return ET.tostring(feature_elem, encoding="unicode")
+        return self.profiler.tostring(self.FEATURE_TYPE, feature_elem)
+
     def _extract_date_from_gml_id(self, fid: str) -> str | None:
         """
         Extract date from gml:id.
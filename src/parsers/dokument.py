@@ -1,57 +1,28 @@
 # parsers/dokument.py
-import sqlite3
 import xml.etree.ElementTree as ET
-from .base import BaseParser, logger
+from .base import BaseParser, Field
+from src.dedup import fingerprint, normalize_date, normalize_text
 
 
 class DokumentParser(BaseParser):
     FEATURE_TYPE = "RCN_Dokument"
-
-    INSERT_SQL = """
-    INSERT OR REPLACE INTO raw_dokument (
-        id,
-        oznaczenie_dokumentu,
-        data_sporzadzenia_dokumentu,
-        tworca_dokumentu,
-        data_wpisu,
-        raw_xml,
-        import_id
-    ) VALUES (?, ?, ?, ?, ?, ?, ?);
-    """
-
-    def ensure_schema(self, conn: sqlite3.Connection) -> None:
-        """Create the raw_dokument table if it doesn't exist."""
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS raw_dokument (
-          id                              TEXT PRIMARY KEY,
-          oznaczenie_dokumentu            TEXT,
-          data_sporzadzenia_dokumentu     DATE,
-          tworca_dokumentu                TEXT,
-          data_wpisu                      DATE,
-          raw_xml                         TEXT,
-          import_id                       INTEGER REFERENCES _import_meta(id)
-        );
-        """)
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_dok_oznaczenie ON raw_dokument(oznaczenie_dokumentu);")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_dok_data ON raw_dokument(data_sporzadzenia_dokumentu);")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_dok_import ON raw_dokument(import_id);")
-
-    def parse(self, feature_elem: ET.Element) -> tuple | None:
-        """
-        Return (id, oznaczenie_dokumentu, data_sporzadzenia_dokumentu, tworca_dokumentu,
-                data_wpisu, raw_xml) or None to skip.
-        """
-        fid = self._get_gml_id(feature_elem)
-        if not fid:
-            logger.error("missing gml:id for dokument, skipping.")
-            return None
-
-        oznaczenie = self._find_first_text(feature_elem, "oznaczenieDokumentu", required=False)
-        data_sporzadzenia = self._find_first_text(feature_elem, "dataSporzadzeniaDokumentu", required=False)
-        tworca = self._find_first_text(feature_elem, "tworcaDokumentu", required=False)
-        data_wpisu = self._extract_date_from_gml_id(fid)
-
-        raw_xml = ET.tostring(feature_elem, encoding="unicode")
-
-        return (fid, oznaczenie, data_sporzadzenia, tworca, data_wpisu, raw_xml)
-
+    TABLE = "raw_dokument"
+    IMPORT_INDEX = "idx_dok_import"
+
+    FIELDS = (
+        Field("oznaczenie_dokumentu", "TEXT", "text", "oznaczenieDokumentu", index="idx_dok_oznaczenie"),
+        Field("data_sporzadzenia_dokumentu", "DATE", "text", "dataSporzadzeniaDokumentu", index="idx_dok_data"),
+        Field("tworca_dokumentu", "TEXT", "text", "tworcaDokumentu"),
+        Field("fingerprint", "TEXT", "derived", index="idx_dok_fingerprint"),
+        Field("data_wpisu", "DATE", "derived"),
+        Field("raw_xml", "TEXT", "derived"),
+    )
+
+    def _derive_fingerprint(self, feature_elem: ET.Element, values: dict) -> str | None:
+        """Normalized oznaczenieDokumentu + dataSporzadzeniaDokumentu (see src/dedup.py)."""
+        parts = []
+        for column, source in (("oznaczenie_dokumentu", "oznaczenieDokumentu"),
+                               ("data_sporzadzenia_dokumentu", "dataSporzadzeniaDokumentu")):
+            parts.append(values[column] if column in values
+                         else self._find_first_text(feature_elem, source, required=False))
+        return fingerprint(normalize_text(parts[0]), normalize_date(parts[1]))
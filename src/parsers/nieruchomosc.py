@@ -1,76 +1,124 @@
 # parsers/nieruchomosc.py
 import sqlite3
 import xml.etree.ElementTree as ET
-from .base import BaseParser, logger
+from .base import BaseParser, Field
 
 
 class NieruchomoscParser(BaseParser):
     FEATURE_TYPE = "RCN_Nieruchomosc"
 
-    INSERT_SQL = """
-    INSERT OR REPLACE INTO raw_nieruchomosc (
-        id,
-        rodzaj_nieruchomosci,
-        rodzaj_prawa_do_nieruchomosci,
-        udzial_w_prawie_do_nieruchomosci,
-        cena_nieruchomosci_brutto,
-        dzialka_fk,
-        budynek_fk,
-        lokal_fk,
-        data_wpisu,
-        raw_xml,
-        import_id
-    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-    """
+    TABLE = "raw_nieruchomosc"
+    IMPORT_INDEX = "idx_nier_import"
+
+    # Nieruchomosc can have multiple dzialka/budynek/lokal. The first one is kept in the *_fk columns,
+    # all of them go to the link tables (see insert_many).
+    FIELDS = (
+        Field("rodzaj_nieruchomosci", "INTEGER", "code", "rodzajNieruchomosci", index="idx_nier_rodzaj",
+              dictionary="rodzaj_nieruchomosci"),
+        Field("rodzaj_prawa_do_nieruchomosci", "INTEGER", "code", "rodzajPrawaDoNieruchomosci",
+              dictionary="rodzaj_prawa"),
+        Field("udzial_w_prawie_do_nieruchomosci", "TEXT", "text", "udzialWPrawieDoNieruchomosci"),
+        Field("cena_nieruchomosci_brutto", "NUMERIC", "text", "cenaNieruchomosciBrutto"),
+        Field("dzialka_fk", "TEXT", "derived", "dzialka", index="idx_nier_dzialka"),
+        Field("budynek_fk", "TEXT", "derived", "budynek", index="idx_nier_budynek"),
+        Field("lokal_fk", "TEXT", "derived", "lokal", index="idx_nier_lokal"),
+        Field("data_wpisu", "DATE", "derived"),
+        Field("raw_xml", "TEXT", "derived"),
+    )
+
+    # Nieruchomosc can reference many dzialka/budynek/lokal features.
+    # All references are stored in link tables: (link table, target column, href field).
+    LINK_TABLES = (
+        ("raw_nieruchomosc_dzialka", "dzialka_id", "dzialka"),
+        ("raw_nieruchomosc_budynek", "budynek_id", "budynek"),
+        ("raw_nieruchomosc_lokal", "lokal_id", "lokal"),
+    )
+    # href field -> referenced feature type
+    LINK_TARGETS = {
+        "dzialka": "RCN_Dzialka",
+        "budynek": "RCN_Budynek",
+        "lokal": "RCN_Lokal",
+    }
+
+    def __init__(self, config):
+        super().__init__(config)
+        # links collected by parse(), written by insert_many(): (nieruchomosc_id, href field, target_id)
+        self._pending_links = []
+        # links of the last parsed feature (see references)
+        self._last_links = {}
 
     def ensure_schema(self, conn: sqlite3.Connection) -> None:
-        """Create the raw_nieruchomosc table if it doesn't exist."""
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS raw_nieruchomosc (
-          id                                  TEXT PRIMARY KEY,
-          rodzaj_nieruchomosci                TEXT,
-          rodzaj_prawa_do_nieruchomosci       TEXT,
-          udzial_w_prawie_do_nieruchomosci    TEXT,
-          cena_nieruchomosci_brutto           NUMERIC,
-          dzialka_fk                          TEXT,
-          budynek_fk                          TEXT,
-          lokal_fk                            TEXT,
-          data_wpisu                          DATE,
-          raw_xml                             TEXT,
-          import_id                           INTEGER REFERENCES _import_meta(id)
-        );
-        """)
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_nier_dzialka ON raw_nieruchomosc(dzialka_fk);")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_nier_budynek ON raw_nieruchomosc(budynek_fk);")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_nier_lokal ON raw_nieruchomosc(lokal_fk);")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_nier_import ON raw_nieruchomosc(import_id);")
-
-    def parse(self, feature_elem: ET.Element) -> tuple | None:
-        """
-        Return (id, rodzaj_nieruchomosci, rodzaj_prawa_do_nieruchomosci,
-                udzial_w_prawie_do_nieruchomosci, cena_nieruchomosci_brutto,
-                dzialka_fk, budynek_fk, lokal_fk, data_wpisu, raw_xml) or None to skip.
-        """
-        fid = self._get_gml_id(feature_elem)
-        if not fid:
-            logger.error("missing gml:id for nieruchomosc, skipping.")
-            return None
-
-        rodzaj_nier = self._find_first_text(feature_elem, "rodzajNieruchomosci", required=False)
-        rodzaj_prawa = self._find_first_text(feature_elem, "rodzajPrawaDoNieruchomosci", required=False)
-        udzial = self._find_first_text(feature_elem, "udzialWPrawieDoNieruchomosci", required=False)
-        cena_brutto = self._find_first_text(feature_elem, "cenaNieruchomosciBrutto", required=False)
-
-        # TODO: Nieruchomosc can have multiple dzialka (don't know yet about budynek/lokal links yet). We should probably store them in separate tables instead of just taking the first one.
-        dzialka_fk = self._href_to_id(self._find_first_href(feature_elem, "dzialka", required=False), "dzialka")
-        budynek_fk = self._href_to_id(self._find_first_href(feature_elem, "budynek", required=False), "budynek")
-        lokal_fk = self._href_to_id(self._find_first_href(feature_elem, "lokal", required=False), "lokal")
-
-        data_wpisu = self._extract_date_from_gml_id(fid)
-
-        raw_xml = ET.tostring(feature_elem, encoding="unicode")
-
-        return (fid, rodzaj_nier, rodzaj_prawa, udzial, cena_brutto,
-                dzialka_fk, budynek_fk, lokal_fk, data_wpisu, raw_xml)
+        """Create the raw_nieruchomosc table and its link tables if they don't exist."""
+        super().ensure_schema(conn)
+
+        for link_table, target_col, _ in self.LINK_TABLES:
+            conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {link_table} (
+              nieruchomosc_id   TEXT NOT NULL,
+              {target_col}      TEXT NOT NULL,
+              import_id         INTEGER REFERENCES _import_meta(id),
+              PRIMARY KEY (nieruchomosc_id, {target_col})
+            );
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{link_table}_target ON {link_table}({target_col});")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{link_table}_import ON {link_table}(import_id);")
+
+    def insert_many(self, conn: sqlite3.Connection, rows) -> int:
+        """Insert nieruchomosc rows and replace their links in the link tables."""
+        if not rows:
+            return 0
+        conn.executemany(self.INSERT_SQL, rows)
+
+        self.write_links(conn, {row[0]: row[-1] for row in rows})
+        return len(rows)
+
+    def write_links(self, conn: sqlite3.Connection, import_ids: dict) -> None:
+        """Replace links of the given nieruchomosc ids (id -> import_id) with the pending ones."""
+        for link_table, target_col, field in self.LINK_TABLES:
+            conn.executemany(f"DELETE FROM {link_table} WHERE nieruchomosc_id = ?", [(fid,) for fid in import_ids])
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {link_table} (nieruchomosc_id, {target_col}, import_id) VALUES (?, ?, ?)",
+                [(fid, target_id, import_ids[fid]) for fid, f, target_id in self._pending_links
+                 if f == field and fid in import_ids]
+            )
+        self._pending_links = [link for link in self._pending_links if link[0] not in import_ids]
+
+    def relations(self) -> list[tuple[str, str]]:
+        return super().relations() + list(self.LINK_TARGETS.items())
+
+    def references(self, row: tuple) -> list[tuple[str, str, str]]:
+        """References of the last parsed row: all links (the *_fk columns only hold the first one)."""
+        refs = super().references(row)
+        for field, target_ids in self._last_links.items():
+            target = self.LINK_TARGETS[field]
+            refs.extend((field, target, target_id) for target_id in target_ids)
+        return refs
+
+    def take_links(self) -> list[tuple]:
+        links = self._pending_links
+        self._pending_links = []
+        return links
+
+    def add_links(self, links: list[tuple]) -> None:
+        self._pending_links.extend(links)
+
+    def _start_values(self, feature_elem: ET.Element, fid: str) -> dict:
+        """Collect all links (always, the link tables are not subject to projection)."""
+        links = {field: self._find_all_hrefs(feature_elem, field) for _, _, field in self.LINK_TABLES}
+        for field, target_ids in links.items():
+            self._pending_links.extend((fid, field, target_id) for target_id in target_ids)
+        self._last_links = links
+        return {"id": fid, "_links": links}
+
+    def _first_link(self, values: dict, field: str) -> str | None:
+        target_ids = values["_links"][field]
+        return target_ids[0] if target_ids else None
+
+    def _derive_dzialka_fk(self, feature_elem: ET.Element, values: dict) -> str | None:
+        return self._first_link(values, "dzialka")
 
+    def _derive_budynek_fk(self, feature_elem: ET.Element, values: dict) -> str | None:
+        return self._first_link(values, "budynek")
 
+    def _derive_lokal_fk(self, feature_elem: ET.Element, values: dict) -> str | None:
+        return self._first_link(values, "lokal")
@@ -1,54 +1,35 @@
 # parsers/transakcja.py
-import sqlite3
 import xml.etree.ElementTree as ET
-from .base import BaseParser, logger
+from .base import BaseParser, Field
+from src.dedup import fingerprint, normalize_price, normalize_text
 
 
 class TransakcjaParser(BaseParser):
     FEATURE_TYPE = "RCN_Transakcja"
+    TABLE = "raw_transakcja"
+    IMPORT_INDEX = "idx_tx_import"
 
-    INSERT_SQL = """
-    INSERT OR REPLACE INTO raw_transakcja (
-        id, 
-        nieruchomosc_fk, 
-        dokument_fk, 
-        cena_transakcji_brutto,
-        data_wpisu,
-        raw_xml,
-        import_id
-    ) VALUES (?, ?, ?, ?, ?, ?, ?);
-    """
+    FIELDS = (
+        Field("nieruchomosc_fk", "TEXT", "href", "nieruchomosc", required=True, index="idx_tx_nier",
+              target="RCN_Nieruchomosc"),
+        Field("dokument_fk", "TEXT", "href", "podstawaPrawna", index="idx_tx_doc", target="RCN_Dokument"),
+        Field("cena_transakcji_brutto", "NUMERIC", "text", "cenaTransakcjiBrutto"),
+        Field("rodzaj_transakcji", "INTEGER", "code", "rodzajTransakcji", index="idx_tx_rodzaj",
+              dictionary="rodzaj_transakcji"),
+        Field("rodzaj_rynku", "INTEGER", "code", "rodzajRynku", index="idx_tx_rynek", dictionary="rodzaj_rynku"),
+        Field("strona_sprzedajaca", "INTEGER", "code", "stronaSprzedajaca", dictionary="strona"),
+        Field("strona_kupujaca", "INTEGER", "code", "stronaKupujaca", dictionary="strona"),
+        Field("oznaczenie_transakcji", "TEXT", "text", "oznaczenieTransakcji"),
+        Field("fingerprint", "TEXT", "derived", index="idx_tx_fingerprint"),
+        Field("data_wpisu", "DATE", "derived"),
+        Field("raw_xml", "TEXT", "derived"),
+    )
 
-    def ensure_schema(self, conn: sqlite3.Connection) -> None:
-        """Create the raw_transakcja table if it doesn't exist."""
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS raw_transakcja (
-          id                TEXT PRIMARY KEY,
-          nieruchomosc_fk   TEXT,
-          dokument_fk       TEXT,
-          cena_transakcji_brutto NUMERIC,
-          data_wpisu        DATE,
-          raw_xml           TEXT,
-          import_id         INTEGER REFERENCES _import_meta(id)
-        );
-        """)
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_nier ON raw_transakcja(nieruchomosc_fk);")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_doc  ON raw_transakcja(dokument_fk);")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_import ON raw_transakcja(import_id);")
-
-    def parse(self, feature_elem: ET.Element) -> tuple | None:
-        """
-        Return tuple or None to skip.
-        """
-        fid = self._get_gml_id(feature_elem)
-        if not fid:
-            logger.error("missing gml:id for transakcja, skipping.")
-            return None
-
-        nier_fk = self._href_to_id(self._find_first_href(feature_elem, "nieruchomosc"), "nieruchomosc")
-        doc_fk = self._href_to_id(self._find_first_href(feature_elem, "podstawaPrawna", required=False), "podstawaPrawna")
-        cena = self._find_first_text(feature_elem, "cenaTransakcjiBrutto", required=False)
-        data_wpisu = self._extract_date_from_gml_id(fid)
-
-        raw_xml = ET.tostring(feature_elem, encoding="unicode")
-        return (fid, nier_fk, doc_fk, cena, data_wpisu, raw_xml)
+    def _derive_fingerprint(self, feature_elem: ET.Element, values: dict) -> str | None:
+        """Normalized oznaczenieTransakcji + price (see src/dedup.py)."""
+        parts = []
+        for column, source in (("oznaczenie_transakcji", "oznaczenieTransakcji"),
+                               ("cena_transakcji_brutto", "cenaTransakcjiBrutto")):
+            parts.append(values[column] if column in values
+                         else self._find_first_text(feature_elem, source, required=False))
+        return fingerprint(normalize_text(parts[0]), normalize_price(parts[1]))
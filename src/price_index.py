@@ -0,0 +1,394 @@
+"""
+Repeat-sales price index per region and month (Bailey-Muth-Nourse).
+
+A unit sold more than once gives a repeat-sale pair; the log price ratio of a pair is
+regressed on month dummies (-1 for the first sale, +1 for the second), and the index of
+a month is 100 * exp(coefficient), the earliest month of the region being 100.
+
+Units are recognized in single-unit transactions only:
+    lokal:<id_lokalu>      - nieruchomosc with exactly one lokal
+    dzialka:<id_dzialki>   - exactly one dzialka, no budynek / lokal
+    zabudowana:<id_dzialki> - exactly one dzialka with building(s), no lokal
+The sale date is the date of the deed (data_sporzadzenia_dokumentu, or the transaction
+data_wpisu when missing); only current versions of transactions are used, and duplicates
+found by src/dedup.py are skipped.
+
+Tables:
+    price_index_sales  - one row per usable sale, indexed by (unit, sale_date)
+    price_index_pairs  - consecutive sales of a unit in different months
+    price_index        - (region, month) -> log_index, index_value, pairs
+
+build_price_index() fills them in bulk. update_price_index() runs after each import:
+sales of new imports are added, sales that are gone, superseded or duplicates are
+removed, sales of transactions that stopped being duplicates (in clusters dedup just
+resolved on the connection) are added back, pairs are regenerated for the touched
+units only (one window pass over the unit index) and only the touched regions are
+solved again. A purge rebuilds the tables, since it can
+bring back older versions of transactions.
+
+The normal equations of a region are accumulated in one pass over its pairs and solved
+by Cholesky decomposition (pure Python). Months not connected to the main group of
+pairs of a region cannot be compared with it and are left out.
+
+The tables have no import_id column on purpose: purge_import() leaves them alone and
+the update after the purge takes care of them.
+"""
+import json
+import logging
+import math
+import sqlite3
+import time
+from collections import Counter
+from operator import mul
+
+from src.dedup import DUPLICATES_TABLE, TOUCHED_TABLE, has_touched_fingerprints
+from src.utils import shard_key
+
+logger = logging.getLogger("rcn")
+
+REGION_KEYS = ("voivodeship", "namespace", "all")
+# wolnorynkowa (see src/dictionaries.py)
+DEFAULT_TRANSACTION_TYPES = (1,)
+
+_STATE_TABLE = "_price_index_state"
+_IMPORTS_TABLE = "_price_index_imports"
+_UNITS_TABLE = "temp._price_index_units"
+
+# Source tables and the columns the sales query reads
+_SOURCES = {
+    "raw_transakcja": ("nieruchomosc_fk", "dokument_fk", "cena_transakcji_brutto", "rodzaj_transakcji",
+                       "data_wpisu", "import_id"),
+    "raw_dokument": ("data_sporzadzenia_dokumentu",),
+    "raw_nieruchomosc_lokal": ("nieruchomosc_id", "lokal_id"),
+    "raw_nieruchomosc_dzialka": ("nieruchomosc_id", "dzialka_id"),
+    "raw_nieruchomosc_budynek": ("nieruchomosc_id",),
+    "raw_lokal": ("id_lokalu",),
+    "raw_dzialka": ("id_dzialki",),
+}
+
+_SALES_SQL = """
+    SELECT tx.id, tx.cena_transakcji_brutto, COALESCE(dok.data_sporzadzenia_dokumentu, tx.data_wpisu),
+           (SELECT COUNT(*) FROM raw_nieruchomosc_lokal nl WHERE nl.nieruchomosc_id = tx.nieruchomosc_fk),
+           (SELECT MIN(lok.id_lokalu) FROM raw_nieruchomosc_lokal nl JOIN raw_lokal lok ON lok.id = nl.lokal_id
+             WHERE nl.nieruchomosc_id = tx.nieruchomosc_fk),
+           (SELECT COUNT(*) FROM raw_nieruchomosc_dzialka nd WHERE nd.nieruchomosc_id = tx.nieruchomosc_fk),
+           (SELECT MIN(dzi.id_dzialki) FROM raw_nieruchomosc_dzialka nd JOIN raw_dzialka dzi ON dzi.id = nd.dzialka_id
+             WHERE nd.nieruchomosc_id = tx.nieruchomosc_fk),
+           (SELECT COUNT(*) FROM raw_nieruchomosc_budynek nb WHERE nb.nieruchomosc_id = tx.nieruchomosc_fk)
+      FROM raw_transakcja tx
+      LEFT JOIN raw_dokument dok ON dok.id = tx.dokument_fk
+     WHERE {where} AND tx.cena_transakcji_brutto > 0 {filters}
+"""
+
+
+def _has_table(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def has_price_index(conn: sqlite3.Connection) -> bool:
+    return _has_table(conn, _STATE_TABLE)
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS {_STATE_TABLE} (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS {_IMPORTS_TABLE} (id INTEGER PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS price_index_sales (
+            transakcja_id TEXT PRIMARY KEY,
+            unit          TEXT NOT NULL,
+            region        TEXT NOT NULL,
+            sale_date     TEXT NOT NULL,
+            month         TEXT NOT NULL,
+            price         REAL NOT NULL,
+            log_price     REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_price_index_sales_unit ON price_index_sales(unit, sale_date, transakcja_id);
+        CREATE TABLE IF NOT EXISTS price_index_pairs (
+            first_id      TEXT NOT NULL,
+            second_id     TEXT NOT NULL,
+            unit          TEXT NOT NULL,
+            region        TEXT NOT NULL,
+            first_month   TEXT NOT NULL,
+            second_month  TEXT NOT NULL,
+            log_ratio     REAL NOT NULL,
+            PRIMARY KEY (first_id, second_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_price_index_pairs_unit ON price_index_pairs(unit);
+        CREATE INDEX IF NOT EXISTS idx_price_index_pairs_region ON price_index_pairs(region, first_month, second_month, log_ratio);
+        CREATE TABLE IF NOT EXISTS price_index (
+            region        TEXT NOT NULL,
+            month         TEXT NOT NULL,
+            log_index     REAL NOT NULL,
+            index_value   REAL NOT NULL,
+            pairs         INTEGER NOT NULL,
+            PRIMARY KEY (region, month)
+        );
+    """)
+
+
+def _drop_tables(conn: sqlite3.Connection) -> None:
+    for table in ("price_index", "price_index_pairs", "price_index_sales", _IMPORTS_TABLE, _STATE_TABLE):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def _check_sources(conn: sqlite3.Connection) -> None:
+    missing = []
+    for table, columns in _SOURCES.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if not existing:
+            missing.append(table)
+        else:
+            missing += [f"{table}.{c}" for c in columns if c not in existing]
+    if missing:
+        raise ValueError(f"Price index needs {', '.join(missing)} (import all feature types with these columns)")
+
+
+def _state(conn: sqlite3.Connection) -> dict:
+    return {key: json.loads(value) for key, value in conn.execute(f"SELECT key, value FROM {_STATE_TABLE}")}
+
+
+def _unit(lokale: int, id_lokalu, dzialki: int, id_dzialki, budynki: int) -> str | None:
+    """Unit key of a single-unit transaction, or None."""
+    if lokale == 1:
+        return f"lokal:{id_lokalu}" if id_lokalu else None
+    if lokale == 0 and dzialki == 1 and id_dzialki:
+        return f"{'zabudowana' if budynki else 'dzialka'}:{id_dzialki}"
+    return None
+
+
+def _add_sales(conn: sqlite3.Connection, where: str, params: tuple, state: dict) -> tuple[int, set]:
+    """Insert usable sales of the transactions matching where (tx.*); returns (sales, units)."""
+    filters = ""
+    if _has_table(conn, "raw_transakcja_history"):
+        filters += (" AND NOT EXISTS (SELECT 1 FROM raw_transakcja_history h"
+                    " WHERE h.id = tx.id AND h.valid_to IS NOT NULL)")
+    if _has_table(conn, DUPLICATES_TABLE):
+        filters += f" AND NOT EXISTS (SELECT 1 FROM {DUPLICATES_TABLE} d WHERE d.transakcja_id = tx.id)"
+    if state["transaction_types"]:
+        filters += f" AND tx.rodzaj_transakcji IN ({', '.join(str(int(t)) for t in state['transaction_types'])})"
+
+    rows = []
+    for tx_id, price, sale_date, lokale, id_lokalu, dzialki, id_dzialki, budynki \
+            in conn.execute(_SALES_SQL.format(where=where, filters=filters), params):
+        unit = _unit(lokale, id_lokalu, dzialki, id_dzialki, budynki)
+        if unit is None or not sale_date or len(sale_date) < 7:
+            continue
+        price = float(price)
+        region = "PL" if state["region_by"] == "all" else shard_key(tx_id, state["region_by"])
+        rows.append((tx_id, unit, region, sale_date, sale_date[:7], price,
+                     math.log(price)))
+    conn.executemany("INSERT OR REPLACE INTO price_index_sales VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows), {row[1] for row in rows}
+
+
+def _remove_stale_sales(conn: sqlite3.Connection) -> tuple[int, set, set]:
+    """Remove sales whose transaction is gone, superseded or a duplicate; returns (sales, units, regions)."""
+    superseded = ""
+    if _has_table(conn, "raw_transakcja_history"):
+        superseded += (" OR EXISTS (SELECT 1 FROM raw_transakcja_history h"
+                       " WHERE h.id = s.transakcja_id AND h.valid_to IS NOT NULL)")
+    if _has_table(conn, DUPLICATES_TABLE):
+        superseded += f" OR EXISTS (SELECT 1 FROM {DUPLICATES_TABLE} d WHERE d.transakcja_id = s.transakcja_id)"
+    stale = conn.execute(f"""
+        SELECT s.transakcja_id, s.unit, s.region FROM price_index_sales s
+         WHERE NOT EXISTS (SELECT 1 FROM raw_transakcja t WHERE t.id = s.transakcja_id){superseded}
+    """).fetchall()
+    conn.executemany("DELETE FROM price_index_sales WHERE transakcja_id = ?", [(tx_id,) for tx_id, _, _ in stale])
+    return len(stale), {unit for _, unit, _ in stale}, {region for _, _, region in stale}
+
+
+def _refresh_pairs(conn: sqlite3.Connection, units: set) -> tuple[int, set]:
+    """Regenerate pairs of the given units; returns (pairs, regions touched)."""
+    conn.execute(f"DROP TABLE IF EXISTS {_UNITS_TABLE}")
+    conn.execute(f"CREATE TABLE {_UNITS_TABLE} (unit TEXT PRIMARY KEY)")
+    conn.executemany(f"INSERT INTO {_UNITS_TABLE} VALUES (?)", [(u,) for u in units])
+    regions = {r for (r,) in conn.execute(f"""
+        SELECT DISTINCT region FROM price_index_pairs
+         WHERE unit IN (SELECT unit FROM {_UNITS_TABLE})""")}
+    conn.execute(f"DELETE FROM price_index_pairs WHERE unit IN (SELECT unit FROM {_UNITS_TABLE})")
+    pairs = conn.execute(f"""
+        INSERT INTO price_index_pairs (first_id, second_id, unit, region, first_month, second_month, log_ratio)
+        SELECT prev_id, transakcja_id, unit, region, prev_month, month, log_price - prev_log
+          FROM (SELECT s.transakcja_id, s.unit, s.region, s.month, s.log_price,
+                       LAG(s.transakcja_id) OVER w AS prev_id,
+                       LAG(s.month) OVER w AS prev_month,
+                       LAG(s.log_price) OVER w AS prev_log
+                  FROM {_UNITS_TABLE} u
+                  JOIN price_index_sales s ON s.unit = u.unit
+                WINDOW w AS (PARTITION BY s.unit ORDER BY s.sale_date, s.transakcja_id))
+         WHERE prev_id IS NOT NULL AND prev_month != month
+    """).rowcount
+    regions |= {r for (r,) in conn.execute(f"""
+        SELECT DISTINCT region FROM price_index_sales
+         WHERE unit IN (SELECT unit FROM {_UNITS_TABLE})""")}
+    conn.execute(f"DROP TABLE {_UNITS_TABLE}")
+    return pairs, regions
+
+
+def _cholesky_solve(a: list[list[float]], b: list[float]) -> list[float]:
+    """Solve a x = b for a symmetric positive definite matrix a."""
+    n = len(a)
+    lower = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        li = lower[i]
+        for j in range(i + 1):
+            lj = lower[j]
+            s = a[i][j] - sum(map(mul, li[:j], lj[:j]))
+            if i == j:
+                if s <= 0:
+                    raise ValueError("Normal equations are not positive definite")
+                li[i] = math.sqrt(s)
+            else:
+                li[j] = s / lj[j]
+    z = []
+    for i in range(n):
+        z.append((b[i] - sum(map(mul, lower[i][:i], z))) / lower[i][i])
+    x = [0.0] * n
+    for i in reversed(range(n)):
+        x[i] = (z[i] - sum(lower[k][i] * x[k] for k in range(i + 1, n))) / lower[i][i]
+    return x
+
+
+def solve_index(pairs) -> dict[str, tuple[float, int]]:
+    """
+    Repeat-sales regression of (first_month, second_month, log_ratio) pairs.
+
+    Returns:
+        {month: (log_index, pairs)} for the months connected to the largest group of
+        pairs; the earliest of them has log_index 0
+    """
+    pairs = [(a, b, y) for a, b, y in pairs if a != b]
+    if not pairs:
+        return {}
+
+    # months linked by pairs form groups; only one group can be put on one scale
+    parent = {}
+
+    def find(month):
+        parent.setdefault(month, month)
+        while parent[month] != month:
+            parent[month] = parent[parent[month]]
+            month = parent[month]
+        return month
+
+    for a, b, _ in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    sizes = Counter(find(a) for a, _, _ in pairs)
+    root = min(sizes, key=lambda r: (-sizes[r], r))
+    pairs = [p for p in pairs if find(p[0]) == root]
+
+    months = sorted({m for a, b, _ in pairs for m in (a, b)})
+    # base month (first) is fixed at 0 and left out of the system
+    pos = {m: i - 1 for i, m in enumerate(months)}
+    n = len(months) - 1
+    normal = [[0.0] * n for _ in range(n)]
+    rhs = [0.0] * n
+    counts = Counter()
+    for a, b, y in pairs:
+        i, j = pos[a], pos[b]
+        counts[a] += 1
+        counts[b] += 1
+        if i >= 0:
+            normal[i][i] += 1.0
+            rhs[i] -= y
+        if j >= 0:
+            normal[j][j] += 1.0
+            rhs[j] += y
+        if i >= 0 and j >= 0:
+            normal[i][j] -= 1.0
+            normal[j][i] -= 1.0
+    beta = _cholesky_solve(normal, rhs) if n else []
+    return {m: (beta[i] if i >= 0 else 0.0, counts[m]) for m, i in pos.items()}
+
+
+def _solve_regions(conn: sqlite3.Connection, regions: set) -> int:
+    """Solve the index of the given regions again; returns (region, month) rows written."""
+    written = 0
+    for region in sorted(regions):
+        index = solve_index(conn.execute(
+            "SELECT first_month, second_month, log_ratio FROM price_index_pairs WHERE region = ?", (region,)))
+        conn.execute("DELETE FROM price_index WHERE region = ?", (region,))
+        conn.executemany(
+            "INSERT INTO price_index (region, month, log_index, index_value, pairs) VALUES (?, ?, ?, ?, ?)",
+            [(region, month, log_index, round(100 * math.exp(log_index), 4), pairs)
+             for month, (log_index, pairs) in sorted(index.items())])
+        written += len(index)
+    return written
+
+
+def _update(conn: sqlite3.Connection, state: dict) -> dict:
+    processed = {i for (i,) in conn.execute(f"SELECT id FROM {_IMPORTS_TABLE}")}
+    new_imports = [i for (i,) in conn.execute("SELECT id FROM _import_meta WHERE status = 'completed' ORDER BY id")
+                   if i not in processed]
+
+    removed, units, regions = _remove_stale_sales(conn)
+    added = 0
+    for import_id in new_imports:
+        count, import_units = _add_sales(conn, "tx.import_id = ?", (import_id,), state)
+        added += count
+        units |= import_units
+        conn.execute(f"INSERT INTO {_IMPORTS_TABLE} VALUES (?)", (import_id,))
+    if has_touched_fingerprints(conn):
+        # transactions of the clusters dedup just resolved: a former duplicate may be canonical now
+        count, touched_units = _add_sales(
+            conn, f"tx.fingerprint IN (SELECT fingerprint FROM {TOUCHED_TABLE})"
+                  " AND NOT EXISTS (SELECT 1 FROM price_index_sales s WHERE s.transakcja_id = tx.id)", (), state)
+        added += count
+        units |= touched_units
+    pairs, pair_regions = _refresh_pairs(conn, units)
+    regions |= pair_regions
+    months = _solve_regions(conn, regions)
+    conn.commit()
+    return {"imports": len(new_imports), "sales_added": added, "sales_removed": removed, "units": len(units),
+            "pairs": pairs, "regions": len(regions), "months": months}
+
+
+def build_price_index(conn: sqlite3.Connection, region_by: str = "voivodeship",
+                      transaction_types: tuple[int, ...] | None = DEFAULT_TRANSACTION_TYPES) -> dict:
+    """
+    (Re)build the price index tables from all completed imports.
+
+    Args:
+        conn: Connection to the database with the raw tables
+        region_by: "voivodeship" / "namespace" (of the transaction gml:id, see src/utils.shard_key) or "all"
+        transaction_types: rodzaj_transakcji codes used (None = all); default free-market sales only
+
+    Returns:
+        dict with imports, sales_added, units, pairs, regions, months
+    """
+    if region_by not in REGION_KEYS:
+        raise ValueError(f"Unknown region key: {region_by} (available: {', '.join(REGION_KEYS)})")
+    _check_sources(conn)
+    start = time.time()
+    _drop_tables(conn)
+    _create_tables(conn)
+    state = {"region_by": region_by, "transaction_types": list(transaction_types) if transaction_types else None}
+    conn.executemany(f"INSERT INTO {_STATE_TABLE} (key, value) VALUES (?, ?)",
+                     [(key, json.dumps(value)) for key, value in state.items()])
+    result = _update(conn, state)
+    logger.info(f"[price-index] built: {result['sales_added']} sales, {result['pairs']} pairs, "
+                f"{result['regions']} region(s), {result['months']} months in {time.time() - start:.1f}s")
+    return result
+
+
+def update_price_index(conn: sqlite3.Connection) -> dict | None:
+    """
+    Bring the price index up to date with the raw tables (after an import or purge).
+    Returns the update stats, or None if there is no price index.
+    """
+    if not has_price_index(conn):
+        return None
+    state = _state(conn)
+    purged = conn.execute(f"""
+        SELECT COUNT(*) FROM _import_meta m JOIN {_IMPORTS_TABLE} p ON p.id = m.id
+         WHERE m.status = 'purged'""").fetchone()[0]
+    if purged:
+        logger.info("[price-index] imports were purged, rebuilding")
+        return build_price_index(conn, state["region_by"], state["transaction_types"])
+    start = time.time()
+    result = _update(conn, state)
+    logger.info(f"[price-index] +{result['sales_added']} / -{result['sales_removed']} sales, "
+                f"{result['units']} unit(s), {result['regions']} region(s) solved in {time.time() - start:.1f}s")
+    return result
@@ -0,0 +1,136 @@
+"""
+Import profiling: cumulative timings per feature type and per stage.
+
+Stages:
+    xml          - XML parsing (time spent in iter_features between features)
+    extract      - field extraction in parser.parse() (without tostring)
+    tostring     - ET.tostring() of the feature (raw_xml column)
+    executemany  - parser.insert_many()
+    commit       - conn.commit() after each flush (feature type '_all')
+    count        - count_features() pre-pass (feature type '_all')
+"""
+import cProfile
+import logging
+import os
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from src.utils import local
+
+logger = logging.getLogger("rcn")
+
+ALL_TYPES = "_all"
+STAGE_ORDER = ("count", "xml", "extract", "tostring", "executemany", "commit")
+
+
+class ImportProfiler:
+    """
+    Collects cumulative timings for one import.
+
+    Args:
+        dump_dir: If set, also run cProfile and tracemalloc and write their
+                  dumps to this directory when the import finishes
+    """
+
+    def __init__(self, dump_dir: str | None = None):
+        self.dump_dir = dump_dir
+        self.seconds = {}
+        self.calls = {}
+        self._cprofile = None
+
+    def add(self, ftype: str, stage: str, seconds: float, calls: int = 1) -> None:
+        key = (ftype, stage)
+        self.seconds[key] = self.seconds.get(key, 0.0) + seconds
+        self.calls[key] = self.calls.get(key, 0) + calls
+
+    def start(self) -> None:
+        """Start cProfile/tracemalloc (only with dump_dir)."""
+        if not self.dump_dir:
+            return
+        os.makedirs(self.dump_dir, exist_ok=True)
+        tracemalloc.start()
+        self._cprofile = cProfile.Profile()
+        self._cprofile.enable()
+
+    def stop(self, import_id: int) -> None:
+        """Stop cProfile/tracemalloc and write dumps as import_<id>.prof / import_<id>.tracemalloc.txt."""
+        if self._cprofile is None:
+            return
+        self._cprofile.disable()
+        prof_path = os.path.join(self.dump_dir, f"import_{import_id}.prof")
+        self._cprofile.dump_stats(prof_path)
+        self._cprofile = None
+
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        mem_path = os.path.join(self.dump_dir, f"import_{import_id}.tracemalloc.txt")
+        with open(mem_path, "w", encoding="utf-8") as f:
+            f.write(f"current={current / 1_000_000:.1f}MB peak={peak / 1_000_000:.1f}MB\n")
+            for stat in snapshot.statistics("lineno")[:30]:
+                f.write(f"{stat}\n")
+        logger.info(f"[profile] cProfile dump: {prof_path}")
+        logger.info(f"[profile] tracemalloc dump: {mem_path} (peak={peak / 1_000_000:.1f}MB)")
+
+    def iter_features(self, features):
+        """Wrap iter_features() and record the XML parsing time of each feature."""
+        it = iter(features)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                feature = next(it)
+            except StopIteration:
+                return
+            self.add(local(feature.tag), "xml", time.perf_counter() - t0)
+            yield feature
+
+    def parse(self, parser, feature: ET.Element):
+        """Call parser.parse() and record extraction time (tostring is recorded separately)."""
+        key = (parser.FEATURE_TYPE, "tostring")
+        tostring_before = self.seconds.get(key, 0.0)
+        t0 = time.perf_counter()
+        row = parser.parse(feature)
+        elapsed = time.perf_counter() - t0
+        self.add(parser.FEATURE_TYPE, "extract", elapsed - (self.seconds.get(key, 0.0) - tostring_before))
+        return row
+
+    def tostring(self, ftype: str, feature: ET.Element) -> str:
+        t0 = time.perf_counter()
+        xml = ET.tostring(feature, encoding="unicode")
+        self.add(ftype, "tostring", time.perf_counter() - t0)
+        return xml
+
+    def insert_many(self, parser, conn, rows) -> int:
+        t0 = time.perf_counter()
+        n = parser.insert_many(conn, rows)
+        self.add(parser.FEATURE_TYPE, "executemany", time.perf_counter() - t0, len(rows))
+        return n
+
+    def commit(self, conn) -> None:
+        t0 = time.perf_counter()
+        conn.commit()
+        self.add(ALL_TYPES, "commit", time.perf_counter() - t0)
+
+    def rows(self) -> list[tuple]:
+        """Return (feature_type, stage, calls, seconds) sorted by feature type and stage order."""
+        order = {stage: i for i, stage in enumerate(STAGE_ORDER)}
+        keys = sorted(self.seconds, key=lambda k: (k[0], order.get(k[1], len(order))))
+        return [(ftype, stage, self.calls[(ftype, stage)], self.seconds[(ftype, stage)]) for ftype, stage in keys]
+
+    def log_summary(self) -> None:
+        """Log timings next to the loader's [summary] lines."""
+        total = sum(self.seconds.values())
+        by_stage = {}
+        for (_, stage), sec in self.seconds.items():
+            by_stage[stage] = by_stage.get(stage, 0.0) + sec
+
+        logger.info("[summary] time by stage:")
+        for stage in sorted(by_stage, key=lambda s: -by_stage[s]):
+            pct = by_stage[stage] / total * 100 if total else 0
+            logger.info(f"  {stage}: {by_stage[stage]:.2f}s ({pct:.1f}%)")
+
+        logger.info("[summary] time by feature type and stage:")
+        for ftype, stage, calls, sec in self.rows():
+            per_call = sec / calls * 1_000_000 if calls else 0
+            logger.info(f"  {ftype}.{stage}: {sec:.2f}s, calls={calls}, {per_call:.1f}us/call")
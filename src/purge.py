@@ -0,0 +1,99 @@
+"""
+Purge all rows of an import.
+
+Every table with an import_id column is cleaned: raw tables, link tables, wide tables
+and per-import metadata (_import_timings, _import_issues). Rows are deleted in chunks
+through the import_id indexes, one transaction per chunk, so other connections can
+read (and write) between chunks. The _import_meta row is kept with status 'purged'.
+"""
+import logging
+import sqlite3
+import time
+from datetime import datetime
+
+from src.dedup import update_duplicates
+from src.history import history_tables, reopen_versions
+from src.import_meta import mark_indexed
+from src.price_index import update_price_index
+from src.search import update_address_index
+
+logger = logging.getLogger("rcn")
+
+# Tables cleaned last: they describe the import itself
+_META_TABLES = ("_import_timings", "_import_issues")
+
+
+def tables_with_import_id(conn: sqlite3.Connection) -> list[str]:
+    """Return data tables having an import_id column (metadata tables last)."""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    tables = [name for name in names
+              if name != "_import_meta"
+              and any(row[1] == "import_id" for row in conn.execute(f'PRAGMA table_info("{name}")'))]
+    return sorted(tables, key=lambda t: t in _META_TABLES)
+
+
+def purge_import(db_path: str, import_id: int, chunk_size: int = 10000, pause: float = 0.0,
+                 timeout: int = 30) -> dict:
+    """
+    Delete all rows of an import in chunked transactions.
+
+    Args:
+        db_path: Path to SQLite database
+        import_id: Import to purge
+        chunk_size: Rows deleted per transaction
+        pause: Seconds to sleep between chunks (gives other connections more room)
+        timeout: SQLite busy timeout in seconds
+
+    Returns:
+        dict with import_id, deleted rows per table, total and elapsed
+    """
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    conn.execute(f"PRAGMA busy_timeout = {timeout * 1000};")
+    try:
+        row = conn.execute("SELECT source_file, status FROM _import_meta WHERE id = ?", (import_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Import not found: {import_id}")
+        logger.info(f"Purging import {import_id} ({row[0]}, status={row[1]}), chunk={chunk_size}")
+
+        start = time.time()
+        deleted = {}
+        for table in tables_with_import_id(conn):
+            total = 0
+            while True:
+                cur = conn.execute(
+                    f'DELETE FROM "{table}" WHERE rowid IN '
+                    f'(SELECT rowid FROM "{table}" WHERE import_id = ? LIMIT ?)',
+                    (import_id, chunk_size)
+                )
+                conn.commit()
+                total += cur.rowcount
+                if cur.rowcount < chunk_size:
+                    break
+                logger.info(f"  {table}: {total} rows deleted...")
+                if pause:
+                    time.sleep(pause)
+            if total:
+                logger.info(f"  {table}: {total} rows deleted")
+                deleted[table] = total
+
+        conn.execute(
+            "UPDATE _import_meta SET status = 'purged', completed_at = ? WHERE id = ?",
+            (datetime.now().isoformat(), import_id)
+        )
+        conn.commit()
+        for table in history_tables(conn):
+            reopen_versions(conn, table)
+        conn.commit()
+        update_address_index(conn)
+        update_duplicates(conn)
+        update_price_index(conn)
+        mark_indexed(conn, import_id)
+
+        elapsed = time.time() - start
+        result = {"import_id": import_id, "deleted": deleted, "total": sum(deleted.values()), "elapsed": elapsed}
+        logger.info(f"Purged import {import_id}: {result['total']} rows in {elapsed:.1f}s")
+        return result
+    finally:
+        conn.close()
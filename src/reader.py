@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Streaming reader of RCN records without SQLite.
+
+read() yields one typed, tuple-backed record (typing.NamedTuple) per feature. Record
+types are generated from the parser FIELDS, so records have the same columns as the
+raw tables: references are resolved ids, values are converted by column type
+(INTEGER -> int, NUMERIC/REAL -> float, DATE -> datetime.date, TEXT -> str, missing -> None).
+Nieruchomosc records also carry all linked ids (dzialka_ids, budynek_ids, lokal_ids).
+raw_xml is not extracted by default.
+
+Records keep no reference to the parsed XML, and elements are cleared as the file is
+streamed, so memory does not grow with the file. measure_memory() compares the memory
+held by records with the Element subtrees they come from:
+
+    python -m src.reader --gml rcn.gml --sample 2000
+"""
+import argparse
+import itertools
+import tracemalloc
+from datetime import date
+from typing import NamedTuple, Iterator
+
+from src.load_rcn import build_parsers, iter_features, resolve_types
+from src.utils import local
+
+# raw_xml is the largest column and is rarely needed outside the database
+DEFAULT_READ_CONFIG = {"*": {"exclude": ["raw_xml"]}}
+
+_PYTHON_TYPES = {"TEXT": str, "INTEGER": int, "NUMERIC": float, "REAL": float, "DATE": date}
+
+# (feature type, fields) -> record type
+_RECORD_TYPES = {}
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _to_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+_CONVERTERS = {"INTEGER": _to_int, "NUMERIC": _to_float, "REAL": _to_float, "DATE": _to_date}
+
+
+def _link_fields(parser) -> tuple[str, ...]:
+    return tuple(f"{field}_ids" for _, _, field in getattr(parser, "LINK_TABLES", ()))
+
+
+def record_type(parser) -> type:
+    """Return the NamedTuple record type of a parser (its projected fields, plus link id tuples)."""
+    key = (parser.FEATURE_TYPE, parser.fields)
+    if key not in _RECORD_TYPES:
+        fields = [("id", str)]
+        fields += [(f.column, _PYTHON_TYPES.get(f.sql_type, object) | None) for f in parser.fields]
+        fields += [(name, tuple[str, ...]) for name in _link_fields(parser)]
+        cls = NamedTuple(parser.FEATURE_TYPE.removeprefix("RCN_"), fields)
+        cls.feature_type = parser.FEATURE_TYPE
+        _RECORD_TYPES[key] = cls
+    return _RECORD_TYPES[key]
+
+
+class _RecordBuilder:
+    """Turn parsed rows of one parser into records."""
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.cls = record_type(parser)
+        # code and derived REAL fields are typed by the parser already
+        self.converters = [(i + 1, _CONVERTERS[f.sql_type]) for i, f in enumerate(parser.fields)
+                           if f.sql_type in _CONVERTERS and not (f.kind == "code" or f.sql_type == "REAL")]
+        self.links = [field for _, _, field in getattr(parser, "LINK_TABLES", ())]
+
+    def build(self, elem):
+        row = self.parser.parse(elem)
+        if row is None:
+            return None
+        values = list(row)
+        for i, convert in self.converters:
+            if values[i] is not None:
+                values[i] = convert(values[i])
+        if self.links:
+            # links are kept on the record, not queued for the link tables
+            links = self.parser.take_links()
+            values.extend(tuple(target for _, f, target in links if f == field) for field in self.links)
+        return tuple.__new__(self.cls, values)
+
+
+def read(gml_path, types: list[str] | None = None, parser_config: dict | None = None) -> Iterator[NamedTuple]:
+    """
+    Stream typed records of an RCN GML file.
+
+    Args:
+        gml_path: Path to the GML file (or a binary file object)
+        types: Feature types to read (full or short names, e.g. ["lokal", "RCN_Adres"]);
+               others are skipped without parsing
+        parser_config: Column projection per feature type (see load_rcn.build_parsers);
+                       default leaves out raw_xml
+
+    Yields:
+        one record per feature, e.g. Lokal(id=..., id_lokalu=..., funkcja_lokalu=1, ...)
+    """
+    types = resolve_types(types)
+    parsers = build_parsers(DEFAULT_READ_CONFIG if parser_config is None else parser_config)
+    builders = {ft: _RecordBuilder(p) for ft, p in parsers.items() if not types or ft in types}
+    for elem in iter_features(gml_path, types):
+        builder = builders.get(local(elem.tag))
+        if builder is None:
+            continue
+        record = builder.build(elem)
+        if record is not None:
+            yield record
+
+
+def _element_memory(gml_path, ftype: str, sample: int) -> tuple[int, list]:
+    """Bytes held by `sample` Element subtrees of a type (traced while they are kept alive)."""
+    features = iter_features(gml_path, {ftype})
+    # the first feature opens the file and fills the read buffer: not traced
+    if next(features, None) is None:
+        return 0, []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        elements = list(itertools.islice(features, sample))
+        held = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+        features.close()
+    return held, elements
+
+
+def measure_memory(gml_path, types: list[str] | None = None, sample: int = 1000,
+                   parser_config: dict | None = None) -> dict:
+    """
+    Measure bytes per feature held by Element subtrees and by records (tracemalloc).
+
+    Returns:
+        {feature type: {"features", "element_bytes", "record_bytes", "ratio"}}
+    """
+    parsers = build_parsers(DEFAULT_READ_CONFIG if parser_config is None else parser_config)
+    result = {}
+    for ftype in sorted(resolve_types(types) or parsers):
+        element_bytes, elements = _element_memory(gml_path, ftype, sample)
+        if not elements:
+            continue
+        builder = _RecordBuilder(parsers[ftype])
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            records = [builder.build(elem) for elem in elements]
+            record_bytes = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        n = len(records)
+        result[ftype] = {
+            "features": n,
+            "element_bytes": round(element_bytes / n),
+            "record_bytes": round(record_bytes / n),
+            "ratio": round(element_bytes / record_bytes, 1) if record_bytes > 0 else None,
+        }
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gml", required=True, help="Path to GML file")
+    ap.add_argument("--types", default=None, help="Comma separated feature types")
+    ap.add_argument("--sample", type=int, default=1000, help="Features per type measured")
+    args = ap.parse_args()
+
+    types = args.types.split(",") if args.types else None
+    print(f"{'type':<18} {'features':>8} {'Element B':>10} {'record B':>9} {'ratio':>6}")
+    for ftype, m in measure_memory(args.gml, types, args.sample).items():
+        print(f"{ftype:<18} {m['features']:>8} {m['element_bytes']:>10} {m['record_bytes']:>9} {m['ratio']:>6}")
+
+
+if __name__ == "__main__":
+    main()
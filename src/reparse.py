@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Re-extract raw table columns from stored raw_xml with the current parsers.
+
+Rows are read in rowid order (batch_size per transaction) and parsed in a process
+pool. Parsed values go to a temp table with the same column types, so SQLite applies
+the same affinity as on import; then each column is updated only where the value
+changed (raw_xml itself is never rewritten). New parser columns are added first
+(ensure_schema). Nieruchomosc links are replaced for every reparsed row.
+
+Progress (last rowid) is stored in _reparse_progress in the same transaction as the
+updates, so an interrupted run continues where it stopped. It is removed when a table
+is finished.
+"""
+import argparse
+import logging
+import multiprocessing
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from datetime import datetime
+
+from src.load_rcn import build_parsers, resolve_types, load_parser_config, PARSERS
+
+logger = logging.getLogger("rcn")
+
+_BATCH_TABLE = "temp._reparse_batch"
+
+# parsers of a pool worker (set by _init_worker)
+_worker_parsers = None
+
+
+def ensure_reparse_progress_schema(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS _reparse_progress (
+        table_name TEXT NOT NULL,
+        scope TEXT NOT NULL,
+        last_rowid INTEGER NOT NULL,
+        updated_at TEXT,
+        PRIMARY KEY (table_name, scope)
+    );
+    """)
+
+
+def _init_worker(parser_config: dict | None) -> None:
+    global _worker_parsers
+    _worker_parsers = build_parsers(parser_config) if parser_config else PARSERS
+
+
+def parse_chunk(ftype: str, items: list[tuple]) -> list[tuple]:
+    """
+    Parse (rowid, raw_xml) items with the worker's parser.
+    Returns (rowid, row or None, links) per item.
+    """
+    parser = _worker_parsers[ftype]
+    out = []
+    for rowid, raw_xml in items:
+        try:
+            elem = ET.fromstring(raw_xml)
+        except ET.ParseError:
+            out.append((rowid, None, []))
+            continue
+        row = parser.parse(elem)
+        out.append((rowid, row, parser.take_links()))
+    return out
+
+
+def _scope(import_ids: list[int] | None) -> str:
+    return ",".join(str(i) for i in sorted(import_ids)) if import_ids else "*"
+
+
+def _update_columns(conn: sqlite3.Connection, parser, columns: list[str]) -> dict:
+    """Update changed values from the batch table. Returns changed rows per column."""
+    changed = {}
+    for column in columns:
+        cur = conn.execute(f"""
+            UPDATE {parser.TABLE}
+               SET {column} = (SELECT b.{column} FROM {_BATCH_TABLE} b WHERE b.rid = {parser.TABLE}.rowid)
+             WHERE rowid IN (SELECT b.rid FROM {_BATCH_TABLE} b JOIN {parser.TABLE} t ON t.rowid = b.rid
+                              WHERE b.{column} IS NOT t.{column})
+        """)
+        if cur.rowcount:
+            changed[column] = cur.rowcount
+    return changed
+
+
+def _reparse_table(conn: sqlite3.Connection, parser, pool, import_ids: list[int] | None,
+                   batch_size: int, restart: bool, lookahead: int) -> dict:
+    """Reparse one raw table. Returns per-table statistics."""
+    table = parser.TABLE
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if "raw_xml" not in existing:
+        logger.warning(f"{table}: no raw_xml column, skipped")
+        return {"table": table, "skipped": True}
+
+    parser.ensure_schema(conn)
+    conn.commit()
+
+    # id and raw_xml are not updated; the rest of the projected columns are compared
+    columns = [f.column for f in parser.fields if f.column != "raw_xml"]
+    positions = [parser.columns.index(c) for c in columns]
+    types = {f.column: f.sql_type for f in parser.fields}
+    conn.execute(f"DROP TABLE IF EXISTS {_BATCH_TABLE}")
+    conn.execute(f"CREATE TABLE {_BATCH_TABLE} (rid INTEGER PRIMARY KEY, "
+                 + ", ".join(f"{c} {types[c]}" for c in columns) + ")")
+    insert_sql = (f"INSERT INTO {_BATCH_TABLE} (rid, {', '.join(columns)}) "
+                  f"VALUES (?, {', '.join('?' for _ in columns)})")
+
+    scope = _scope(import_ids)
+    last_rowid = 0
+    if restart:
+        conn.execute("DELETE FROM _reparse_progress WHERE table_name = ? AND scope = ?", (table, scope))
+    else:
+        row = conn.execute("SELECT last_rowid FROM _reparse_progress WHERE table_name = ? AND scope = ?",
+                           (table, scope)).fetchone()
+        if row:
+            last_rowid = row[0]
+            logger.info(f"{table}: resuming after rowid {last_rowid}")
+
+    where = ""
+    params = ()
+    if import_ids:
+        where = f" AND import_id IN ({', '.join('?' for _ in import_ids)})"
+        params = tuple(import_ids)
+    select_sql = f"SELECT rowid, raw_xml, id, import_id FROM {table} WHERE rowid > ?{where} ORDER BY rowid LIMIT ?"
+
+    stats = {"table": table, "rows": 0, "failed": 0, "changed": {}}
+    pending = deque()
+    cursor_rowid = last_rowid
+    exhausted = False
+
+    while pending or not exhausted:
+        # keep the pool busy: submit chunks ahead of the one being applied
+        while not exhausted and len(pending) < lookahead:
+            rows = conn.execute(select_sql, (cursor_rowid,) + params + (batch_size,)).fetchall()
+            if not rows:
+                exhausted = True
+                break
+            cursor_rowid = rows[-1][0]
+            items = [(rowid, raw_xml) for rowid, raw_xml, _, _ in rows if raw_xml]
+            meta = {rowid: (fid, import_id) for rowid, _, fid, import_id in rows}
+            if pool is None:
+                pending.append((cursor_rowid, meta, parse_chunk(parser.FEATURE_TYPE, items)))
+            else:
+                pending.append((cursor_rowid, meta, pool.apply_async(parse_chunk, (parser.FEATURE_TYPE, items))))
+        if not pending:
+            break
+
+        chunk_last_rowid, meta, result = pending.popleft()
+        parsed = result if pool is None else result.get()
+
+        batch = []
+        link_ids = {}
+        for rowid, row, links in parsed:
+            if row is None:
+                stats["failed"] += 1
+                continue
+            batch.append((rowid,) + tuple(row[i] for i in positions))
+            if links:
+                parser.add_links(links)
+            fid, import_id = meta[rowid]
+            link_ids[fid] = import_id
+
+        conn.execute(f"DELETE FROM {_BATCH_TABLE}")
+        conn.executemany(insert_sql, batch)
+        for column, n in _update_columns(conn, parser, columns).items():
+            stats["changed"][column] = stats["changed"].get(column, 0) + n
+        parser.write_links(conn, link_ids)
+        conn.execute(
+            "INSERT OR REPLACE INTO _reparse_progress (table_name, scope, last_rowid, updated_at) VALUES (?, ?, ?, ?)",
+            (table, scope, chunk_last_rowid, datetime.now().isoformat())
+        )
+        conn.commit()
+        stats["rows"] += len(meta)
+
+    conn.execute("DELETE FROM _reparse_progress WHERE table_name = ? AND scope = ?", (table, scope))
+    conn.execute(f"DROP TABLE IF EXISTS {_BATCH_TABLE}")
+    conn.commit()
+    return stats
+
+
+def reparse(db_path: str, types: list[str] | None = None, import_ids: list[int] | None = None,
+            workers: int | None = None, batch_size: int = 10000, restart: bool = False,
+            parser_config: dict | None = None) -> dict:
+    """
+    Re-extract columns of raw tables from their raw_xml.
+
+    Args:
+        db_path: Path to SQLite database
+        types: Feature types to reparse (full or short names, None = all)
+        import_ids: Only rows of these imports
+        workers: Parser processes (None = CPU count, 1 = parse in this process)
+        batch_size: Rows per chunk / transaction
+        restart: Ignore stored progress and start from the first row
+        parser_config: Parser config (see build_parsers) selecting the columns to re-extract
+
+    Returns:
+        dict with per-table statistics and elapsed time
+    """
+    wanted = resolve_types(types)
+    parsers = build_parsers(parser_config) if parser_config else PARSERS
+    workers = workers or multiprocessing.cpu_count()
+
+    logger.info("=" * 60)
+    logger.info("RCN Reparse started")
+    logger.info("=" * 60)
+    logger.info(f"Database: {db_path}")
+    logger.info(f"Types: {', '.join(sorted(wanted)) if wanted else 'all'}")
+    logger.info(f"Imports: {_scope(import_ids)}")
+    logger.info(f"Workers: {workers}, batch: {batch_size}")
+
+    start = time.time()
+    conn = sqlite3.connect(db_path)
+    pool = None
+    try:
+        ensure_reparse_progress_schema(conn)
+        conn.commit()
+        if workers > 1:
+            pool = multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(parser_config,))
+        else:
+            _init_worker(parser_config)
+
+        tables = []
+        for ftype, parser in parsers.items():
+            if wanted and ftype not in wanted:
+                continue
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (parser.TABLE,)).fetchone()
+            if not exists:
+                continue
+            t0 = time.time()
+            stats = _reparse_table(conn, parser, pool, import_ids, batch_size, restart, lookahead=max(2, workers * 2))
+            stats["elapsed"] = time.time() - t0
+            tables.append(stats)
+            if not stats.get("skipped"):
+                rate = stats["rows"] / stats["elapsed"] if stats["elapsed"] else 0
+                changed = ", ".join(f"{c}={n}" for c, n in stats["changed"].items()) or "none"
+                logger.info(f"{stats['table']}: rows={stats['rows']}, failed={stats['failed']}, "
+                            f"{rate:.0f} rows/s, changed: {changed}")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        conn.close()
+
+    elapsed = time.time() - start
+    logger.info("=" * 60)
+    logger.info(f"Done. tables={len(tables)}, time={elapsed:.1f}s")
+    return {"tables": tables, "elapsed": elapsed}
+
+
+def main() -> None:
+    from src.logging_config import setup_logging
+    setup_logging()
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite DB")
+    ap.add_argument("--types", default=None, help="Feature types, comma-separated (default: all)")
+    ap.add_argument("--import-id", default=None, help="Only rows of these import ids, comma-separated")
+    ap.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    ap.add_argument("--batch", type=int, default=10000, help="Rows per transaction")
+    ap.add_argument("--restart", action="store_true", help="Ignore stored progress")
+    ap.add_argument("--parser-config", default=None, help="JSON file selecting columns per feature type")
+    args = ap.parse_args()
+
+    reparse(args.db, args.types.split(",") if args.types else None,
+            [int(i) for i in args.import_id.split(",")] if args.import_id else None,
+            args.workers, args.batch, args.restart,
+            load_parser_config(args.parser_config) if args.parser_config else None)
+
+
+if __name__ == "__main__":
+    main()
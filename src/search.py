@@ -0,0 +1,172 @@
+"""
+Address search: FTS5 index over raw_adres and transaction lookup through the wide table.
+
+The index (adres_fts) holds normalized miejscowosc / ulica / numer_porzadkowy of every
+address; its rowid is the raw_adres rowid. Street type prefixes ("ulica", "ul.", "al.",
+...) are dropped, case and diacritics are folded (including "ł", which Unicode does
+not decompose and the unicode61 tokenizer keeps), so "ul. Łąkowa" matches "lakowa".
+
+build_address_index() fills it in bulk. update_address_index() runs after each import:
+rows replaced or added by the import got new rowids (INSERT OR REPLACE), so new rows
+are those above the highest indexed rowid, and index rows whose raw_adres row is gone
+(replaced or purged) are removed.
+
+search() matches the query terms as prefixes and joins the matching addresses to the
+wide table through its indexed adres_*_id columns.
+"""
+import logging
+import re
+import sqlite3
+import time
+import unicodedata
+
+logger = logging.getLogger("rcn")
+
+ADDRESS_INDEX = "adres_fts"
+
+_STREET_PREFIX_RE = re.compile(r"^\s*(?:ulica|ul\.|aleja|al\.|aleje|plac|pl\.|osiedle|os\.|rondo)\s*", re.I)
+_TERM_RE = re.compile(r"\w+")
+# street type words dropped from queries ("Lublin ul. Szkolna")
+_STREET_TYPES = {"ulica", "ul", "aleja", "aleje", "al", "plac", "pl", "osiedle", "os", "rondo"}
+_FOLD = str.maketrans({"ł": "l", "Ł": "l"})
+
+# Wide table address columns: (address id column, via)
+_WIDE_ADDRESS_COLUMNS = (
+    ("adres_lokalu_id", "lokal"),
+    ("adres_budynku_id", "budynek"),
+    ("adres_dzialki_id", "dzialka"),
+)
+# Wide table columns returned by search() (when present)
+SEARCH_COLUMNS = (
+    "transakcja_id", "transakcja_data_wpisu", "cena_transakcji_brutto", "cena_nieruchomosci_brutto",
+    "rodzaj_nieruchomosci", "cena_lokalu_brutto", "pow_uzytkowo_lokalu", "pole_powierzchni_ewidencyjnej",
+)
+
+
+def fold(value: str | None) -> str | None:
+    """Lowercase and strip diacritics ("Łąkowa" -> "lakowa")."""
+    if value is None:
+        return None
+    decomposed = unicodedata.normalize("NFKD", value.translate(_FOLD).lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def normalize_street(value: str | None) -> str | None:
+    """Drop the street type prefix and fold ("ul. Łąkowa" -> "lakowa")."""
+    if value is None:
+        return None
+    return fold(_STREET_PREFIX_RE.sub("", value).strip())
+
+
+def match_expression(query: str) -> str:
+    """Turn a free-text query into an FTS5 expression: every term as a prefix, all required."""
+    terms = [t for t in _TERM_RE.findall(fold(query)) if t not in _STREET_TYPES]
+    if not terms:
+        raise ValueError(f"Empty search query: {query!r}")
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _register_functions(conn: sqlite3.Connection) -> None:
+    conn.create_function("rcn_fold", 1, fold, deterministic=True)
+    conn.create_function("rcn_normalize_street", 1, normalize_street, deterministic=True)
+
+
+def has_address_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (ADDRESS_INDEX,)).fetchone() is not None
+
+
+def _insert_rows(conn: sqlite3.Connection, after_rowid: int) -> int:
+    _register_functions(conn)
+    # columns may be projected away by a parser config
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(raw_adres)")}
+    miejscowosc, ulica, numer = (c if c in existing else "NULL" for c in ("miejscowosc", "ulica", "numer_porzadkowy"))
+    cur = conn.execute(f"""
+        INSERT INTO {ADDRESS_INDEX} (rowid, adres_id, miejscowosc, ulica, numer)
+        SELECT rowid, id, rcn_fold({miejscowosc}), rcn_normalize_street({ulica}), rcn_fold({numer})
+          FROM raw_adres WHERE rowid > ?
+    """, (after_rowid,))
+    return cur.rowcount
+
+
+def build_address_index(conn: sqlite3.Connection) -> int:
+    """(Re)build the address index from raw_adres in bulk. Returns indexed rows."""
+    start = time.time()
+    conn.execute(f"DROP TABLE IF EXISTS {ADDRESS_INDEX}")
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE {ADDRESS_INDEX} USING fts5(
+            adres_id UNINDEXED, miejscowosc, ulica, numer,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    rows = _insert_rows(conn, 0)
+    conn.execute(f"INSERT INTO {ADDRESS_INDEX} ({ADDRESS_INDEX}) VALUES ('optimize')")
+    conn.commit()
+    logger.info(f"[search] {ADDRESS_INDEX}: {rows} addresses indexed in {time.time() - start:.1f}s")
+    return rows
+
+
+def update_address_index(conn: sqlite3.Connection) -> dict | None:
+    """
+    Bring the address index up to date with raw_adres (after an import or purge).
+    Returns {"added", "removed"}, or None if there is no index.
+    """
+    if not has_address_index(conn):
+        return None
+    start = time.time()
+    removed = conn.execute(f"""
+        DELETE FROM {ADDRESS_INDEX} WHERE rowid IN (
+            SELECT f.rowid FROM {ADDRESS_INDEX} f
+             WHERE NOT EXISTS (SELECT 1 FROM raw_adres a WHERE a.rowid = f.rowid))
+    """).rowcount
+    last = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {ADDRESS_INDEX}").fetchone()[0]
+    added = _insert_rows(conn, last)
+    conn.commit()
+    logger.info(f"[search] {ADDRESS_INDEX}: +{added} / -{removed} addresses in {time.time() - start:.1f}s")
+    return {"added": added, "removed": removed}
+
+
+def search(conn: sqlite3.Connection, query: str, limit: int = 50, table: str = "rcn_wide",
+           max_addresses: int = 1000) -> list[dict]:
+    """
+    Return transactions at addresses matching query (best matches first).
+
+    Args:
+        conn: Connection to the database (with address index and wide table)
+        query: Free text, e.g. "Lublin Szkolna 78"
+        limit: Max rows returned
+        table: Wide table
+        max_addresses: Max matching addresses joined to the wide table
+
+    Returns:
+        list of dicts: miejscowosc, ulica, numer_porzadkowy, via (lokal / budynek / dzialka)
+        and the SEARCH_COLUMNS present in the wide table
+    """
+    if not has_address_index(conn):
+        raise ValueError("No address index; build it with build_address_index() (search --build)")
+    wide_columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+    joins = [(column, via) for column, via in _WIDE_ADDRESS_COLUMNS if column in wide_columns]
+    if not joins:
+        raise ValueError(f"Table {table} has no address id columns ({', '.join(c for c, _ in _WIDE_ADDRESS_COLUMNS)})")
+    columns = [c for c in SEARCH_COLUMNS if c in wide_columns]
+
+    selects = [
+        f"""SELECT h.rank, a.miejscowosc, a.ulica, a.numer_porzadkowy, '{via}' AS via,
+                   {', '.join(f'w.{c}' for c in columns)}
+              FROM hits h
+              JOIN raw_adres a ON a.id = h.adres_id
+              JOIN "{table}" w ON w.{column} = h.adres_id"""
+        for column, via in joins
+    ]
+    order = "rank, transakcja_data_wpisu DESC" if "transakcja_data_wpisu" in columns else "rank"
+    sql = f"""
+        WITH hits AS (
+            SELECT adres_id, rank FROM {ADDRESS_INDEX} WHERE {ADDRESS_INDEX} MATCH ? ORDER BY rank LIMIT ?
+        )
+        SELECT DISTINCT * FROM ({' UNION ALL '.join(selects)})
+        ORDER BY {order}
+        LIMIT ?
+    """
+    cur = conn.execute(sql, (match_expression(query), max_addresses, limit))
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names[1:], row[1:])) for row in cur]
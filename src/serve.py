@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Local HTTP query service (stdlib ThreadingHTTPServer, JSON responses).
+
+Endpoints (GET):
+    /transactions/<id>                       wide table rows of a transaction
+    /search?q=Lublin+Szkolna&limit=50        transactions by address (see src/search.py)
+    /bbox?bbox=min_x,min_y,max_x,max_y&type=dzialka&limit=1000
+                                             dzialka / budynek / lokal features whose bbox
+                                             intersects it (EPSG:2178), with their transaction
+    /stats?rodzaj_rynku=2&from=2020-01-01&to=2020-12-31&group=month
+                                             transaction price stats, filtered by coded columns
+                                             (duplicates left out, &duplicates=1 keeps them)
+    /metrics                                 request counts, latency percentiles, cache stats
+
+Requests run on a pool of read-only connections (mmap_size set), so they never take
+write locks and can run next to an import (best with WAL, see src/wal.py). Results are
+kept in an LRU cache keyed by endpoint and parameters. The cache is cleared when the data
+changes: a new completed (or purged) import in _import_meta, the derived tables updated
+after it (indexed_at), or a rebuilt table (schema version), checked at most every
+`check_interval` seconds.
+"""
+import argparse
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from src.export import build_query, parse_bbox
+from src.search import search
+
+logger = logging.getLogger("rcn")
+
+MMAP_SIZE = 256 << 20
+# geometry tables served by /bbox
+BBOX_TYPES = {"dzialka": "raw_dzialka", "budynek": "raw_budynek", "lokal": "raw_lokal"}
+# coded wide table columns accepted as /stats filters (see src/dictionaries.py)
+STATS_FILTERS = ("rodzaj_transakcji", "rodzaj_rynku", "rodzaj_nieruchomosci", "rodzaj_prawa_do_nieruchomosci",
+                 "funkcja_lokalu", "sposob_uzytkowania", "rodzaj_budynku")
+STATS_GROUPS = {"": "NULL", "year": "substr(transakcja_data_wpisu, 1, 4)", "month": "substr(transakcja_data_wpisu, 1, 7)"}
+
+
+class ConnectionPool:
+    """Fixed set of read-only connections shared by the request threads."""
+
+    def __init__(self, db_path: str, size: int = 4, mmap_size: int = MMAP_SIZE, timeout: int = 30):
+        if not Path(db_path).exists():
+            raise ValueError(f"Database not found: {db_path}")
+        self.size = size
+        self._free = queue.Queue()
+        uri = Path(db_path).absolute().as_uri() + "?mode=ro"
+        for _ in range(size):
+            conn = sqlite3.connect(uri, uri=True, timeout=timeout, check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout = {timeout * 1000};")
+            conn.execute(f"PRAGMA mmap_size = {int(mmap_size)};")
+            self._free.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._free.get()
+        try:
+            yield conn
+        finally:
+            self._free.put(conn)
+
+    def close(self) -> None:
+        for _ in range(self.size):
+            self._free.get().close()
+
+
+class ResultCache:
+    """Thread-safe LRU cache of endpoint results."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.clears = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.clears += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._items), "maxsize": self.maxsize, "hits": self.hits,
+                    "misses": self.misses, "clears": self.clears}
+
+
+class LatencyStats:
+    """Request counts and latency percentiles per endpoint (last `window` requests)."""
+
+    def __init__(self, window: int = 10000):
+        self.window = window
+        self._latencies = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self.window)).append(seconds * 1000)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+    def report(self) -> dict:
+        with self._lock:
+            snapshot = {endpoint: sorted(values) for endpoint, values in self._latencies.items()}
+            counts = dict(self._counts)
+        report = {}
+        for endpoint, values in sorted(snapshot.items()):
+            def pct(p: float) -> float:
+                # nearest rank
+                return round(values[min(len(values) - 1, int(p / 100 * len(values)))], 3)
+            report[endpoint] = {"count": counts[endpoint], "p50_ms": pct(50), "p95_ms": pct(95),
+                                "p99_ms": pct(99), "max_ms": round(values[-1], 3)}
+        return report
+
+
+def _rows(cur: sqlite3.Cursor) -> list[dict]:
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in cur]
+
+
+def _param(params: dict, name: str, default=None, kind=str):
+    values = params.get(name)
+    if not values or values[0] == "":
+        return default
+    try:
+        return kind(values[0])
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {values[0]!r}")
+
+
+class QueryService:
+    """
+    Endpoints of the HTTP service (transport independent).
+
+    Args:
+        db_path: Path to SQLite database
+        table: Wide table queried by /transactions, /search and /stats
+        pool_size: Read-only connections
+        cache_size: Cached results (0 = no cache)
+        mmap_size: PRAGMA mmap_size of the connections (bytes)
+        check_interval: Seconds between checks for new imports (cache invalidation)
+        max_limit: Upper bound of the limit parameter
+    """
+
+    def __init__(self, db_path: str, table: str = "rcn_wide", pool_size: int = 4, cache_size: int = 1024,
+                 mmap_size: int = MMAP_SIZE, check_interval: float = 1.0, max_limit: int = 10000):
+        self.table = table
+        self.pool = ConnectionPool(db_path, pool_size, mmap_size)
+        self.cache = ResultCache(cache_size)
+        self.latency = LatencyStats()
+        self.check_interval = check_interval
+        self.max_limit = max_limit
+        self._generation = None
+        self._checked = float("-inf")
+        self._check_lock = threading.Lock()
+        self.endpoints = {
+            "transactions": self.transaction,
+            "search": self.search,
+            "bbox": self.bbox,
+            "stats": self.stats,
+        }
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def data_generation(self, conn: sqlite3.Connection) -> tuple:
+        """
+        Changes when an import completes or is purged, when the derived tables (address
+        index, duplicates, price index) are updated after it, or when a table is rebuilt.
+        """
+        schema = conn.execute("PRAGMA schema_version").fetchone()[0]
+        imports = None  # no imports yet
+        for columns in ("MAX(id), MAX(completed_at), MAX(indexed_at)", "MAX(id), MAX(completed_at)"):
+            try:
+                imports = conn.execute(
+                    f"SELECT {columns} FROM _import_meta WHERE status IN ('completed', 'purged')"
+                ).fetchone()
+                break
+            except sqlite3.OperationalError:
+                continue  # no indexed_at column (database of an older version) / no _import_meta
+        return schema, imports
+
+    def _check_generation(self, conn: sqlite3.Connection) -> None:
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        with self._check_lock:
+            if now - self._checked < self.check_interval:
+                return
+            generation = self.data_generation(conn)
+            if generation != self._generation:
+                if self._generation is not None:
+                    logger.info(f"[serve] data changed {self._generation} -> {generation}, cache cleared")
+                self.cache.clear()
+                self._generation = generation
+            self._checked = now
+
+    def _limit(self, params: dict, default: int) -> int:
+        return max(1, min(_param(params, "limit", default, int), self.max_limit))
+
+    def _has_column(self, conn: sqlite3.Connection, column: str) -> bool:
+        return any(row[1] == column for row in conn.execute(f'PRAGMA table_info("{self.table}")'))
+
+    def handle(self, path: str, params: dict) -> tuple[int, object]:
+        """Run an endpoint. Returns (HTTP status, JSON-serializable body)."""
+        parts = [unquote(p) for p in path.strip("/").split("/") if p]
+        endpoint = parts[0] if parts else ""
+        start = time.perf_counter()
+        try:
+            if endpoint == "metrics":
+                return 200, {"endpoints": self.latency.report(), "cache": self.cache.stats(),
+                             "pool_size": self.pool.size}
+            handler = self.endpoints.get(endpoint)
+            if handler is None or len(parts) > 2:
+                return 404, {"error": f"Unknown endpoint: {path}"}
+            key = (endpoint, tuple(parts[1:]), tuple(sorted((k, tuple(v)) for k, v in params.items())))
+            with self.pool.connection() as conn:
+                self._check_generation(conn)
+                result = self.cache.get(key)
+                if result is None:
+                    result = handler(conn, parts[1:], params)
+                    self.cache.put(key, result)
+            return result
+        except ValueError as exc:
+            return 400, {"error": str(exc)}
+        except sqlite3.Error as exc:
+            logger.error(f"[serve] {path}: {exc}")
+            return 500, {"error": f"SQLite error: {exc}"}
+        finally:
+            known = endpoint in self.endpoints or endpoint == "metrics"
+            self.latency.record(endpoint if known else "other", time.perf_counter() - start)
+
+    def transaction(self, conn: sqlite3.Connection, args: list[str], params: dict) -> tuple[int, object]:
+        if not args:
+            raise ValueError("Transaction id missing: /transactions/<id>")
+        rows = _rows(conn.execute(f'SELECT * FROM "{self.table}" WHERE transakcja_id = ?', (args[0],)))
+        if not rows:
+            return 404, {"error": f"Transaction not found: {args[0]}"}
+        return 200, {"transakcja_id": args[0], "rows": rows}
+
+    def search(self, conn: sqlite3.Connection, args: list[str], params: dict) -> tuple[int, object]:
+        query = _param(params, "q")
+        if not query:
+            raise ValueError("Query missing: /search?q=...")
+        rows = search(conn, query, self._limit(params, 50), self.table)
+        return 200, {"query": query, "rows": rows}
+
+    def bbox(self, conn: sqlite3.Connection, args: list[str], params: dict) -> tuple[int, object]:
+        bbox = _param(params, "bbox", kind=parse_bbox)
+        if bbox is None:
+            raise ValueError("bbox missing: /bbox?bbox=min_x,min_y,max_x,max_y")
+        ftype = _param(params, "type", "dzialka")
+        if ftype not in BBOX_TYPES:
+            raise ValueError(f"Unknown type: {ftype}. Known: {', '.join(BBOX_TYPES)}")
+        sql, sql_params = build_query(conn, BBOX_TYPES[ftype], "geojsonseq", bbox)
+        rows = _rows(conn.execute(f"{sql} LIMIT ?", sql_params + (self._limit(params, 1000),)))
+        for row in rows:
+            if row.get("geometria"):
+                row["geometria"] = json.loads(row["geometria"])
+        return 200, {"type": ftype, "bbox": bbox, "rows": rows}
+
+    def stats(self, conn: sqlite3.Connection, args: list[str], params: dict) -> tuple[int, object]:
+        group = _param(params, "group", "")
+        if group not in STATS_GROUPS:
+            raise ValueError(f"Unknown group: {group}. Known: year, month")
+        where = []
+        values = []
+        filters = {}
+        for column in STATS_FILTERS:
+            code = _param(params, column, kind=int)
+            if code is not None:
+                where.append(f"{column} = ?")
+                values.append(code)
+                filters[column] = code
+        for name, op in (("from", ">="), ("to", "<=")):
+            day = _param(params, name)
+            if day is not None:
+                where.append(f"transakcja_data_wpisu {op} ?")
+                values.append(day)
+                filters[name] = day
+        if not _param(params, "duplicates", 0, kind=int) and self._has_column(conn, "duplicate_of"):
+            where.append("duplicate_of IS NULL")
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        # one row per transaction: the wide table repeats it per dzialka / budynek / lokal
+        cur = conn.execute(f"""
+            SELECT period, COUNT(*) AS transactions, AVG(price) AS avg_price, MIN(price) AS min_price,
+                   MAX(price) AS max_price, SUM(price) AS total_price
+              FROM (SELECT DISTINCT transakcja_id, {STATS_GROUPS[group]} AS period, cena_transakcji_brutto AS price
+                      FROM "{self.table}" {where_sql})
+             GROUP BY period ORDER BY period
+        """, values)
+        rows = _rows(cur)
+        if not group:
+            for row in rows:
+                del row["period"]
+        return 200, {"filters": filters, "group": group or None, "rows": rows}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "rcn2sql"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        status, body = self.server.service.handle(url.path, parse_qs(url.query))
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"[serve] {self.address_string()} {format % args}")
+
+
+def make_server(db_path: str, host: str = "127.0.0.1", port: int = 8080, **options) -> ThreadingHTTPServer:
+    """Create the HTTP server (port 0 = any free port); options go to QueryService."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    try:
+        server.service = QueryService(db_path, **options)
+    except Exception:
+        server.server_close()
+        raise
+    return server
+
+
+def serve(db_path: str, host: str = "127.0.0.1", port: int = 8080, **options) -> None:
+    """Serve until interrupted (Ctrl+C)."""
+    server = make_server(db_path, host, port, **options)
+    service = server.service
+    logger.info(f"[serve] http://{server.server_address[0]}:{server.server_address[1]}/ db={db_path}, "
+                f"table={service.table}, pool={service.pool.size}, cache={service.cache.maxsize}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        logger.info(f"[serve] stopped: {json.dumps(service.latency.report())}")
+
+
+def main() -> None:
+    from src.logging_config import setup_logging
+    setup_logging()
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite DB")
+    ap.add_argument("--host", default="127.0.0.1", help="Listen address")
+    ap.add_argument("--port", type=int, default=8080, help="Listen port")
+    ap.add_argument("--table", default="rcn_wide", help="Wide table")
+    args = ap.parse_args()
+
+    serve(args.db, args.host, args.port, table=args.table)
+
+
+if __name__ == "__main__":
+    main()
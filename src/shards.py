@@ -0,0 +1,280 @@
+"""
+Sharded storage: one SQLite database per data-provider namespace or voivodeship.
+
+gml:ids carry the provider namespace (e.g. PL.PZGiK.1465.RCN_...; 1465 is the TERYT code
+of the county, its first two digits the voivodeship). Each GML file is split on the raw
+bytes (no XML parsing, see _iter_member_chunks) into one GML file per shard, named
+<stem>.<shard>.gml so import history and duplicate detection work per shard. The shards
+are then imported (and wide-built) in a process pool, one writer per database.
+
+Reprocessing a county only touches the shards its file contains. Shards are read
+together through a temp UNION ALL view over attached databases (attach_shards, limited
+by SQLITE_MAX_ATTACHED, usually 10) or copied into one database (merge_shards).
+"""
+import glob
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from src.build_wide import build_wide
+from src.load_rcn import load_rcn, _iter_member_chunks
+from src.logging_config import setup_worker_logging
+from src.utils import SHARD_KEYS, shard_key
+
+logger = logging.getLogger("rcn")
+
+_ID_RE = re.compile(rb'gml:id="([^"]*)"')
+
+
+def shard_path(shard_dir: str, shard: str) -> str:
+    return os.path.join(shard_dir, f"{shard}.sqlite")
+
+
+def list_shards(shard_dir: str) -> dict[str, str]:
+    """Return {shard: database path} of the shard databases in shard_dir."""
+    paths = sorted(glob.glob(os.path.join(shard_dir, "*.sqlite")))
+    return {os.path.basename(p)[:-len(".sqlite")]: p for p in paths}
+
+
+def split_by_shard(gml_path: str, out_dir: str, by: str = "namespace") -> dict[str, str]:
+    """
+    Split a GML file into one GML file per shard (raw byte copy of the featureMembers).
+
+    Returns:
+        {shard: path of the split file}
+    """
+    stem = os.path.splitext(os.path.basename(gml_path))[0]
+    head = b""
+    outputs = {}
+    paths = {}
+    try:
+        with open(gml_path, "rb") as f:
+            for kind, data, _ in _iter_member_chunks(f):
+                if kind == "head":
+                    head = data
+                    continue
+                if kind == "tail":
+                    for out in outputs.values():
+                        out.write(data)
+                    continue
+                m = _ID_RE.search(data)
+                shard = shard_key(m.group(1).decode("utf-8", "replace") if m else None, by)
+                out = outputs.get(shard)
+                if out is None:
+                    paths[shard] = os.path.join(out_dir, f"{stem}.{shard}.gml")
+                    out = outputs[shard] = open(paths[shard], "wb", buffering=1 << 20)
+                    out.write(head)
+                out.write(data)
+    finally:
+        for out in outputs.values():
+            out.close()
+    return paths
+
+
+def process_shard(shard: str, files: list[str], db_path: str, batch_size: int, log_every: int, force: bool,
+                  load_options: dict, wide_table: str | None, wide_profile: str) -> dict:
+    """Import the split files of one shard, then rebuild its wide table if anything changed."""
+    start = time.time()
+    stats = {"shard": shard, "db": db_path, "imported": 0, "skipped": 0, "inserted": 0, "wide_rows": None}
+    for gml_file in files:
+        result = load_rcn(gml_file, db_path, batch_size, log_every, force, **load_options)
+        if result.get("skipped"):
+            stats["skipped"] += 1
+        else:
+            stats["imported"] += 1
+            stats["inserted"] += result.get("inserted", 0)
+
+    if wide_table:
+        conn = sqlite3.connect(db_path)
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (wide_table,)).fetchone()
+        conn.close()
+        if stats["imported"] or not exists:
+            stats["wide_rows"] = build_wide(db_path, wide_table, drop=True, profile=wide_profile)["row_count"]
+    stats["elapsed"] = time.time() - start
+    return stats
+
+
+def load_sharded(gml_files: list[str], shard_dir: str, by: str = "namespace", workers: int | None = None,
+                 batch_size: int = 100000, log_every: int = 500000, force: bool = False,
+                 wide_table: str | None = None, wide_profile: str = "full", **load_options) -> dict:
+    """
+    Split GML files by shard and import the shards in parallel processes.
+
+    Args:
+        gml_files: GML files to import
+        shard_dir: Directory of the shard databases (<shard>.sqlite)
+        by: Shard key: "namespace" (gml:id provider namespace) or "voivodeship"
+        workers: Processes (None = CPU count, 1 = in this process)
+        batch_size, log_every, force: Passed to load_rcn()
+        wide_table: Also (re)build this wide table in every shard that got new data
+        wide_profile: Wide table column profile
+        **load_options: Passed to load_rcn()
+
+    Returns:
+        dict with per-shard statistics ("shards") and elapsed time
+    """
+    if by not in SHARD_KEYS:
+        raise ValueError(f"Unknown shard key: {by} (available: {', '.join(SHARD_KEYS)})")
+    os.makedirs(shard_dir, exist_ok=True)
+    workers = workers or multiprocessing.cpu_count()
+    start = time.time()
+
+    split_dir = tempfile.mkdtemp(prefix="_split_", dir=shard_dir)
+    try:
+        files_by_shard = {}
+        for gml_file in gml_files:
+            t0 = time.time()
+            parts = split_by_shard(gml_file, split_dir, by)
+            logger.info(f"[shards] {os.path.basename(gml_file)}: {len(parts)} shard(s) "
+                        f"({', '.join(sorted(parts))}) in {time.time() - t0:.1f}s")
+            for shard, path in parts.items():
+                files_by_shard.setdefault(shard, []).append(path)
+
+        tasks = [(shard, files, shard_path(shard_dir, shard), batch_size, log_every, force,
+                  load_options, wide_table, wide_profile)
+                 for shard, files in sorted(files_by_shard.items())]
+        logger.info(f"[shards] importing {len(tasks)} shard(s) with {min(workers, len(tasks) or 1)} process(es)")
+        if workers > 1 and len(tasks) > 1:
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(min(workers, len(tasks)), initializer=setup_worker_logging) as pool:
+                results = pool.starmap(process_shard, tasks)
+        else:
+            results = [process_shard(*task) for task in tasks]
+    finally:
+        shutil.rmtree(split_dir, ignore_errors=True)
+
+    for stats in results:
+        wide = f", {wide_table}={stats['wide_rows']}" if stats["wide_rows"] is not None else ""
+        logger.info(f"[shards] {stats['shard']}: imported={stats['imported']}, skipped={stats['skipped']}, "
+                    f"records={stats['inserted']}{wide} ({stats['elapsed']:.1f}s)")
+    elapsed = time.time() - start
+    logger.info(f"[shards] done: {len(results)} shard(s) in {elapsed:.1f}s")
+    return {"shards": {stats["shard"]: stats for stats in results}, "elapsed": elapsed}
+
+
+def _table_columns(conn: sqlite3.Connection, schema: str, table: str) -> list[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA "{schema}".table_info("{table}")')]
+
+
+def attach_shards(conn: sqlite3.Connection, shard_dir: str, table: str = "rcn_wide",
+                  view: str | None = None) -> list[str]:
+    """
+    Attach the shard databases and create a TEMP view (default name: table) with the
+    UNION ALL of their tables plus a shard column. Columns missing in a shard are NULL.
+
+    Returns:
+        names of the shards in the view
+    """
+    shards = []
+    columns = []
+    for i, (shard, path) in enumerate(list_shards(shard_dir).items()):
+        schema = f"shard_{i}"
+        try:
+            conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Cannot attach shard {shard}: {e}; use merge_shards() instead") from e
+        shard_columns = _table_columns(conn, schema, table)
+        if not shard_columns:
+            conn.execute(f"DETACH DATABASE {schema}")
+            continue
+        columns.extend(c for c in shard_columns if c not in columns)
+        shards.append((shard, schema, set(shard_columns)))
+    if not shards:
+        raise ValueError(f"No shard in {shard_dir} has table {table}")
+
+    selects = []
+    for shard, schema, present in shards:
+        cols = ", ".join(f'"{c}"' if c in present else f'NULL AS "{c}"' for c in columns)
+        shard_literal = shard.replace("'", "''")
+        selects.append(f"SELECT '{shard_literal}' AS shard, {cols} FROM {schema}.\"{table}\"")
+    view = view or table
+    conn.execute(f'DROP VIEW IF EXISTS temp."{view}"')
+    conn.execute(f'CREATE TEMP VIEW "{view}" AS ' + "\nUNION ALL ".join(selects))
+    return [shard for shard, _, _ in shards]
+
+
+def merge_shards(shard_dir: str, db_path: str, table: str = "rcn_wide", shards: list[str] | None = None,
+                 timeout: int = 30) -> dict:
+    """
+    Copy the table of the shard databases into one database (with a shard column).
+
+    Args:
+        shard_dir: Directory of the shard databases
+        db_path: Merged database
+        table: Table to merge (e.g. the wide table)
+        shards: Only replace the rows of these shards (None = rebuild the table from all shards)
+        timeout: SQLite busy timeout in seconds
+
+    Returns:
+        dict with rows copied per shard and elapsed time
+    """
+    available = list_shards(shard_dir)
+    if shards is not None:
+        missing = [s for s in shards if s not in available]
+        if missing:
+            raise ValueError(f"Unknown shard(s): {', '.join(missing)}")
+        selected = {s: available[s] for s in shards}
+    else:
+        selected = available
+    merged_path = os.path.abspath(db_path)
+
+    start = time.time()
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    conn.execute(f"PRAGMA busy_timeout = {timeout * 1000};")
+    copied = {}
+    created = False
+    index_sql = []
+    try:
+        if shards is None:
+            conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+        exists = bool(_table_columns(conn, "main", table))
+        for shard, path in selected.items():
+            if os.path.abspath(path) == merged_path:
+                continue
+            conn.execute("ATTACH DATABASE ? AS shard", (path,))
+            try:
+                shard_columns = _table_columns(conn, "shard", table)
+                if not shard_columns:
+                    logger.warning(f"[merge] {shard}: no table {table}, skipped")
+                    continue
+                if not exists:
+                    create_sql = conn.execute("SELECT sql FROM shard.sqlite_master WHERE type = 'table' AND name = ?",
+                                              (table,)).fetchone()[0]
+                    conn.execute(create_sql)
+                    conn.execute(f'ALTER TABLE "{table}" ADD COLUMN shard TEXT')
+                    index_sql = [row[0] for row in conn.execute(
+                        "SELECT sql FROM shard.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                        (table,))]
+                    exists = created = True
+                merged_columns = _table_columns(conn, "main", table)
+                for column in shard_columns:
+                    if column not in merged_columns:
+                        conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}"')
+                conn.execute(f'DELETE FROM "{table}" WHERE shard = ?', (shard,))
+                cols = ", ".join(f'"{c}"' for c in shard_columns)
+                cur = conn.execute(f'INSERT INTO "{table}" ({cols}, shard) SELECT {cols}, ? FROM shard."{table}"',
+                                   (shard,))
+                conn.commit()
+                copied[shard] = cur.rowcount
+                logger.info(f"[merge] {shard}: {cur.rowcount} rows")
+            finally:
+                conn.execute("DETACH DATABASE shard")
+
+        # indexes of a newly created table, built once after the copy
+        for sql in index_sql:
+            conn.execute(sql)
+        if created:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_shard" ON "{table}"(shard)')
+        conn.commit()
+    finally:
+        conn.close()
+
+    elapsed = time.time() - start
+    logger.info(f"[merge] {table}: {sum(copied.values())} rows from {len(copied)} shard(s) in {elapsed:.1f}s")
+    return {"table": table, "copied": copied, "elapsed": elapsed}
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Deterministic generator of synthetic RCN GML files (for benchmarks and tests).
+
+The output follows the structure described in rcn_struct_desc.md: every transaction
+comes with its dokument, nieruchomosc and the dzialka/budynek/lokal/adres features
+it references. The same seed and options always produce byte-identical files.
+"""
+import argparse
+import logging
+import random
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("rcn")
+
+GML_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml/3.2"'
+    ' xmlns:rcn="urn:gugik:specyfikacje:gmlas:rejestrcennieruchomosci:1.0"'
+    ' xmlns:xlink="http://www.w3.org/1999/xlink" gml:id="fc_synth">\n'
+)
+GML_FOOTER = "</gml:FeatureCollection>\n"
+
+# Weights of nieruchomosc kinds: (rodzajNieruchomosci, what it references)
+DEFAULT_MIX = {
+    "dzialka": 0.35,   # rodzaj 1: land only
+    "budynek": 0.15,   # rodzaj 2: land with building
+    "lokal": 0.50,     # rodzaj 4: apartment
+}
+
+CITIES = ["Warszawa", "Kraków", "Łódź", "Wrocław", "Poznań", "Gdańsk", "Szczecin", "Lublin", "Radom", "Płock"]
+STREETS = ["Marszałkowska", "Długa", "Polna", "Leśna", "Słoneczna", "Krótka", "Szkolna", "Ogrodowa",
+           "Lipowa", "Kościuszki", "Mickiewicza", "Żeromskiego", "Źródlana", "Świętokrzyska"]
+NAMES = ["ANNA", "JAN", "PIOTR", "MARIA", "KATARZYNA", "TOMASZ", "EWA", "PAWEŁ"]
+
+
+class SyntheticRCN:
+    """
+    Streaming writer of a synthetic RCN FeatureCollection.
+
+    Args:
+        seed: Random seed (same seed + options -> same file)
+        mix: Weights for nieruchomosc kinds {"dzialka", "budynek", "lokal"}
+        max_links: Max number of dzialka (and lokal) referenced by one nieruchomosc
+        polygon_vertices: Number of vertices in dzialka/budynek polygons
+        address_dup_ratio: Share of addresses emitted again under a different gml:id
+        namespaces: Data-provider namespaces used in gml:ids
+        resale_ratio: Share of transactions selling again a lokal sold alone before (same idLokalu)
+        annual_growth: Yearly price growth applied to resales (by deed date)
+    """
+
+    def __init__(self, seed: int = 0, mix: dict | None = None, max_links: int = 3,
+                 polygon_vertices: int = 5, address_dup_ratio: float = 0.3,
+                 namespaces: tuple[str, ...] = ("PL.PZGiK.5346.RCN",), resale_ratio: float = 0.0,
+                 annual_growth: float = 0.05):
+        self.rng = random.Random(seed)
+        self.mix = mix or DEFAULT_MIX
+        self.max_links = max(1, max_links)
+        self.polygon_vertices = max(4, polygon_vertices)
+        self.address_dup_ratio = address_dup_ratio
+        self.namespaces = namespaces
+        self.resale_ratio = resale_ratio
+        self.annual_growth = annual_growth
+        self._seq = 0
+        self._base_time = datetime(2010, 1, 1)
+        self._recent_addresses = []
+        # [idLokalu, price at 2010-01] of lokale sold alone (resale mode)
+        self._units = []
+        self.counts = {}
+
+    def _next_id(self, ns: str) -> tuple[str, str, str]:
+        """Return (gml:id, lokalnyId, wersjaId) for a new feature."""
+        self._seq += 1
+        local_id = f"{self._seq:05d}-{self._seq % 1000:03d}"
+        ts = self._base_time + timedelta(seconds=self.rng.randrange(0, 15 * 365 * 86400))
+        version = ts.strftime("%Y-%m-%dT%H:%M:%S")
+        fid = f"{ns}_{local_id}_{ts.strftime('%Y-%m-%dT%H-%M-%S')}"
+        return fid, local_id, version
+
+    def _feature(self, ftype: str, fid: str, body: str) -> str:
+        self.counts[ftype] = self.counts.get(ftype, 0) + 1
+        return (f'<gml:featureMember>\n<rcn:{ftype} gml:id="{fid}">\n{body}'
+                f'</rcn:{ftype}>\n</gml:featureMember>\n')
+
+    def _polygon(self, x0: float, y0: float, size: float) -> str:
+        coords = []
+        n = self.polygon_vertices - 1
+        for i in range(n):
+            # walk around a square, vertices spread evenly on its perimeter
+            t = 4.0 * i / n
+            side, frac = int(t), t - int(t)
+            dx, dy = [(frac, 0.0), (1.0, frac), (1.0 - frac, 1.0), (0.0, 1.0 - frac)][side]
+            coords.append(f"{x0 + dx * size:.2f} {y0 + dy * size:.2f}")
+        coords.append(coords[0])
+        return (f'<rcn:geometria>\n<gml:Polygon gml:id="geom.{self._seq}" srsName="urn:ogc:def:crs:EPSG::2178">\n'
+                f'<gml:exterior>\n<gml:LinearRing>\n<gml:posList>{" ".join(coords)}</gml:posList>\n'
+                f'</gml:LinearRing>\n</gml:exterior>\n</gml:Polygon>\n</rcn:geometria>\n')
+
+    def _adres(self, ns: str, out: list) -> str:
+        rng = self.rng
+        if self._recent_addresses and rng.random() < self.address_dup_ratio:
+            body = rng.choice(self._recent_addresses)
+        else:
+            body = (f"<rcn:miejscowosc>{rng.choice(CITIES)}</rcn:miejscowosc>\n"
+                    f"<rcn:ulica>ulica {rng.choice(STREETS)}</rcn:ulica>\n"
+                    f"<rcn:numerPorzadkowy>{rng.randint(1, 200)}</rcn:numerPorzadkowy>\n")
+            self._recent_addresses.append(body)
+            if len(self._recent_addresses) > 1000:
+                self._recent_addresses.pop(0)
+        fid, _, _ = self._next_id(ns)
+        out.append(self._feature("RCN_Adres", fid, body))
+        return fid
+
+    def _dzialka(self, ns: str, x0: float, y0: float, out: list) -> str:
+        rng = self.rng
+        adres_id = self._adres(ns, out)
+        fid, _, _ = self._next_id(ns)
+        body = (f"<rcn:idDzialki>146519_8.{rng.randint(1, 9999):04d}.{rng.randint(1, 999)}</rcn:idDzialki>\n"
+                + self._polygon(x0, y0, rng.uniform(20, 120))
+                + f'<rcn:polePowierzchniEwidencyjnej uom="m2">{rng.uniform(200, 20000):.2f}</rcn:polePowierzchniEwidencyjnej>\n'
+                f"<rcn:sposobUzytkowania>{rng.randint(1, 10)}</rcn:sposobUzytkowania>\n"
+                f'<rcn:adresDzialki xlink:href="{adres_id}"/>\n')
+        out.append(self._feature("RCN_Dzialka", fid, body))
+        return fid
+
+    def _budynek(self, ns: str, x0: float, y0: float, out: list) -> str:
+        rng = self.rng
+        adres_id = self._adres(ns, out)
+        fid, _, _ = self._next_id(ns)
+        body = (f"<rcn:idBudynku>146519_8.{rng.randint(1, 9999):04d}.{rng.randint(1, 999)}_BUD</rcn:idBudynku>\n"
+                + self._polygon(x0, y0, rng.uniform(8, 40))
+                + f"<rcn:liczbaKondygnacji>{rng.randint(1, 12)}</rcn:liczbaKondygnacji>\n"
+                f"<rcn:liczbaMieszkań>{rng.randint(1, 80)}</rcn:liczbaMieszkań>\n"
+                f"<rcn:rodzajBudynku>{rng.choice((110, 121, 122, 127))}</rcn:rodzajBudynku>\n"
+                f'<rcn:adresBudynku xlink:href="{adres_id}"/>\n')
+        out.append(self._feature("RCN_Budynek", fid, body))
+        return fid
+
+    def _id_lokalu(self) -> str:
+        rng = self.rng
+        return f"146519_8.{rng.randint(1, 9999):04d}.{rng.randint(1, 99)}_BUD.{rng.randint(1, 120)}_LOK"
+
+    def _date(self) -> str:
+        rng = self.rng
+        return f"{rng.randint(2010, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+    def _lokal(self, ns: str, x0: float, y0: float, adres_id: str, out: list, id_lokalu: str | None = None) -> str:
+        rng = self.rng
+        fid, _, _ = self._next_id(ns)
+        id_lokalu = id_lokalu or self._id_lokalu()
+        body = (f"<rcn:idLokalu>{id_lokalu}</rcn:idLokalu>\n"
+                f'<rcn:georeferencja>\n<gml:Point gml:id="geom.{self._seq}" srsName="urn:ogc:def:crs:EPSG::2178">\n'
+                f"<gml:pos>{x0 + rng.uniform(0, 30):.2f} {y0 + rng.uniform(0, 30):.2f}</gml:pos>\n</gml:Point>\n</rcn:georeferencja>\n"
+                f"<rcn:funkcjaLokalu>{rng.randint(1, 4)}</rcn:funkcjaLokalu>\n"
+                f"<rcn:liczbaIzb>{rng.randint(1, 6)}</rcn:liczbaIzb>\n"
+                f"<rcn:nrKondygnacji>{rng.randint(0, 15)}</rcn:nrKondygnacji>\n"
+                f'<rcn:powUzytkowaLokalu uom="m2">{rng.uniform(18, 160):.2f}</rcn:powUzytkowaLokalu>\n'
+                f"<rcn:cenaLokaluBrutto>{rng.randint(100, 2000) * 1000:.2f}</rcn:cenaLokaluBrutto>\n"
+                f'<rcn:adresBudynkuZLokalem xlink:href="{adres_id}"/>\n')
+        out.append(self._feature("RCN_Lokal", fid, body))
+        return fid
+
+    def transaction(self) -> str:
+        """Return GML text of one transaction with all features it references."""
+        rng = self.rng
+        ns = rng.choice(self.namespaces)
+        out = []
+        resale = None
+        if self.resale_ratio and self._units and rng.random() < self.resale_ratio:
+            resale = rng.choice(self._units)
+            kind = "lokal"
+        else:
+            kind = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        x0 = rng.uniform(5_700_000, 5_900_000)
+        y0 = rng.uniform(7_400_000, 7_600_000)
+
+        links = []
+        n_dz = rng.randint(1, self.max_links)
+        for _ in range(n_dz):
+            links.append(("dzialka", self._dzialka(ns, x0, y0, out)))
+        if kind in ("budynek", "lokal"):
+            links.append(("budynek", self._budynek(ns, x0, y0, out)))
+        if kind == "lokal":
+            adres_id = self._adres(ns, out)
+            lokale = 1 if resale else rng.randint(1, self.max_links)
+            unit = resale[0] if resale else (self._id_lokalu() if self.resale_ratio and lokale == 1 else None)
+            for _ in range(lokale):
+                links.append(("lokal", self._lokal(ns, x0, y0, adres_id, out, unit)))
+
+        deed_date = None
+        if self.resale_ratio:
+            # prices follow the growth by deed date; resales keep the value of the unit
+            deed_date = self._date()
+            growth = (1 + self.annual_growth) ** (int(deed_date[:4]) - 2010 + (int(deed_date[5:7]) - 1) / 12)
+            if resale:
+                price = round(resale[1] * growth * rng.lognormvariate(0, 0.05), -3)
+            else:
+                price = rng.randint(50, 3000) * 1000
+                if kind == "lokal" and lokale == 1:
+                    self._units.append([unit, price / growth])
+        else:
+            price = rng.randint(50, 3000) * 1000
+        nier_id, _, _ = self._next_id(ns)
+        rodzaj = {"dzialka": 1, "budynek": 2, "lokal": 4}[kind]
+        body = (f"<rcn:rodzajNieruchomosci>{rodzaj}</rcn:rodzajNieruchomosci>\n"
+                f"<rcn:rodzajPrawaDoNieruchomosci>{rng.randint(1, 4)}</rcn:rodzajPrawaDoNieruchomosci>\n"
+                f"<rcn:udzialWPrawieDoNieruchomosci>1/{rng.choice((1, 1, 1, 2, 4))}</rcn:udzialWPrawieDoNieruchomosci>\n"
+                f"<rcn:cenaNieruchomosciBrutto>{price:.2f}</rcn:cenaNieruchomosciBrutto>\n"
+                + "".join(f'<rcn:{field} xlink:href="{target}"/>\n' for field, target in links))
+        out.append(self._feature("RCN_Nieruchomosc", nier_id, body))
+
+        dok_id, _, _ = self._next_id(ns)
+        body = (f"<rcn:oznaczenieDokumentu>{rng.randint(1, 99999)}/{rng.randint(2010, 2025)}</rcn:oznaczenieDokumentu>\n"
+                f"<rcn:dataSporzadzeniaDokumentu>{deed_date or self._date()}</rcn:dataSporzadzeniaDokumentu>\n"
+                f"<rcn:tworcaDokumentu>{rng.choice(NAMES)} XYZ</rcn:tworcaDokumentu>\n")
+        out.append(self._feature("RCN_Dokument", dok_id, body))
+
+        tx_id, local_id, version = self._next_id(ns)
+        body = (f"<rcn:IdRCN>\n<rcn:RCN_IdentyfikatorIIP>\n<rcn:przestrzenNazw>{ns}</rcn:przestrzenNazw>\n"
+                f"<rcn:lokalnyId>{local_id}</rcn:lokalnyId>\n<rcn:wersjaId>{version}</rcn:wersjaId>\n"
+                f"</rcn:RCN_IdentyfikatorIIP>\n</rcn:IdRCN>\n"
+                f"<rcn:oznaczenieTransakcji>{rng.randint(1, 99999)}</rcn:oznaczenieTransakcji>\n"
+                f"<rcn:rodzajTransakcji>{rng.randint(1, 4)}</rcn:rodzajTransakcji>\n"
+                f"<rcn:rodzajRynku>{rng.randint(1, 2)}</rcn:rodzajRynku>\n"
+                f"<rcn:stronaSprzedajaca>{rng.randint(1, 6)}</rcn:stronaSprzedajaca>\n"
+                f"<rcn:stronaKupujaca>{rng.randint(1, 6)}</rcn:stronaKupujaca>\n"
+                f"<rcn:cenaTransakcjiBrutto>{price:.2f}</rcn:cenaTransakcjiBrutto>\n"
+                f'<rcn:podstawaPrawna xlink:href="{dok_id}"/>\n'
+                f'<rcn:nieruchomosc xlink:href="{nier_id}"/>\n')
+        out.append(self._feature("RCN_Transakcja", tx_id, body))
+        return "".join(out)
+
+
+def generate_gml(path: str, transactions: int | None = None, target_bytes: int | None = None,
+                 seed: int = 0, **options) -> dict:
+    """
+    Write a synthetic RCN GML file.
+
+    Generation stops after `transactions` transactions or when the file reaches
+    `target_bytes` (whichever comes first). At least one of them must be given.
+
+    Args:
+        path: Output GML path
+        transactions: Number of transactions to generate
+        target_bytes: Approximate file size in bytes
+        seed: Random seed
+        **options: Passed to SyntheticRCN (mix, max_links, polygon_vertices, ...)
+
+    Returns:
+        dict with statistics: transactions, bytes, by_type
+    """
+    if transactions is None and target_bytes is None:
+        raise ValueError("Either transactions or target_bytes must be given")
+
+    gen = SyntheticRCN(seed=seed, **options)
+    written = 0
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="\n", buffering=1 << 20) as f:
+        written += f.write(GML_HEADER)
+        while True:
+            if transactions is not None and count >= transactions:
+                break
+            if target_bytes is not None and written >= target_bytes:
+                break
+            chunk = gen.transaction()
+            # sizes are tracked in characters; close enough to bytes for mostly-ASCII GML
+            written += f.write(chunk)
+            count += 1
+        written += f.write(GML_FOOTER)
+
+    return {"transactions": count, "bytes": written, "by_type": dict(gen.counts)}
+
+
+def _parse_size(value: str) -> int:
+    """Parse sizes like '10MB', '20GB', '500k' into bytes."""
+    value = value.strip().upper().rstrip("B")
+    units = {"K": 1_000, "M": 1_000_000, "G": 1_000_000_000}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def main() -> None:
+    from src.logging_config import setup_logging
+    setup_logging()
+
+    ap = argparse.ArgumentParser(description="Generate a synthetic RCN GML file")
+    ap.add_argument("--out", required=True, help="Output GML path")
+    ap.add_argument("--size", type=_parse_size, default=None, help="Target file size, e.g. 10MB, 20GB")
+    ap.add_argument("--transactions", type=int, default=None, help="Number of transactions")
+    ap.add_argument("--seed", type=int, default=0, help="Random seed")
+    ap.add_argument("--mix", default=None, help="Nieruchomosc mix, e.g. dzialka=0.3,budynek=0.2,lokal=0.5")
+    ap.add_argument("--max-links", type=int, default=3, help="Max dzialka/lokal links per nieruchomosc")
+    ap.add_argument("--polygon-vertices", type=int, default=5, help="Vertices per polygon")
+    ap.add_argument("--address-dup-ratio", type=float, default=0.3, help="Share of duplicated addresses")
+    ap.add_argument("--resale-ratio", type=float, default=0.0, help="Share of repeat sales of a lokal")
+    ap.add_argument("--namespaces", default="PL.PZGiK.5346.RCN", help="Comma-separated provider namespaces")
+    args = ap.parse_args()
+
+    if args.size is None and args.transactions is None:
+        ap.error("one of --size or --transactions is required")
+
+    mix = None
+    if args.mix:
+        mix = {k: float(v) for k, v in (item.split("=", 1) for item in args.mix.split(","))}
+
+    result = generate_gml(
+        args.out, transactions=args.transactions, target_bytes=args.size, seed=args.seed,
+        mix=mix, max_links=args.max_links, polygon_vertices=args.polygon_vertices,
+        address_dup_ratio=args.address_dup_ratio, namespaces=tuple(args.namespaces.split(",")),
+        resale_ratio=args.resale_ratio,
+    )
+    logger.info(f"Written {args.out}: {result['transactions']} transactions, {result['bytes'] / 1_000_000:.1f}MB")
+    for k in sorted(result["by_type"]):
+        logger.info(f"  {k}: {result['by_type'][k]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,15 @@
 """
 Utility functions for RCN processing.
 """
+import os
+import re
+import sys
+
+SHARD_KEYS = ("namespace", "voivodeship")
+
+# PL.PZGiK.<TERYT>.RCN -> voivodeship = first two digits of the TERYT code
+_TERYT_RE = re.compile(r"\.(\d{2})\d*(?:\.|$)")
+_UNSAFE_RE = re.compile(r"[^\w.\-]")
 
 
 def local(tag: str) -> str:
@@ -12,3 +21,44 @@ def local(tag: str) -> str:
         return tag.split("}", 1)[1]
     return tag
 
+
+def shard_key(fid: str | None, by: str = "namespace") -> str:
+    """Return the shard name of a gml:id ("unknown" when it carries no namespace)."""
+    namespace = fid.split("_", 1)[0] if fid else ""
+    if "." not in namespace:
+        return "unknown"
+    if by == "namespace":
+        return _UNSAFE_RE.sub("_", namespace)
+    if by == "voivodeship":
+        m = _TERYT_RE.search(namespace)
+        return f"woj_{m.group(1)}" if m else "unknown"
+    raise ValueError(f"Unknown shard key: {by} (available: {', '.join(SHARD_KEYS)})")
+
+
+def peak_rss_mb() -> float | None:
+    """
+    Return peak resident set size of the current process in MB.
+    Returns None on platforms without the `resource` module (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    if sys.platform == "darwin":
+        return peak / 1_000_000
+    return peak / 1_000
+
+
+def current_rss_mb() -> float | None:
+    """
+    Return current resident set size of the current process in MB.
+    Uses /proc on Linux, falls back to peak RSS elsewhere.
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1_000_000
+    except (OSError, ValueError, IndexError, AttributeError):
+        return peak_rss_mb()
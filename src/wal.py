@@ -0,0 +1,65 @@
+"""
+Reading the database while an import is running.
+
+In WAL mode readers never wait for the writer: they see the last committed state
+while the loader keeps appending to the write-ahead log. The WAL is checkpointed
+passively (readers are never blocked) every `autocheckpoint` pages, and the file is
+truncated back to `journal_size_limit` after a checkpoint so it stays bounded.
+
+Committed slices of a running import are visible, so every table with an import_id
+gets a <table>_completed view showing only rows of completed imports.
+"""
+import logging
+import sqlite3
+from pathlib import Path
+
+from src.purge import tables_with_import_id
+
+logger = logging.getLogger("rcn")
+
+WAL_AUTOCHECKPOINT = 1000          # pages (SQLite default)
+WAL_JOURNAL_SIZE_LIMIT = 64 << 20  # bytes kept after a checkpoint
+
+
+def enable_wal(conn: sqlite3.Connection, autocheckpoint: int = WAL_AUTOCHECKPOINT,
+               journal_size_limit: int = WAL_JOURNAL_SIZE_LIMIT) -> str:
+    """Switch the database to WAL mode (persistent) with bounded checkpoints. Returns the journal mode."""
+    mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA wal_autocheckpoint = {int(autocheckpoint)}")
+    conn.execute(f"PRAGMA journal_size_limit = {int(journal_size_limit)}")
+    return mode
+
+
+def is_wal(conn: sqlite3.Connection) -> bool:
+    return conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def checkpoint(conn: sqlite3.Connection) -> tuple[int, int, int]:
+    """Passive checkpoint. Returns (busy, wal pages, checkpointed pages)."""
+    return tuple(conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone())
+
+
+def ensure_completed_views(conn: sqlite3.Connection) -> list[str]:
+    """
+    Create <table>_completed views (rows of completed imports only) for all data
+    tables with an import_id column. Returns the view names.
+    """
+    views = []
+    for table in tables_with_import_id(conn):
+        if table.startswith("_"):
+            continue
+        view = f"{table}_completed"
+        conn.execute(
+            f'CREATE VIEW IF NOT EXISTS "{view}" AS SELECT * FROM "{table}" '
+            f"WHERE import_id IN (SELECT id FROM _import_meta WHERE status = 'completed')"
+        )
+        views.append(view)
+    return views
+
+
+def connect_reader(db_path: str, timeout: int = 30) -> sqlite3.Connection:
+    """Read-only connection for reporting queries next to a running import."""
+    conn = sqlite3.connect(Path(db_path).absolute().as_uri() + "?mode=ro", uri=True, timeout=timeout)
+    conn.execute(f"PRAGMA busy_timeout = {timeout * 1000};")
+    return conn
@@ -0,0 +1,251 @@
+"""
+Watch a drop folder and import new GML files as they arrive.
+
+An asyncio loop polls the folder every `interval` seconds (os.scandir, no rescan of
+file contents). A file is complete when its size and mtime did not change for
+`settle` seconds; it is then queued. One worker process imports the queued files
+through load_rcn() (single writer) while the loop keeps polling. Once the queue is
+empty the wide table is rebuilt, so a burst of files costs one rebuild; a failed
+rebuild (e.g. database locked) is logged and retried after the next import.
+
+Files already imported (name and size in _import_meta) are marked done at startup
+and never queued again; a file that changes after import is queued like a new one
+(load_rcn then skips it unless force is set).
+"""
+import argparse
+import asyncio
+import fnmatch
+import logging
+import multiprocessing
+import os
+import signal
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.build_wide import build_wide, WIDE_PROFILES
+from src.import_meta import ensure_import_meta_schema
+from src.load_rcn import load_rcn
+from src.logging_config import setup_worker_logging
+
+logger = logging.getLogger("rcn")
+
+
+def _ingest_file(gml_path: str, db_path: str, batch_size: int, log_every: int, force: bool,
+                 load_options: dict) -> dict:
+    """Worker: import one file (runs in the executor process)."""
+    return load_rcn(gml_path, db_path, batch_size, log_every, force, **load_options)
+
+
+def _refresh_wide(db_path: str, table: str, profile: str) -> int:
+    """Worker: rebuild the wide table. Returns its row count."""
+    return build_wide(db_path, table, drop=True, profile=profile)["row_count"]
+
+
+class FolderWatcher:
+    """
+    Detect completed files in a folder and ingest them one by one.
+
+    Args:
+        folder: Drop folder
+        db_path: Path to SQLite database
+        pattern: File name pattern (fnmatch)
+        interval: Seconds between folder polls
+        settle: Seconds a file's size and mtime must stay unchanged before it is queued
+        table: Wide table refreshed after imports (None = no refresh)
+        wide_profile: Wide table column profile
+        batch_size, log_every, force, **load_options: Passed to load_rcn()
+    """
+
+    def __init__(self, folder: str, db_path: str, pattern: str = "*.gml", interval: float = 5.0,
+                 settle: float = 10.0, table: str | None = "rcn_wide", wide_profile: str = "full",
+                 batch_size: int = 100000, log_every: int = 500000, force: bool = False, **load_options):
+        self.folder = folder
+        self.db_path = db_path
+        self.pattern = pattern
+        self.interval = interval
+        self.settle = settle
+        self.table = table
+        self.wide_profile = wide_profile
+        self.load_args = (db_path, batch_size, log_every, force, load_options)
+        # path -> (size, mtime, first seen with this size/mtime)
+        self.pending = {}
+        # path -> (size, mtime) of files queued or done
+        self.done = {}
+        self.stats = {"imported": 0, "skipped": 0, "failed": 0, "wide_refreshes": 0, "refresh_failed": 0}
+        self._stop = None
+
+    def load_known_imports(self) -> int:
+        """Mark files already imported into db_path (same name and size) as done."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            ensure_import_meta_schema(conn)
+            known = set(conn.execute("SELECT source_file, file_size FROM _import_meta "
+                                     "WHERE status = 'completed' AND mode IS NULL"))
+        finally:
+            conn.close()
+        marked = 0
+        for entry in self._list():
+            st = entry.stat()
+            if (entry.name, st.st_size) in known:
+                self.done[entry.path] = (st.st_size, st.st_mtime)
+                marked += 1
+        return marked
+
+    def _list(self):
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            return []
+        return [e for e in entries if e.is_file() and fnmatch.fnmatch(e.name, self.pattern)]
+
+    def scan(self, now: float | None = None) -> list[str]:
+        """Poll the folder once. Returns files that became complete (oldest first)."""
+        now = time.time() if now is None else now
+        ready = []
+        present = set()
+        for entry in self._list():
+            present.add(entry.path)
+            st = entry.stat()
+            state = (st.st_size, st.st_mtime)
+            if self.done.get(entry.path) == state:
+                continue
+            seen = self.pending.get(entry.path)
+            if seen is None or seen[:2] != state:
+                self.pending[entry.path] = state + (now,)
+                continue
+            if now - seen[2] >= self.settle:
+                del self.pending[entry.path]
+                self.done[entry.path] = state
+                ready.append((st.st_mtime, entry.path))
+        for path in list(self.pending):
+            if path not in present:
+                del self.pending[path]
+        return [path for _, path in sorted(ready)]
+
+    async def _poll(self, queue: asyncio.Queue, once: bool) -> None:
+        while not self._stop.is_set():
+            for path in self.scan():
+                logger.info(f"[watch] queued: {os.path.basename(path)}")
+                queue.put_nowait(path)
+            if once and not self.pending:
+                return
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh(self, loop, executor) -> bool:
+        """Rebuild the wide table. Returns False (logged) on failure, so it is retried after the next import."""
+        try:
+            rows = await loop.run_in_executor(executor, _refresh_wide, self.db_path, self.table, self.wide_profile)
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            raise
+        except BaseException as e:
+            # build_wide() exits (SystemExit) on database errors such as a lock
+            logger.error(f"[watch] refresh of {self.table} failed: {e!r}")
+            self.stats["refresh_failed"] += 1
+            return False
+        logger.info(f"[watch] refreshed {self.table}: {rows} rows")
+        self.stats["wide_refreshes"] += 1
+        return True
+
+    async def _ingest(self, queue: asyncio.Queue, executor) -> None:
+        loop = asyncio.get_running_loop()
+        changed = False
+        while True:
+            path = await queue.get()
+            try:
+                if path is None:
+                    # stop: refresh for imports not covered yet
+                    if changed and self.table:
+                        await self._refresh(loop, executor)
+                    return
+                t0 = time.time()
+                try:
+                    result = await loop.run_in_executor(executor, _ingest_file, path, *self.load_args)
+                except Exception:
+                    logger.exception(f"[watch] import failed: {os.path.basename(path)}")
+                    self.stats["failed"] += 1
+                    result = None
+                if result is not None and result.get("skipped"):
+                    logger.info(f"[watch] skipped {os.path.basename(path)}: {result.get('reason')}")
+                    self.stats["skipped"] += 1
+                elif result is not None:
+                    logger.info(f"[watch] imported {os.path.basename(path)}: {result.get('inserted', 0)} records "
+                                f"in {time.time() - t0:.1f}s")
+                    self.stats["imported"] += 1
+                    changed = True
+
+                if changed and queue.empty() and self.table:
+                    changed = not await self._refresh(loop, executor)
+            finally:
+                queue.task_done()
+
+    def stop(self) -> None:
+        """Stop polling; queued files are still imported."""
+        if self._stop is not None:
+            self._stop.set()
+
+    async def run(self, once: bool = False) -> dict:
+        """
+        Poll and ingest until stopped (SIGINT/SIGTERM or stop()).
+        With once=True, return after the files present at start are complete and imported.
+        """
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # Windows / not the main thread
+
+        marked = self.load_known_imports()
+        logger.info(f"[watch] {self.folder} ({self.pattern}), {marked} file(s) already imported, "
+                    f"poll={self.interval}s, settle={self.settle}s")
+
+        queue = asyncio.Queue()
+        executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=setup_worker_logging)
+        try:
+            ingest = asyncio.create_task(self._ingest(queue, executor))
+            await self._poll(queue, once)
+            queue.put_nowait(None)
+            await ingest
+        finally:
+            executor.shutdown()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.remove_signal_handler(sig)
+                except (NotImplementedError, RuntimeError, ValueError):
+                    pass
+        logger.info(f"[watch] stopped: {self.stats}")
+        return dict(self.stats)
+
+
+def watch(folder: str, db_path: str, once: bool = False, **options) -> dict:
+    """Run a FolderWatcher (see its arguments) in a new event loop."""
+    return asyncio.run(FolderWatcher(folder, db_path, **options).run(once))
+
+
+def main() -> None:
+    from src.logging_config import setup_logging
+    setup_logging()
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", required=True, help="Drop folder to watch")
+    ap.add_argument("--db", default="rcn_raw.sqlite", help="Path to SQLite DB")
+    ap.add_argument("--pattern", default="*.gml", help="File name pattern")
+    ap.add_argument("--interval", type=float, default=5.0, help="Seconds between folder polls")
+    ap.add_argument("--settle", type=float, default=10.0, help="Seconds a file must stay unchanged before import")
+    ap.add_argument("--table", default="rcn_wide", help="Wide table refreshed after imports")
+    ap.add_argument("--wide-profile", choices=list(WIDE_PROFILES), default="full", help="Wide table column profile")
+    ap.add_argument("--once", action="store_true", help="Import the files present now, then exit")
+    args = ap.parse_args()
+
+    watch(args.dir, args.db, once=args.once, pattern=args.pattern, interval=args.interval,
+          settle=args.settle, table=args.table, wide_profile=args.wide_profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@ import tempfile
 import os
 import pytest
 
-from src.build_wide import build_wide
+from src.build_wide import build_wide, build_select_sql
 
 
 class TestBuildWide:
@@ -22,7 +22,8 @@ class TestBuildWide:
                 nieruchomosc_fk TEXT,
                 dokument_fk TEXT,
                 cena_transakcji_brutto REAL,
-                data_wpisu TEXT
+                data_wpisu TEXT,
+                import_id INTEGER
             )
         """)
         conn.execute("""
@@ -50,9 +51,12 @@ class TestBuildWide:
         conn.execute("CREATE TABLE raw_budynek (id TEXT PRIMARY KEY, id_budynku TEXT, liczba_kondygnacji INT, liczba_mieszkan INT, rodzaj_budynku TEXT, adres_budynku_fk TEXT)")
         conn.execute("CREATE TABLE raw_lokal (id TEXT PRIMARY KEY, id_lokalu TEXT, numer_lokalu TEXT, funkcja_lokalu TEXT, liczba_izb INT, nr_kondygnacji INT, pow_uzytkowo_lokalu REAL, cena_lokalu_brutto REAL, adres_budynku_z_lokalem_fk TEXT)")
         conn.execute("CREATE TABLE raw_adres (id TEXT PRIMARY KEY, miejscowosc TEXT, ulica TEXT, numer_porzadkowy TEXT)")
+        conn.execute("CREATE TABLE raw_nieruchomosc_dzialka (nieruchomosc_id TEXT, dzialka_id TEXT, import_id INTEGER)")
+        conn.execute("CREATE TABLE raw_nieruchomosc_budynek (nieruchomosc_id TEXT, budynek_id TEXT, import_id INTEGER)")
+        conn.execute("CREATE TABLE raw_nieruchomosc_lokal (nieruchomosc_id TEXT, lokal_id TEXT, import_id INTEGER)")
 
         # Insert test data
-        conn.execute("INSERT INTO raw_transakcja VALUES ('tx1', 'nier1', 'dok1', 100000.0, '2025-01-01')")
+        conn.execute("INSERT INTO raw_transakcja VALUES ('tx1', 'nier1', 'dok1', 100000.0, '2025-01-01', 1)")
         conn.execute("INSERT INTO raw_nieruchomosc VALUES ('nier1', '1', '1', '1/1', 100000.0, '2025-01-01', NULL, NULL, NULL)")
         conn.execute("INSERT INTO raw_dokument VALUES ('dok1', 'DOC/2025', '2025-01-01', 'Notariusz')")
 
@@ -72,8 +76,8 @@ class TestBuildWide:
     def test_build_wide_with_limit(self):
         # Add more rows
         conn = sqlite3.connect(self.temp_db)
-        conn.execute("INSERT INTO raw_transakcja VALUES ('tx2', NULL, NULL, 200000.0, '2025-02-01')")
-        conn.execute("INSERT INTO raw_transakcja VALUES ('tx3', NULL, NULL, 300000.0, '2025-03-01')")
+        conn.execute("INSERT INTO raw_transakcja VALUES ('tx2', NULL, NULL, 200000.0, '2025-02-01', 1)")
+        conn.execute("INSERT INTO raw_transakcja VALUES ('tx3', NULL, NULL, 300000.0, '2025-03-01', 1)")
         conn.commit()
         conn.close()
 
@@ -81,3 +85,21 @@ class TestBuildWide:
 
         assert result["row_count"] == 2
 
+
+    def test_profile_generates_only_needed_joins(self):
+        sql = build_select_sql(None, profile="lokal-sales")
+
+        assert "raw_lokal" in sql and "adr_lok" in sql
+        assert "raw_dokument" not in sql and "adr_bud" not in sql and "raw_dzialka" not in sql
+
+        result = build_wide(self.temp_db, table="test_wide", drop=True, profile="parcels")
+        conn = sqlite3.connect(self.temp_db)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(test_wide)")}
+        conn.close()
+
+        assert result["row_count"] == 1
+        assert "id_dzialki" in columns and "lokal_id" not in columns and "oznaczenie_dokumentu" not in columns
+
+    def test_unknown_profile_raises(self):
+        with pytest.raises(ValueError):
+            build_select_sql(None, profile="nope")
@@ -0,0 +1,131 @@
+"""
+Tests for duplicate transaction detection.
+"""
+import os
+import sqlite3
+import tempfile
+import xml.etree.ElementTree as ET
+
+from src.build_wide import build_wide
+from src.dedup import resolve_duplicates
+from src.load_rcn import load_rcn
+from src.parsers.transakcja import TransakcjaParser
+from src.price_index import build_price_index
+from src.purge import purge_import
+from src.synth import generate_gml
+
+TRANSAKCJA = """
+<rcn:RCN_Transakcja xmlns:rcn="urn:rcn" xmlns:gml="http://www.opengis.net/gml/3.2" gml:id="{fid}">
+    <rcn:oznaczenieTransakcji>{oznaczenie}</rcn:oznaczenieTransakcji>
+    <rcn:cenaTransakcjiBrutto>{cena}</rcn:cenaTransakcjiBrutto>
+</rcn:RCN_Transakcja>
+"""
+
+
+class TestFingerprint:
+    def _fingerprint(self, oznaczenie: str, cena: str, config: dict | None = None) -> str | None:
+        parser = TransakcjaParser(config=config or {})
+        row = parser.parse(ET.fromstring(TRANSAKCJA.format(fid="NS_1_2020-01-01T00-00-00",
+                                                           oznaczenie=oznaczenie, cena=cena)))
+        return dict(zip(parser.columns, row))["fingerprint"]
+
+    def test_normalized_values_match(self):
+        fingerprint = self._fingerprint("Tr 12/2020", "500000.00")
+        assert fingerprint is not None
+        assert self._fingerprint(" tr 12 / 2020 ", "500000", {"include": ["fingerprint"]}) == fingerprint
+        assert self._fingerprint("Tr 12/2020", "500000.01") != fingerprint
+        assert self._fingerprint("Tr 12/2020", "?") is None
+
+
+class TestDedup:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        self.gml = os.path.join(self.temp_dir.name, "a.gml")
+        self.copy = os.path.join(self.temp_dir.name, "b.gml")
+        generate_gml(self.gml, transactions=40, seed=8, resale_ratio=0.5)
+        # another county export with the same transactions under different gml:ids
+        with open(self.gml, encoding="utf-8") as src, open(self.copy, "w", encoding="utf-8") as dst:
+            dst.write(src.read().replace("PL.PZGiK.5346.RCN", "PL.PZGiK.1465.RCN"))
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def test_duplicates_across_imports(self):
+        load_rcn(self.gml, self.db, log_every=0)
+        conn = sqlite3.connect(self.db)
+        assert resolve_duplicates(conn) == {"clusters": 0, "duplicates": 0}
+        build_price_index(conn, transaction_types=None)
+        sales = conn.execute("SELECT COUNT(*) FROM price_index_sales").fetchone()[0]
+        conn.close()
+        build_wide(self.db, drop=True)
+        single = self._wide_transactions()
+
+        # resolved again after the import; the earlier import keeps the canonical rows
+        copy = load_rcn(self.copy, self.db, log_every=0, force=True)
+        conn = sqlite3.connect(self.db)
+        pairs = conn.execute("SELECT transakcja_id, canonical_id FROM transakcja_duplicates").fetchall()
+        assert len(pairs) == 40
+        assert all(d.replace("1465", "5346") == c for d, c in pairs)
+        assert conn.execute("SELECT COUNT(*) FROM price_index_sales").fetchone()[0] == sales
+        conn.close()
+
+        build_wide(self.db, drop=True)
+        conn = sqlite3.connect(self.db)
+        marked = conn.execute("SELECT COUNT(DISTINCT transakcja_id) FROM rcn_wide WHERE duplicate_of IS NOT NULL")
+        assert marked.fetchone()[0] == 40
+        conn.close()
+        build_wide(self.db, drop=True, exclude_duplicates=True)
+        assert self._wide_transactions() == single
+
+        purge_import(self.db, copy["import_id"])
+        conn = sqlite3.connect(self.db)
+        assert conn.execute("SELECT COUNT(*) FROM transakcja_duplicates").fetchone()[0] == 0
+        conn.close()
+
+    def test_update_matches_full_resolve(self):
+        load_rcn(self.gml, self.db, log_every=0)
+        conn = sqlite3.connect(self.db)
+        resolve_duplicates(conn)
+        conn.close()
+        third = os.path.join(self.temp_dir.name, "c.gml")
+        with open(self.gml, encoding="utf-8") as src, open(third, "w", encoding="utf-8") as dst:
+            dst.write(src.read().replace("PL.PZGiK.5346.RCN", "PL.PZGiK.0201.RCN"))
+        load_rcn(self.copy, self.db, log_every=0, force=True)
+        load_rcn(third, self.db, log_every=0, force=True)
+
+        conn = sqlite3.connect(self.db)
+        query = "SELECT transakcja_id, canonical_id, cluster FROM transakcja_duplicates ORDER BY transakcja_id"
+        updated = conn.execute(query).fetchall()
+        assert len(updated) == 80
+        resolve_duplicates(conn)
+        assert conn.execute(query).fetchall() == updated
+        conn.close()
+
+    def test_price_index_follows_canonical_flip(self):
+        load_rcn(self.gml, self.db, log_every=0)
+        conn = sqlite3.connect(self.db)
+        build_price_index(conn, region_by="all", transaction_types=None)
+        resolve_duplicates(conn)
+        sales = conn.execute("SELECT COUNT(*) FROM price_index_sales").fetchone()[0]
+        conn.close()
+        assert sales > 0
+
+        # re-importing the first export makes the copy (earlier import now) canonical
+        load_rcn(self.copy, self.db, log_every=0, force=True)
+        load_rcn(self.gml, self.db, log_every=0, force=True)
+        conn = sqlite3.connect(self.db)
+        query = "SELECT transakcja_id, unit FROM price_index_sales ORDER BY transakcja_id"
+        updated = conn.execute(query).fetchall()
+        assert len(updated) == sales and all("1465" in tx_id for tx_id, _ in updated)
+        index = conn.execute("SELECT * FROM price_index ORDER BY region, month").fetchall()
+        build_price_index(conn, region_by="all", transaction_types=None)
+        assert conn.execute(query).fetchall() == updated
+        assert conn.execute("SELECT * FROM price_index ORDER BY region, month").fetchall() == index
+        conn.close()
+
+    def _wide_transactions(self) -> set:
+        conn = sqlite3.connect(self.db)
+        ids = {row[0] for row in conn.execute("SELECT transakcja_id FROM rcn_wide")}
+        conn.close()
+        return ids
@@ -0,0 +1,81 @@
+"""
+Tests for the direct-to-wide mode.
+"""
+import os
+import sqlite3
+import tempfile
+
+from src.build_wide import build_wide
+from src.direct_wide import build_wide_direct
+from src.load_rcn import load_rcn
+from src.purge import purge_import
+from src.synth import generate_gml
+
+
+GML = """<?xml version="1.0" encoding="UTF-8"?>
+<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:rcn="urn:rcn"
+                       xmlns:xlink="http://www.w3.org/1999/xlink" gml:id="fc">
+<gml:featureMember><rcn:RCN_Transakcja gml:id="tx_1"><rcn:cenaTransakcjiBrutto>100.00</rcn:cenaTransakcjiBrutto>
+<rcn:podstawaPrawna xlink:href="#dok_missing"/><rcn:nieruchomosc xlink:href="#nier_1"/></rcn:RCN_Transakcja></gml:featureMember>
+<gml:featureMember><rcn:RCN_Nieruchomosc gml:id="nier_1"><rcn:lokal xlink:href="#lok_1"/><rcn:lokal xlink:href="#lok_2"/>
+</rcn:RCN_Nieruchomosc></gml:featureMember>
+<gml:featureMember><rcn:RCN_Lokal gml:id="lok_1"><rcn:cenaLokaluBrutto>60.00</rcn:cenaLokaluBrutto></rcn:RCN_Lokal></gml:featureMember>
+<gml:featureMember><rcn:RCN_Lokal gml:id="lok_2"><rcn:cenaLokaluBrutto>40.00</rcn:cenaLokaluBrutto></rcn:RCN_Lokal></gml:featureMember>
+</gml:FeatureCollection>
+"""
+
+
+class TestDirectWide:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gml = os.path.join(self.temp_dir.name, "test.gml")
+        self.db = os.path.join(self.temp_dir.name, "direct.sqlite")
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def _rows(self, db, table, columns):
+        conn = sqlite3.connect(db)
+        rows = sorted(conn.execute(f"SELECT {', '.join(columns)} FROM {table}").fetchall(), key=repr)
+        conn.close()
+        return rows
+
+    def test_same_rows_as_build_wide(self):
+        generate_gml(self.gml, transactions=40, seed=8)
+        raw_db = os.path.join(self.temp_dir.name, "raw.sqlite")
+        load_rcn(self.gml, raw_db, log_every=0)
+        build_wide(raw_db, drop=True)
+
+        result = build_wide_direct(self.gml, self.db, cache_size=20, log_every=0)
+
+        conn = sqlite3.connect(self.db)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(rcn_wide)")]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        imports = conn.execute("SELECT id, status, mode FROM _import_meta").fetchall()
+        conn.close()
+        # no raw tables, only the wide table, import metadata and lookup tables of its coded columns
+        assert {t for t in tables if not t.startswith("dict_")} == {"rcn_wide", "_import_meta", "sqlite_sequence"}
+        assert imports == [(result["import_id"], "completed", "direct_wide")]
+        assert "dict_rodzaj_rynku" in tables
+        assert result["spilled"] > 0
+        assert self._rows(self.db, "rcn_wide", columns) == self._rows(raw_db, "rcn_wide", columns)
+
+    def test_out_of_order_references(self):
+        with open(self.gml, "w", encoding="utf-8") as f:
+            f.write(GML)
+
+        result = build_wide_direct(self.gml, self.db, profile="lokal-sales", log_every=0)
+
+        assert result["deferred"] == 1
+        assert self._rows(self.db, "rcn_wide", ["transakcja_id", "nieruchomosc_id", "lokal_id", "cena_lokalu_brutto"]) == [
+            ("tx_1", "nier_1", "lok_1", 60), ("tx_1", "nier_1", "lok_2", 40)]
+
+    def test_purge_direct_import(self):
+        generate_gml(self.gml, transactions=10, seed=3)
+        first = build_wide_direct(self.gml, self.db, log_every=0)
+        second = build_wide_direct(self.gml, self.db, drop=False, log_every=0)
+        # a direct import is not an import of the file into the raw tables
+        assert not load_rcn(self.gml, self.db, log_every=0).get("skipped")
+
+        purge_import(self.db, second["import_id"])
+        assert self._rows(self.db, "rcn_wide", ["DISTINCT import_id"]) == [(first["import_id"],)]
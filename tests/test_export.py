@@ -0,0 +1,126 @@
+"""
+Tests for table export.
+"""
+import csv
+import gzip
+import json
+import math
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from src.export import export_table
+from src.geometry import to_wgs84
+from src.load_rcn import load_rcn
+from src.synth import generate_gml
+
+
+class TestExport:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        conn = sqlite3.connect(self.db)
+        conn.execute("CREATE TABLE rcn_wide (transakcja_id TEXT, cena REAL, ulica TEXT)")
+        conn.executemany("INSERT INTO rcn_wide VALUES (?, ?, ?)",
+                         [(f"tx{i}", i * 1000.0, None if i % 2 else "Długa, 1") for i in range(25)])
+        conn.commit()
+        conn.close()
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def test_csv_gz_with_rotation(self):
+        out = os.path.join(self.temp_dir.name, "out", "rcn_wide.csv.gz")
+        result = export_table(self.db, "rcn_wide", out, "csv", rotate_rows=10, arraysize=4)
+
+        assert result["rows"] == 25
+        assert [os.path.basename(p) for p in result["files"]] == \
+            ["rcn_wide-00001.csv.gz", "rcn_wide-00002.csv.gz", "rcn_wide-00003.csv.gz"]
+
+        rows = []
+        for path in result["files"]:
+            with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+                part = list(csv.reader(f))
+            assert part[0] == ["transakcja_id", "cena", "ulica"]
+            rows.extend(part[1:])
+        assert len(rows) == 25
+        assert rows[0] == ["tx0", "0.0", "Długa, 1"]
+        assert rows[1][2] == ""
+
+    def test_ndjson(self):
+        out = os.path.join(self.temp_dir.name, "rcn_wide.ndjson")
+        result = export_table(self.db, "rcn_wide", out, "ndjson")
+
+        with open(out, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        assert result["files"] == [out]
+        assert len(records) == 25
+        assert records[1] == {"transakcja_id": "tx1", "cena": 1000.0, "ulica": None}
+
+    def test_unknown_table_raises(self):
+        with pytest.raises(ValueError):
+            export_table(self.db, "nope", os.path.join(self.temp_dir.name, "x.csv"))
+
+
+class TestGeoJsonExport:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gml = os.path.join(self.temp_dir.name, "synthetic.gml")
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        generate_gml(self.gml, transactions=20, seed=5)
+        load_rcn(self.gml, self.db, log_every=0)
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def _read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(record) for record in f.read().split("\x1e") if record.strip()]
+
+    def test_geojsonseq_with_bbox_and_wgs84(self):
+        conn = sqlite3.connect(self.db)
+        min_x, min_y, max_x, max_y, total = conn.execute(
+            "SELECT MIN(min_x), MIN(min_y), MAX(max_x), MAX(max_y), COUNT(*) FROM raw_dzialka").fetchone()
+        conn.close()
+
+        out = os.path.join(self.temp_dir.name, "dzialki.geojsonseq")
+        mid_x = (min_x + max_x) / 2
+        export_table(self.db, "raw_dzialka", out, "geojsonseq", bbox=(min_x, min_y, mid_x, max_y), wgs84=True)
+        features = self._read(out)
+
+        assert 0 < len(features) < total
+        feature = features[0]
+        assert feature["geometry"]["type"] == "Polygon"
+        lon, lat = feature["geometry"]["coordinates"][0][0]
+        assert 19.5 < lon < 22.5 and 49 < lat < 55
+        assert "transakcja_id" in feature["properties"]
+        assert "raw_xml" not in feature["properties"] and "min_x" not in feature["properties"]
+
+    def test_geojsonseq_requires_geometry(self):
+        with pytest.raises(ValueError):
+            export_table(self.db, "raw_transakcja", os.path.join(self.temp_dir.name, "x.geojsonseq"), "geojsonseq")
+
+
+class TestWgs84:
+    def test_central_meridian_and_meridian_arc(self):
+        # northing on the central meridian = k0 * meridian arc length (numeric integration)
+        a, f = 6378137.0, 1 / 298.257222101
+        e2 = f * (2 - f)
+        lat = math.radians(52.0)
+        steps = 2000
+        h = lat / steps
+        arc = sum(a * (1 - e2) / (1 - e2 * math.sin((i + 0.5) * h) ** 2) ** 1.5 * h for i in range(steps))
+
+        points = [[7_500_000.0, 0.999923 * arc]]
+        to_wgs84(points, digits=9)
+
+        assert points[0][0] == pytest.approx(21.0, abs=1e-9)
+        assert points[0][1] == pytest.approx(52.0, abs=1e-7)
+
+    def test_east_of_meridian(self):
+        points = [[7_568_000.0, 5_800_000.0]]
+        to_wgs84(points)
+
+        assert 21.9 < points[0][0] < 22.1 and 52.2 < points[0][1] < 52.4
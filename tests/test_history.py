@@ -0,0 +1,118 @@
+"""
+Tests for version history and as-of wide tables.
+"""
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from src.build_wide import build_wide
+from src.history import split_version, as_of_moment, ensure_history
+from src.load_rcn import load_rcn
+from src.purge import purge_import
+
+NS = "PL.PZGiK.1465.RCN"
+
+GML = """<?xml version="1.0" encoding="UTF-8"?>
+<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:rcn="urn:rcn"
+                       xmlns:xlink="http://www.w3.org/1999/xlink" gml:id="fc">
+{members}
+</gml:FeatureCollection>
+"""
+
+
+def fid(local_id: str, version: str) -> str:
+    return f"{NS}_{local_id}_{version}"
+
+
+def transakcja(version: str, price: int, nier_version: str, local_id: str = "00001-001") -> str:
+    return (f'<gml:featureMember><rcn:RCN_Transakcja gml:id="{fid(local_id, version)}">'
+            f"<rcn:cenaTransakcjiBrutto>{price}</rcn:cenaTransakcjiBrutto>"
+            f'<rcn:nieruchomosc xlink:href="{fid("00002-002", nier_version)}"/>'
+            f"</rcn:RCN_Transakcja></gml:featureMember>")
+
+
+def nieruchomosc(version: str, price: int) -> str:
+    return (f'<gml:featureMember><rcn:RCN_Nieruchomosc gml:id="{fid("00002-002", version)}">'
+            f"<rcn:rodzajNieruchomosci>4</rcn:rodzajNieruchomosci>"
+            f"<rcn:cenaNieruchomosciBrutto>{price}</rcn:cenaNieruchomosciBrutto>"
+            f"</rcn:RCN_Nieruchomosc></gml:featureMember>")
+
+
+class TestHistory:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        # 2020 export: first versions
+        self.import_2020 = self._load("rcn_2020.gml", transakcja("2019-01-10T10-00-00", 300000, "2019-01-10T10-00-00"),
+                                      nieruchomosc("2019-01-10T10-00-00", 300000))
+        # 2022 export: corrected transaction, new nieruchomosc version, one new transaction
+        self.import_2022 = self._load("rcn_2022.gml", transakcja("2021-05-01T08-30-00", 320000, "2021-05-01T08-30-00"),
+                                      nieruchomosc("2021-05-01T08-30-00", 320000),
+                                      transakcja("2021-06-01T00-00-00", 500000, "2021-05-01T08-30-00", "00003-003"))
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def _load(self, name: str, *members: str) -> int:
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(GML.format(members="\n".join(members)))
+        return load_rcn(path, self.db, log_every=0)["import_id"]
+
+    def _versions(self, table: str = "raw_transakcja") -> list[tuple]:
+        conn = sqlite3.connect(self.db)
+        rows = conn.execute(f"SELECT lokalny_id, valid_from, valid_to FROM {table}_history "
+                            f"ORDER BY lokalny_id, valid_from").fetchall()
+        conn.close()
+        return rows
+
+    def _wide(self, as_of: str | None) -> list[tuple]:
+        build_wide(self.db, drop=True, as_of=as_of)
+        conn = sqlite3.connect(self.db)
+        rows = conn.execute("SELECT transakcja_id, cena_transakcji_brutto, nieruchomosc_id FROM rcn_wide "
+                            "ORDER BY transakcja_id").fetchall()
+        conn.close()
+        return rows
+
+    def test_split_version(self):
+        assert split_version(fid("00001-001", "2019-01-10T10-00-00")) == (
+            f"{NS}_00001-001", "2019-01-10T10-00-00", "2019-01-10T10:00:00")
+        assert split_version("tx_1") is None
+        assert as_of_moment("2020-12-31") == "2020-12-31T23:59:59"
+        with pytest.raises(ValueError):
+            as_of_moment("yesterday")
+
+    def test_valid_ranges(self):
+        assert self._versions() == [
+            (f"{NS}_00001-001", "2019-01-10T10:00:00", "2021-05-01T08:30:00"),
+            (f"{NS}_00001-001", "2021-05-01T08:30:00", None),
+            (f"{NS}_00003-003", "2021-06-01T00:00:00", None),
+        ]
+
+    def test_build_wide_as_of(self):
+        assert len(self._wide(None)) == 3  # every version
+        assert self._wide("2018-12-31") == []
+        assert self._wide("2020-06-30") == [
+            (fid("00001-001", "2019-01-10T10-00-00"), 300000, fid("00002-002", "2019-01-10T10-00-00"))]
+        assert [row[1] for row in self._wide("2021-12-31")] == [320000, 500000]
+
+    def test_references_resolve_to_version_valid_then(self):
+        # a later export keeps the old transaction version but points it to the current nieruchomosc
+        self._load("rcn_2023.gml", transakcja("2019-01-10T10-00-00", 300000, "2021-05-01T08-30-00"))
+        rows = self._wide("2020-06-30")
+        assert rows[0][2] == fid("00002-002", "2019-01-10T10-00-00")
+
+    def test_purge_reopens_previous_version(self):
+        purge_import(self.db, self.import_2022)
+        assert self._versions() == [(f"{NS}_00001-001", "2019-01-10T10:00:00", None)]
+        assert self._versions("raw_nieruchomosc") == [(f"{NS}_00002-002", "2019-01-10T10:00:00", None)]
+
+    def test_backfill_for_existing_database(self):
+        conn = sqlite3.connect(self.db)
+        conn.execute("DROP TABLE raw_transakcja_history")
+        assert ensure_history(conn, "raw_transakcja") == 3
+        conn.commit()
+        conn.close()
+        assert len(self._versions()) == 3 and self._versions()[0][2] == "2021-05-01T08:30:00"
@@ -0,0 +1,321 @@
+"""
+Tests for the GML loader.
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+from src.synth import generate_gml
+from src.load_rcn import load_rcn, iter_features, count_features, PARSERS
+from src.build_wide import build_wide
+from src.utils import local
+from src.flush_policy import FlushPolicy, estimate_row_bytes
+from src.wal import connect_reader
+
+
+BAD_GML = """<?xml version="1.0" encoding="UTF-8"?>
+<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:rcn="urn:rcn"
+                       xmlns:xlink="http://www.w3.org/1999/xlink" gml:id="fc">
+{members}
+</gml:FeatureCollection>
+"""
+
+
+class TestLoadRcn:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gml = os.path.join(self.temp_dir.name, "synthetic.gml")
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        generate_gml(self.gml, transactions=20, seed=11)
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def test_profile_stores_timings(self):
+        result = load_rcn(self.gml, self.db, batch_size=50, log_every=0, profile=True)
+
+        conn = sqlite3.connect(self.db)
+        rows = conn.execute(
+            "SELECT feature_type, stage, calls FROM _import_timings WHERE import_id = ?",
+            (result["import_id"],)
+        ).fetchall()
+        conn.close()
+
+        stages = {(ftype, stage): calls for ftype, stage, calls in rows}
+        assert stages[("RCN_Transakcja", "extract")] == result["seen_by_type"]["RCN_Transakcja"]
+        assert ("RCN_Dzialka", "tostring") in stages
+        assert ("_all", "commit") in stages
+        assert all(p.profiler is None for p in PARSERS.values())
+
+    def test_profile_dir_writes_dumps(self):
+        dump_dir = os.path.join(self.temp_dir.name, "prof")
+        result = load_rcn(self.gml, self.db, batch_size=50, log_every=0, profile_dir=dump_dir)
+
+        assert os.path.exists(os.path.join(dump_dir, f"import_{result['import_id']}.prof"))
+        assert os.path.exists(os.path.join(dump_dir, f"import_{result['import_id']}.tracemalloc.txt"))
+
+    def test_metrics_stream(self):
+        metrics_path = os.path.join(self.temp_dir.name, "metrics.jsonl")
+        result = load_rcn(self.gml, self.db, batch_size=50, log_every=0, metrics=metrics_path, metrics_every=40)
+
+        with open(metrics_path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        events = [r["event"] for r in records]
+
+        assert events[0] == "start"
+        assert events[-1] == "end" and records[-1]["status"] == "completed"
+        assert "progress" in events and "flush" in events
+        flush = next(r for r in records if r["event"] == "flush")
+        assert {"flush_seconds", "buffer_rows", "rss_mb", "bytes_read", "pct_bytes", "eta_seconds"} <= set(flush)
+        assert records[-1]["processed"] == result["processed"]
+
+        conn = sqlite3.connect(self.db)
+        processed, stats_json = conn.execute(
+            "SELECT features_processed, stats_json FROM _import_meta WHERE id = ?", (result["import_id"],)
+        ).fetchone()
+        conn.close()
+        assert processed == result["processed"]
+        assert json.loads(stats_json)["inserted"] == result["inserted"]
+
+    def test_parse_issues_are_aggregated(self):
+        members = []
+        for i in range(50):
+            # transakcja without nieruchomosc href
+            members.append(f'<gml:featureMember><rcn:RCN_Transakcja gml:id="tx_{i}"><rcn:nieruchomosc/>'
+                           f'</rcn:RCN_Transakcja></gml:featureMember>')
+            # adres without gml:id
+            members.append('<gml:featureMember><rcn:RCN_Adres><rcn:ulica>X</rcn:ulica></rcn:RCN_Adres></gml:featureMember>')
+        with open(self.gml, "w", encoding="utf-8") as f:
+            f.write(BAD_GML.format(members="\n".join(members)))
+
+        result = load_rcn(self.gml, self.db, batch_size=50, log_every=0)
+
+        conn = sqlite3.connect(self.db)
+        issues = {(ft, field, kind): (count, samples) for ft, field, kind, count, samples in conn.execute(
+            "SELECT feature_type, field, kind, count, sample_ids FROM _import_issues WHERE import_id = ?",
+            (result["import_id"],)
+        )}
+        conn.close()
+
+        assert result["issues"] == 100
+        assert issues[("RCN_Transakcja", "nieruchomosc", "missing_href")][0] == 50
+        assert issues[("RCN_Transakcja", "nieruchomosc", "missing_href")][1].split(",")[:2] == ["tx_0", "tx_1"]
+        assert issues[("RCN_Adres", "gml:id", "missing_id")][0] == 50
+
+    def test_memory_budget_flushes_by_bytes(self):
+        metrics_path = os.path.join(self.temp_dir.name, "metrics.jsonl")
+        result = load_rcn(self.gml, self.db, batch_size=100000, log_every=0,
+                          metrics=metrics_path, memory_budget_mb=0.05)
+
+        with open(metrics_path, encoding="utf-8") as f:
+            flushes = [r for r in map(json.loads, f) if r["event"] == "flush"]
+
+        assert len(flushes) > 1
+        assert sum(r["flush_rows"] for r in flushes) == result["inserted"]
+
+
+    def test_types_filter_matches_full_parse(self):
+        wanted = {"RCN_Transakcja", "RCN_Nieruchomosc", "RCN_Lokal"}
+        full = [(local(e.tag), dict(e.attrib)) for e in iter_features(self.gml)]
+        filtered = [(local(e.tag), dict(e.attrib)) for e in iter_features(self.gml, wanted)]
+
+        assert filtered == [f for f in full if f[0] in wanted]
+        assert count_features(self.gml, wanted) == len(filtered)
+
+    def test_types_and_limit(self):
+        result = load_rcn(self.gml, self.db, batch_size=50, log_every=0, types=["transakcja", "RCN_Lokal"], limit=15)
+
+        assert result["processed"] == 15
+        assert set(result["seen_by_type"]) <= {"RCN_Transakcja", "RCN_Lokal"}
+        conn = sqlite3.connect(self.db)
+        assert conn.execute("SELECT COUNT(*) FROM raw_dzialka").fetchone()[0] == 0
+        conn.close()
+
+    def test_parser_config_projection_and_wide(self):
+        config = {"*": {"exclude": ["raw_xml"]}, "dokument": {"include": ["oznaczenie_dokumentu"]}}
+        result = load_rcn(self.gml, self.db, batch_size=50, log_every=0, parser_config=config)
+        build_wide(self.db, table="wide", drop=True)
+
+        conn = sqlite3.connect(self.db)
+        lokal_columns = {row[1] for row in conn.execute("PRAGMA table_info(raw_lokal)")}
+        dokument_columns = [row[1] for row in conn.execute("PRAGMA table_info(raw_dokument)")]
+        wide_columns = {row[1] for row in conn.execute("PRAGMA table_info(wide)")}
+        wide_rows = conn.execute("SELECT COUNT(*) FROM wide").fetchone()[0]
+        conn.close()
+
+        assert "raw_xml" not in lokal_columns
+        assert dokument_columns == ["id", "oznaczenie_dokumentu", "import_id"]
+        assert "oznaczenie_dokumentu" in wide_columns and "tworca_dokumentu" not in wide_columns
+        assert wide_rows >= result["seen_by_type"]["RCN_Transakcja"]
+
+    def test_coded_attributes_and_lookup_tables(self):
+        load_rcn(self.gml, self.db, log_every=0)
+        build_wide(self.db, drop=True)
+
+        conn = sqlite3.connect(self.db)
+        types = dict(conn.execute("SELECT typeof(rodzaj_rynku), COUNT(*) FROM raw_transakcja GROUP BY 1"))
+        labels = dict(conn.execute("""
+            SELECT r.label, COUNT(*) FROM rcn_wide w JOIN dict_rodzaj_rynku r ON r.code = w.rodzaj_rynku
+             GROUP BY r.label"""))
+        plan = " ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT AVG(cena_transakcji_brutto) FROM rcn_wide "
+            "WHERE rodzaj_rynku = 2 AND rodzaj_nieruchomosci = 4"))
+        wide_rows = conn.execute("SELECT COUNT(*) FROM rcn_wide").fetchone()[0]
+        conn.close()
+
+        assert set(types) == {"integer"}
+        assert set(labels) <= {"pierwotny", "wtórny"} and sum(labels.values()) == wide_rows
+        assert "COVERING INDEX idx_rcn_wide_rynek_agg" in plan
+
+    def test_geometry_metrics_columns(self):
+        load_rcn(self.gml, self.db, log_every=0)
+
+        conn = sqlite3.connect(self.db)
+        for table in ("raw_dzialka", "raw_budynek"):
+            rows = conn.execute(f"""
+                SELECT geom_area, geom_perimeter, centroid_x, centroid_y, min_x, min_y, max_x, max_y
+                  FROM {table}""").fetchall()
+            assert rows
+            for area, perimeter, cx, cy, min_x, min_y, max_x, max_y in rows:
+                # synthetic geometries are squares
+                assert abs(area - (max_x - min_x) * (max_y - min_y)) < 1
+                assert abs(perimeter - 2 * (max_x - min_x + max_y - min_y)) < 0.1
+                assert min_x < cx < max_x and min_y < cy < max_y
+        conn.close()
+
+    def test_reference_check_reports_dangling_and_orphans(self):
+        members = [
+            '<gml:featureMember><rcn:RCN_Transakcja gml:id="tx_1"><rcn:nieruchomosc xlink:href="#nier_1"/>'
+            '<rcn:podstawaPrawna xlink:href="#dok_missing"/></rcn:RCN_Transakcja></gml:featureMember>',
+            '<gml:featureMember><rcn:RCN_Nieruchomosc gml:id="nier_1"><rcn:lokal xlink:href="#lok_missing"/>'
+            '</rcn:RCN_Nieruchomosc></gml:featureMember>',
+            '<gml:featureMember><rcn:RCN_Dokument gml:id="dok_1"/></gml:featureMember>',
+        ]
+        with open(self.gml, "w", encoding="utf-8") as f:
+            f.write(BAD_GML.format(members="\n".join(members)))
+
+        result = load_rcn(self.gml, self.db, log_every=0)
+
+        relations = {(source, field): (dangling, samples)
+                     for source, field, _, _, _, dangling, samples in result["integrity"]["relations"]}
+        orphans = {target: count for target, _, count, _ in result["integrity"]["orphans"]}
+        assert relations[("RCN_Transakcja", "nieruchomosc_fk")] == (0, "")
+        assert relations[("RCN_Transakcja", "dokument_fk")] == (1, "dok_missing")
+        assert relations[("RCN_Nieruchomosc", "lokal")] == (1, "lok_missing")
+        assert orphans["RCN_Dokument"] == 1 and orphans["RCN_Nieruchomosc"] == 0
+
+        conn = sqlite3.connect(self.db)
+        stored = conn.execute("SELECT count, sample_ids FROM _import_integrity WHERE import_id = ? AND name = ?",
+                              (result["import_id"], "RCN_Transakcja.dokument_fk")).fetchone()
+        conn.close()
+        assert stored == (1, "dok_missing")
+
+    def test_reference_check_spill_matches_memory(self):
+        in_memory = load_rcn(self.gml, self.db, log_every=0)["integrity"]
+        spilled = load_rcn(self.gml, self.db, log_every=0, force=True, ref_spill_threshold=50)["integrity"]
+
+        assert spilled == in_memory
+        assert not [f for f in os.listdir(self.temp_dir.name) if f.startswith("rcn_refs_")]
+
+    def test_wal_readers_see_only_completed_imports(self):
+        first = load_rcn(self.gml, self.db, log_every=0, wal=True, commit_seconds=0)
+        build_wide(self.db, drop=True)
+
+        reader = connect_reader(self.db, timeout=1)
+        assert reader.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        reader.execute("BEGIN")
+        before = reader.execute("SELECT COUNT(*) FROM raw_lokal_completed").fetchone()[0]
+        assert before > 0
+        assert reader.execute("SELECT COUNT(*) FROM rcn_wide_completed").fetchone()[0] > 0
+
+        # an open read transaction does not block the next import's commits
+        generate_gml(self.gml, transactions=10, seed=12)
+        load_rcn(self.gml, self.db, log_every=0, force=True, wal=True, commit_seconds=0)
+        assert reader.execute("SELECT COUNT(*) FROM raw_lokal_completed").fetchone()[0] == before
+        reader.commit()
+        reader.close()
+
+        # rows of an import that is not completed are hidden
+        conn = sqlite3.connect(self.db)
+        conn.execute("UPDATE _import_meta SET status = 'pending' WHERE id = ?", (first["import_id"],))
+        conn.commit()
+        hidden = conn.execute("SELECT COUNT(*) FROM raw_lokal WHERE import_id = ?", (first["import_id"],)).fetchone()[0]
+        total = conn.execute("SELECT COUNT(*) FROM raw_lokal").fetchone()[0]
+        assert hidden > 0
+        assert conn.execute("SELECT COUNT(*) FROM raw_lokal_completed").fetchone()[0] == total - hidden
+        conn.close()
+
+
+    def test_index_update_failure_keeps_import_completed(self, monkeypatch):
+        def locked(conn):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(sys.modules["src.load_rcn"], "update_price_index", locked)
+        result = load_rcn(self.gml, self.db, log_every=0)
+
+        conn = sqlite3.connect(self.db)
+        assert conn.execute("SELECT id, status FROM _import_meta").fetchall() == [(result["import_id"], "completed")]
+        assert conn.execute("SELECT COUNT(*) FROM raw_transakcja").fetchone()[0] == 20
+        conn.close()
+
+    def test_failed_import_drops_pending_links(self, monkeypatch):
+        def fail(conn, rows):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        # lokal rows are flushed before nieruchomosc rows and their links
+        monkeypatch.setattr(PARSERS["RCN_Lokal"], "insert_many", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            load_rcn(self.gml, self.db, log_every=0)
+        assert PARSERS["RCN_Nieruchomosc"].take_links() == []
+
+class TestFlushPolicy:
+    def test_row_mode_flushes_at_batch_size(self):
+        policy = FlushPolicy(batch_size=3)
+
+        assert not policy.add(("a",), 2)
+        assert policy.add(("a",), 3)
+        assert policy.buffered_bytes == 0  # bytes are not tracked without a budget
+
+    def test_time_mode_flushes_after_interval(self):
+        policy = FlushPolicy(batch_size=10**9, max_interval=0.0)
+
+        assert not any(policy.add(("a",), 1) for _ in range(255))  # clock is read every 256 rows
+        assert policy.add(("a",), 1)
+        policy.flushed(0.01)
+
+        policy = FlushPolicy(batch_size=10**9, max_interval=3600)
+        assert not any(policy.add(("a",), 1) for _ in range(1000))
+
+    def test_trigger_row_bytes_are_counted(self):
+        row = ("x" * 100,)
+        policy = FlushPolicy(batch_size=2, memory_budget=10**9)
+        assert not policy.add(row, 1)
+        assert policy.add(row, 2)
+        assert policy.buffered_bytes == 2 * estimate_row_bytes(row)
+
+        policy = FlushPolicy(batch_size=10**9, memory_budget=10**9, max_interval=0.0)
+        assert any(policy.add(row, 1) for _ in range(256))
+        assert policy.buffered_bytes == 256 * estimate_row_bytes(row)
+
+    def test_memory_mode_limit_follows_flush_latency(self):
+        policy = FlushPolicy(batch_size=10**9, memory_budget=1_000_000, target_flush_seconds=1.0)
+        row = ("x" * 10_000,)
+        while not policy.add(row, 1):
+            pass
+        assert policy.buffered_bytes >= 1_000_000
+
+        # flush was 4x slower than target -> limit shrinks to ~1/4 of the budget
+        policy.flushed(4.0)
+        assert policy.buffered_bytes == 0
+        assert 200_000 <= policy.limit_bytes <= 300_000
+
+        # fast flushes never push the limit above the budget
+        for _ in range(5):
+            while not policy.add(row, 1):
+                pass
+            policy.flushed(0.001)
+        assert policy.limit_bytes == 1_000_000
@@ -34,6 +34,43 @@ class TestTransakcjaParser:
         assert result[0] == "PL.PZGiK.1234_00000-000_2025-01-01T00-00-00"  # id
         assert float(result[3]) == 500000.00  # cena (may be string or float)
 
+    def test_parse_coded_attributes(self):
+        xml_str = """
+        <rcn:RCN_Transakcja xmlns:rcn="urn:rcn" xmlns:gml="http://www.opengis.net/gml/3.2"
+                            xmlns:xlink="http://www.w3.org/1999/xlink"
+                            gml:id="PL.PZGiK.1234_00000-000_2025-01-01T00-00-00">
+            <rcn:rodzajTransakcji/>
+            <rcn:rodzajRynku>1</rcn:rodzajRynku>
+            <rcn:stronaSprzedajaca>4</rcn:stronaSprzedajaca>
+            <rcn:stronaKupujaca>x</rcn:stronaKupujaca>
+            <rcn:nieruchomosc xlink:href="#PL.PZGiK.1234_22222-222_2025-01-01T00-00-00"/>
+        </rcn:RCN_Transakcja>
+        """
+        result = self.parser.parse(ET.fromstring(xml_str))
+        values = dict(zip(self.parser.columns, result))
+
+        assert values["rodzaj_transakcji"] is None
+        assert values["rodzaj_rynku"] == 1
+        assert values["strona_sprzedajaca"] == 4
+        assert values["strona_kupujaca"] is None  # not a code
+        assert self.parser.diagnostics.counts[("RCN_Transakcja", "stronaKupujaca", "bad_code")] == 1
+
+    def test_empty_href_id_is_reported(self):
+        xml_str = """
+        <rcn:RCN_Transakcja xmlns:rcn="urn:rcn" xmlns:gml="http://www.opengis.net/gml/3.2"
+                            xmlns:xlink="http://www.w3.org/1999/xlink"
+                            gml:id="PL.PZGiK.1234_00000-000_2025-01-01T00-00-00">
+            <rcn:podstawaPrawna xlink:href="#"/>
+            <rcn:nieruchomosc xlink:href="#PL.PZGiK.1234_22222-222_2025-01-01T00-00-00"/>
+        </rcn:RCN_Transakcja>
+        """
+        values = dict(zip(self.parser.columns, self.parser.parse(ET.fromstring(xml_str))))
+
+        assert values["dokument_fk"] is None
+        assert self.parser.diagnostics.counts == {("RCN_Transakcja", "podstawaPrawna", "empty_href_id"): 1}
+        assert self.parser.diagnostics.samples[("RCN_Transakcja", "podstawaPrawna", "empty_href_id")] == [
+            "PL.PZGiK.1234_00000-000_2025-01-01T00-00-00"]
+
     def test_parse_missing_gml_id_returns_none(self):
         xml_str = """
         <rcn:RCN_Transakcja xmlns:rcn="urn:rcn">
@@ -114,7 +151,8 @@ class TestNieruchomoscParser:
 
         assert result is not None
         assert result[0] == "PL.PZGiK.1234_11111-111_2025-01-01T00-00-00"
-        assert result[1] == "4"
+        assert result[1] == 4
+        assert result[2] == 3
         assert result[3] == "1/1"
 
 
@@ -141,6 +179,26 @@ class TestDzialkaParser:
         assert result[1] == "146519_8.0306.31"
         assert result[2] == "8474.00"
 
+    def test_geometry_metrics(self):
+        # posList is northing easting: a 10 x 10 m square with a 2 x 2 m hole
+        xml_str = """
+        <rcn:RCN_Dzialka xmlns:rcn="urn:rcn" xmlns:gml="http://www.opengis.net/gml/3.2"
+                         gml:id="PL.PZGiK.1234_22222-222_2025-01-01T00-00-00">
+            <rcn:geometria><gml:Polygon gml:id="g1">
+                <gml:exterior><gml:LinearRing><gml:posList>
+                    5800000 7500000 5800000 7500010 5800010 7500010 5800010 7500000 5800000 7500000
+                </gml:posList></gml:LinearRing></gml:exterior>
+                <gml:interior><gml:LinearRing><gml:posList>
+                    5800002 7500002 5800004 7500002 5800004 7500004 5800002 7500004 5800002 7500002
+                </gml:posList></gml:LinearRing></gml:interior>
+            </gml:Polygon></rcn:geometria>
+        </rcn:RCN_Dzialka>
+        """
+        parser = DzialkaParser(config={"include": ["geom_area", "geom_perimeter", "centroid_x", "centroid_y"]})
+        result = parser.parse(ET.fromstring(xml_str))
+
+        assert result[1:] == (96.0, 48.0, 7500005.08, 5800005.08)
+
 
 class TestBudynekParser:
     def setup_method(self):
@@ -164,7 +222,7 @@ class TestBudynekParser:
         assert result[0] == "PL.PZGiK.1234_33333-333_2025-01-01T00-00-00"
         assert result[1] == "122222_8.0306.24_BUD"
         assert result[2] == "5"
-        assert result[4] == "110"
+        assert result[4] == 110
 
 
 class TestLokalParser:
@@ -192,6 +250,29 @@ class TestLokalParser:
         assert result[0] == "PL.PZGiK.1234_44444-444_2025-01-01T00-00-00"
         assert result[1] == "122222_8.0306.24_BUD.21_LOK"
         assert result[2] == "21"  # numer_lokalu extracted from idLokalu
-        assert result[3] == "1"   # funkcja_lokalu
+        assert result[3] == 1     # funkcja_lokalu
         assert result[4] == "3"   # liczba_izb
 
+
+
+class TestParserProjection:
+    def test_exclude_raw_xml(self):
+        full = LokalParser(config={})
+        projected = LokalParser(config={"exclude": ["raw_xml"]})
+
+        assert "raw_xml" in full.columns
+        assert "raw_xml" not in projected.columns
+        assert projected.INSERT_SQL.count("?") == len(projected.columns)
+
+        elem = ET.fromstring('<rcn:RCN_Lokal xmlns:rcn="urn:rcn" xmlns:gml="http://www.opengis.net/gml/3.2" gml:id="L1">'
+                             '<rcn:cenaLokaluBrutto>1000</rcn:cenaLokaluBrutto></rcn:RCN_Lokal>')
+        assert len(projected.parse(elem)) == len(full.parse(elem)) - 1
+
+    def test_include_keeps_declared_order(self):
+        parser = LokalParser(config={"include": ["cena_lokalu_brutto", "pow_uzytkowo_lokalu"]})
+
+        assert parser.columns == ("id", "pow_uzytkowo_lokalu", "cena_lokalu_brutto", "import_id")
+
+    def test_unknown_column_raises(self):
+        with pytest.raises(ValueError):
+            DzialkaParser(config={"exclude": ["no_such_column"]})
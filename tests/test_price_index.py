@@ -0,0 +1,90 @@
+"""
+Tests for the repeat-sales price index.
+"""
+import math
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from src.load_rcn import load_rcn
+from src.price_index import build_price_index, solve_index
+from src.purge import purge_import
+from src.synth import generate_gml
+
+
+class TestSolveIndex:
+    def test_recovers_known_index(self):
+        truth = {"2020-01": 0.0, "2020-02": 0.02, "2020-03": 0.05, "2020-05": 0.04}
+        months = sorted(truth)
+        pairs = [(a, b, truth[b] - truth[a]) for a in months for b in months if a < b]
+        # same-month pairs carry no information, unconnected months cannot be placed
+        pairs += [("2020-02", "2020-02", 0.3), ("2021-01", "2021-02", 0.1)]
+
+        index = solve_index(pairs)
+
+        assert set(index) == set(truth)
+        for month, (log_index, count) in index.items():
+            assert log_index == pytest.approx(truth[month], abs=1e-12)
+            assert count == 3
+
+
+class TestPriceIndex:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        self.gml_a = os.path.join(self.temp_dir.name, "a.gml")
+        self.gml_b = os.path.join(self.temp_dir.name, "b.gml")
+        generate_gml(self.gml_a, transactions=600, seed=1, resale_ratio=0.5)
+        generate_gml(self.gml_b, transactions=300, seed=2, resale_ratio=0.5, namespaces=("PL.PZGiK.1465.RCN",))
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def _index(self) -> list:
+        conn = sqlite3.connect(self.db)
+        rows = [(region, month, round(log_index, 9), pairs) for region, month, log_index, pairs in conn.execute(
+            "SELECT region, month, log_index, pairs FROM price_index ORDER BY region, month")]
+        conn.close()
+        return rows
+
+    def _build(self) -> dict:
+        conn = sqlite3.connect(self.db)
+        result = build_price_index(conn, transaction_types=None)
+        conn.close()
+        return result
+
+    def test_growth_and_incremental_update(self):
+        load_rcn(self.gml_a, self.db, log_every=0)
+        result = self._build()
+        only_a = self._index()
+        assert result["pairs"] > 100 and {row[0] for row in only_a} == {"woj_53"}
+        # synthetic resales grow 5% a year
+        first, last = only_a[0], only_a[-1]
+        years = (int(last[1][:4]) - int(first[1][:4])) + (int(last[1][5:]) - int(first[1][5:])) / 12
+        assert 0.02 < math.exp((last[2] - first[2]) / years) - 1 < 0.08
+
+        # the import updates the index: only the new region is solved
+        b = load_rcn(self.gml_b, self.db, log_every=0)
+        updated = self._index()
+        assert {row[0] for row in updated} == {"woj_53", "woj_14"}
+        assert [row for row in updated if row[0] == "woj_53"] == only_a
+        self._build()
+        assert self._index() == updated
+
+        purge_import(self.db, b["import_id"])
+        assert self._index() == only_a
+
+    def test_transaction_type_filter(self):
+        load_rcn(self.gml_a, self.db, log_every=0)
+        conn = sqlite3.connect(self.db)
+        result = build_price_index(conn)
+        free_market = conn.execute("""
+            SELECT COUNT(*) FROM price_index_sales s JOIN raw_transakcja t ON t.id = s.transakcja_id
+             WHERE t.rodzaj_transakcji = 1""").fetchone()[0]
+        conn.close()
+        assert result["sales_added"] == free_market > 0
+
+        with pytest.raises(ValueError):
+            build_price_index(sqlite3.connect(":memory:"))
@@ -0,0 +1,66 @@
+"""
+Tests for purging an import.
+"""
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from src.build_wide import build_wide
+from src.load_rcn import load_rcn
+from src.purge import purge_import
+from src.synth import generate_gml
+
+
+class TestPurge:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        self.gml_a = os.path.join(self.temp_dir.name, "a.gml")
+        self.gml_b = os.path.join(self.temp_dir.name, "b.gml")
+        generate_gml(self.gml_a, transactions=15, seed=1, namespaces=("PL.PZGiK.1001",))
+        generate_gml(self.gml_b, transactions=15, seed=2, namespaces=("PL.PZGiK.2002",))
+        self.import_a = load_rcn(self.gml_a, self.db, log_every=0, profile=True)["import_id"]
+        self.import_b = load_rcn(self.gml_b, self.db, log_every=0)["import_id"]
+        build_wide(self.db, drop=True)
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def _count(self, conn, table, import_id):
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE import_id = ?", (import_id,)).fetchone()[0]
+
+    def test_purge_deletes_in_chunks(self):
+        conn = sqlite3.connect(self.db)
+        kept = self._count(conn, "raw_transakcja", self.import_b)
+
+        result = purge_import(self.db, self.import_a, chunk_size=7)
+
+        for table in ("raw_transakcja", "raw_lokal", "raw_nieruchomosc_dzialka", "rcn_wide", "_import_timings"):
+            assert self._count(conn, table, self.import_a) == 0
+        assert result["deleted"]["raw_transakcja"] == 15
+        assert self._count(conn, "raw_transakcja", self.import_b) == kept
+        status = conn.execute("SELECT status FROM _import_meta WHERE id = ?", (self.import_a,)).fetchone()[0]
+        conn.close()
+        assert status == "purged"
+
+    def test_purge_unknown_import_raises(self):
+        with pytest.raises(ValueError):
+            purge_import(self.db, 999)
+
+    def test_replace_loads_before_purging(self):
+        # a corrected export of import a: fewer transactions, the others delivered again
+        fixed = os.path.join(self.temp_dir.name, "a_fixed.gml")
+        generate_gml(fixed, transactions=10, seed=1, namespaces=("PL.PZGiK.1001",))
+        new_id = load_rcn(fixed, self.db, log_every=0, force=True)["import_id"]
+        conn = sqlite3.connect(self.db)
+        assert self._count(conn, "raw_transakcja", self.import_a) == 5  # the others moved to the new import
+        conn.close()
+        purge_import(self.db, self.import_a)
+
+        conn = sqlite3.connect(self.db)
+        assert self._count(conn, "raw_transakcja", self.import_a) == 0
+        assert self._count(conn, "raw_transakcja", new_id) == 10
+        assert conn.execute("SELECT COUNT(*) FROM raw_transakcja WHERE id LIKE 'PL.PZGiK.1001%'").fetchone()[0] == 10
+        conn.close()
@@ -0,0 +1,61 @@
+"""
+Tests for the streaming record reader.
+"""
+import os
+import sqlite3
+import tempfile
+from datetime import date
+
+import src
+from src.load_rcn import load_rcn
+from src.reader import read, measure_memory
+from src.synth import generate_gml
+
+
+class TestReader:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gml = os.path.join(self.temp_dir.name, "synthetic.gml")
+        generate_gml(self.gml, transactions=20, seed=5)
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def test_records_match_raw_tables(self):
+        db = os.path.join(self.temp_dir.name, "test.sqlite")
+        load_rcn(self.gml, db, log_every=0)
+        records = list(src.read(self.gml))
+
+        conn = sqlite3.connect(db)
+        lokale = {row[0]: row for row in conn.execute(
+            "SELECT id, funkcja_lokalu, liczba_izb, pow_uzytkowo_lokalu, adres_budynku_z_lokalem_fk FROM raw_lokal")}
+        links = {}
+        for nier_id, lokal_id in conn.execute("SELECT nieruchomosc_id, lokal_id FROM raw_nieruchomosc_lokal"):
+            links.setdefault(nier_id, set()).add(lokal_id)
+        counts = {ft: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for ft, table in (("RCN_Lokal", "raw_lokal"), ("RCN_Transakcja", "raw_transakcja"))}
+        conn.close()
+
+        lokal_records = [r for r in records if r.feature_type == "RCN_Lokal"]
+        assert len(lokal_records) == counts["RCN_Lokal"]
+        for r in lokal_records:
+            assert (r.id, r.funkcja_lokalu, r.liczba_izb, r.pow_uzytkowo_lokalu, r.adres_budynku_z_lokalem_fk) \
+                == lokale[r.id]
+            assert isinstance(r.data_wpisu, date)
+            assert not hasattr(r, "raw_xml")
+        for r in records:
+            if r.feature_type == "RCN_Nieruchomosc" and r.lokal_ids:
+                assert set(r.lokal_ids) == links[r.id]
+
+    def test_types_and_projection(self):
+        records = list(read(self.gml, types=["transakcja"],
+                            parser_config={"transakcja": {"include": ["cena_transakcji_brutto"]}}))
+        assert records and {type(r).__name__ for r in records} == {"Transakcja"}
+        assert records[0]._fields == ("id", "cena_transakcji_brutto")
+        assert isinstance(records[0].cena_transakcji_brutto, float)
+
+    def test_records_are_smaller_than_elements(self):
+        memory = measure_memory(self.gml, types=["lokal", "adres"], sample=20)
+        assert set(memory) == {"RCN_Lokal", "RCN_Adres"}
+        for m in memory.values():
+            assert 0 < m["record_bytes"] < m["element_bytes"]
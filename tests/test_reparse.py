@@ -0,0 +1,71 @@
+"""
+Tests for reparse from raw_xml.
+"""
+import os
+import sqlite3
+import tempfile
+
+from src.load_rcn import load_rcn
+from src.reparse import reparse
+from src.synth import generate_gml
+
+
+class TestReparse:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gml = os.path.join(self.temp_dir.name, "synthetic.gml")
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        generate_gml(self.gml, transactions=20, seed=3)
+        self.import_id = load_rcn(self.gml, self.db, log_every=0)["import_id"]
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def _snapshot(self, conn, table, column):
+        return conn.execute(f"SELECT rowid, {column} FROM {table} ORDER BY rowid").fetchall()
+
+    def test_restores_only_changed_columns(self):
+        conn = sqlite3.connect(self.db)
+        expected = self._snapshot(conn, "raw_budynek", "liczba_mieszkan")
+        geometry = self._snapshot(conn, "raw_budynek", "geometria")
+        conn.execute("UPDATE raw_budynek SET liczba_mieszkan = NULL")
+        conn.execute("UPDATE raw_nieruchomosc SET cena_nieruchomosci_brutto = -1 WHERE rowid = 1")
+        conn.execute("DELETE FROM raw_nieruchomosc_budynek")
+        conn.commit()
+
+        result = reparse(self.db, types=["budynek", "nieruchomosc"], import_ids=[self.import_id], workers=1, batch_size=7)
+
+        by_table = {t["table"]: t for t in result["tables"]}
+        assert by_table["raw_budynek"]["changed"] == {"liczba_mieszkan": len(expected)}
+        assert by_table["raw_nieruchomosc"]["changed"] == {"cena_nieruchomosci_brutto": 1}
+        assert self._snapshot(conn, "raw_budynek", "liczba_mieszkan") == expected
+        assert self._snapshot(conn, "raw_budynek", "geometria") == geometry
+        assert conn.execute("SELECT COUNT(*) FROM raw_nieruchomosc_budynek").fetchone()[0] > 0
+        assert conn.execute("SELECT COUNT(*) FROM _reparse_progress").fetchone()[0] == 0
+        conn.close()
+
+    def test_resumes_after_stored_rowid(self):
+        conn = sqlite3.connect(self.db)
+        conn.execute("UPDATE raw_lokal SET liczba_izb = NULL")
+        conn.execute("CREATE TABLE _reparse_progress (table_name TEXT NOT NULL, scope TEXT NOT NULL, "
+                     "last_rowid INTEGER NOT NULL, updated_at TEXT, PRIMARY KEY (table_name, scope))")
+        conn.execute("INSERT INTO _reparse_progress VALUES ('raw_lokal', '*', 3, NULL)")
+        conn.commit()
+
+        reparse(self.db, types=["lokal"], workers=2, batch_size=4)
+
+        restored = conn.execute("SELECT rowid FROM raw_lokal WHERE liczba_izb IS NOT NULL ORDER BY rowid").fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM raw_lokal").fetchone()[0]
+        conn.close()
+        assert [r[0] for r in restored] == list(range(4, total + 1))
+
+    def test_import_filter(self):
+        conn = sqlite3.connect(self.db)
+        conn.execute("UPDATE raw_dzialka SET id_dzialki = NULL")
+        conn.commit()
+
+        result = reparse(self.db, types=["dzialka"], import_ids=[self.import_id + 1], workers=1)
+
+        assert result["tables"][0]["rows"] == 0
+        assert conn.execute("SELECT COUNT(*) FROM raw_dzialka WHERE id_dzialki IS NOT NULL").fetchone()[0] == 0
+        conn.close()
@@ -0,0 +1,74 @@
+"""
+Tests for the FTS5 address search.
+"""
+import os
+import sqlite3
+import tempfile
+
+from src.build_wide import build_wide
+from src.load_rcn import load_rcn
+from src.purge import purge_import
+from src.search import build_address_index, search, match_expression, normalize_street
+
+
+GML = """<?xml version="1.0" encoding="UTF-8"?>
+<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:rcn="urn:rcn"
+                       xmlns:xlink="http://www.w3.org/1999/xlink" gml:id="fc">
+<gml:featureMember><rcn:RCN_Transakcja gml:id="tx_{n}"><rcn:cenaTransakcjiBrutto>{price}</rcn:cenaTransakcjiBrutto>
+<rcn:nieruchomosc xlink:href="#nier_{n}"/></rcn:RCN_Transakcja></gml:featureMember>
+<gml:featureMember><rcn:RCN_Nieruchomosc gml:id="nier_{n}"><rcn:lokal xlink:href="#lok_{n}"/></rcn:RCN_Nieruchomosc></gml:featureMember>
+<gml:featureMember><rcn:RCN_Lokal gml:id="lok_{n}"><rcn:adresBudynkuZLokalem xlink:href="#adr_{n}"/></rcn:RCN_Lokal></gml:featureMember>
+<gml:featureMember><rcn:RCN_Adres gml:id="adr_{n}"><rcn:miejscowosc>{city}</rcn:miejscowosc>
+<rcn:ulica>{street}</rcn:ulica><rcn:numerPorzadkowy>{number}</rcn:numerPorzadkowy></rcn:RCN_Adres></gml:featureMember>
+</gml:FeatureCollection>
+"""
+
+
+class TestSearch:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def _load(self, n, price, city, street, number):
+        path = os.path.join(self.temp_dir.name, f"rcn_{n}.gml")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(GML.format(n=n, price=price, city=city, street=street, number=number))
+        return load_rcn(path, self.db, log_every=0)
+
+    def _search(self, query):
+        conn = sqlite3.connect(self.db)
+        rows = search(conn, query)
+        conn.close()
+        return rows
+
+    def test_normalization(self):
+        assert normalize_street("ul. Łąkowa") == "lakowa"
+        assert normalize_street("ulica Szkolna") == "szkolna"
+        assert match_expression("ul. Szkolna 7") == '"szkolna"* "7"*'
+
+    def test_search_and_incremental_updates(self):
+        self._load(1, "350000.00", "Lublin", "ulica Łąkowa", "7")
+        build_wide(self.db, drop=True)
+        conn = sqlite3.connect(self.db)
+        build_address_index(conn)
+        conn.close()
+
+        rows = self._search("lublin lakowa 7")
+        assert [(r["transakcja_id"], r["cena_transakcji_brutto"], r["via"]) for r in rows] == [("tx_1", 350000.0, "lokal")]
+        assert self._search("Lublin ul. Łąk") == rows
+        assert self._search("Warszawa") == []
+
+        # a later import is indexed incrementally
+        second = self._load(2, "500000.00", "Warszawa", "al. Jerozolimskie", "12A")
+        build_wide(self.db, drop=True)
+        assert [r["transakcja_id"] for r in self._search("Jerozolimskie 12a")] == ["tx_2"]
+
+        # purged addresses leave the index
+        purge_import(self.db, second["import_id"])
+        assert self._search("Jerozolimskie") == []
+        conn = sqlite3.connect(self.db)
+        assert conn.execute("SELECT COUNT(*) FROM adres_fts").fetchone()[0] == 1
+        conn.close()
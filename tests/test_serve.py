@@ -0,0 +1,102 @@
+"""
+Tests for the HTTP query service.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+from src.build_wide import build_wide
+from src.import_meta import mark_indexed
+from src.load_rcn import load_rcn
+from src.search import build_address_index
+from src.serve import make_server
+from src.synth import generate_gml
+
+
+class TestServe:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gml = os.path.join(self.temp_dir.name, "synthetic.gml")
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        generate_gml(self.gml, transactions=30, seed=6)
+        load_rcn(self.gml, self.db, log_every=0)
+        build_wide(self.db, drop=True)
+        conn = sqlite3.connect(self.db)
+        build_address_index(conn)
+        conn.close()
+
+        self.server = make_server(self.db, port=0, pool_size=2, check_interval=0)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def teardown_method(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server.service.close()
+        self.temp_dir.cleanup()
+
+    def _get(self, path: str) -> tuple[int, dict]:
+        try:
+            with urllib.request.urlopen(self.url + path) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as exc:
+            return exc.code, json.loads(exc.read())
+
+    def _first(self, sql: str):
+        conn = sqlite3.connect(self.db)
+        value = conn.execute(sql).fetchone()[0]
+        conn.close()
+        return value
+
+    def test_endpoints(self):
+        tx_id = self._first("SELECT transakcja_id FROM rcn_wide LIMIT 1")
+        status, body = self._get(f"/transactions/{tx_id}")
+        assert status == 200 and body["rows"][0]["transakcja_id"] == tx_id
+        assert self._get("/transactions/nope")[0] == 404
+
+        city = self._first("SELECT miejscowosc FROM raw_adres LIMIT 1")
+        status, body = self._get(f"/search?q={urllib.request.quote(city)}&limit=5")
+        assert status == 200 and 0 < len(body["rows"]) <= 5
+
+        min_x, min_y = self._first("SELECT min_x FROM raw_dzialka"), self._first("SELECT min_y FROM raw_dzialka")
+        status, body = self._get(f"/bbox?bbox={min_x - 1000},{min_y - 1000},{min_x + 1000},{min_y + 1000}")
+        assert status == 200 and body["rows"] and body["rows"][0]["geometria"]["type"] == "Polygon"
+
+        status, body = self._get("/stats?rodzaj_rynku=2&group=year")
+        expected = self._first("SELECT COUNT(DISTINCT transakcja_id) FROM rcn_wide WHERE rodzaj_rynku = 2")
+        assert status == 200 and sum(row["transactions"] for row in body["rows"]) == expected
+
+        assert self._get("/stats?rodzaj_rynku=x")[0] == 400
+        assert self._get("/bbox?bbox=1,2")[0] == 400
+        assert self._get("/nope")[0] == 404
+
+        status, body = self._get("/metrics")
+        assert body["endpoints"]["transactions"]["count"] == 2
+        assert set(body["endpoints"]["stats"]) >= {"p50_ms", "p95_ms", "p99_ms"}
+
+    def test_cache_is_cleared_by_new_import(self):
+        before = self._get("/stats")[1]["rows"][0]["transactions"]
+        assert self._get("/stats")[1]["rows"][0]["transactions"] == before
+        assert self.server.service.cache.hits == 1
+
+        more = os.path.join(self.temp_dir.name, "more.gml")
+        generate_gml(more, transactions=5, seed=7)
+        load_rcn(more, self.db, log_every=0)
+        build_wide(self.db, drop=True)
+
+        assert self._get("/stats")[1]["rows"][0]["transactions"] == before + 5
+
+    def test_generation_changes_after_index_updates(self):
+        conn = sqlite3.connect(self.db)
+        (import_id, indexed_at), = conn.execute("SELECT id, indexed_at FROM _import_meta").fetchall()
+        assert indexed_at is not None  # set by the loader after the derived tables
+        before = self.server.service.data_generation(conn)
+        # the derived tables are updated after complete_import(): their marker changes the generation
+        mark_indexed(conn, import_id)
+        assert self.server.service.data_generation(conn) != before
+        conn.close()
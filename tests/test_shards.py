@@ -0,0 +1,93 @@
+"""
+Tests for sharded storage.
+"""
+import os
+import sqlite3
+import tempfile
+
+from src.build_wide import build_wide
+from src.load_rcn import load_rcn
+from src.shards import shard_key, split_by_shard, load_sharded, attach_shards, merge_shards, list_shards
+from src.synth import generate_gml
+
+NAMESPACES = ("PL.PZGiK.1465.RCN", "PL.PZGiK.1412.RCN", "PL.PZGiK.0201.RCN")
+
+
+class TestShards:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gml = os.path.join(self.temp_dir.name, "rcn.gml")
+        self.shard_dir = os.path.join(self.temp_dir.name, "shards")
+        generate_gml(self.gml, transactions=30, seed=4, namespaces=NAMESPACES)
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def _ids(self, conn, table="rcn_wide"):
+        rows = conn.execute(f"SELECT transakcja_id, lokal_id, dzialka_id, budynek_id FROM {table}").fetchall()
+        return sorted(rows, key=repr)
+
+    def test_shard_key(self):
+        fid = "PL.PZGiK.1465.RCN_00001-001_2018-02-09T11-17-20"
+        assert shard_key(fid) == "PL.PZGiK.1465.RCN"
+        assert shard_key(fid, "voivodeship") == "woj_14"
+        assert shard_key("tx_1") == "unknown"
+        assert shard_key(None, "voivodeship") == "unknown"
+
+    def test_split_keeps_every_feature(self):
+        os.makedirs(self.shard_dir)
+        parts = split_by_shard(self.gml, self.shard_dir, "voivodeship")
+        assert sorted(parts) == ["woj_02", "woj_14"]
+
+        whole = os.path.join(self.temp_dir.name, "whole.sqlite")
+        total = load_rcn(self.gml, whole, log_every=0)["inserted"]
+        inserted = sum(load_rcn(path, os.path.join(self.temp_dir.name, f"{shard}.sqlite"), log_every=0)["inserted"]
+                       for shard, path in parts.items())
+        assert inserted == total
+
+    def test_sharded_pipeline_matches_single_database(self):
+        single = os.path.join(self.temp_dir.name, "single.sqlite")
+        load_rcn(self.gml, single, log_every=0)
+        build_wide(single, drop=True)
+        conn = sqlite3.connect(single)
+        expected = self._ids(conn)
+        conn.close()
+
+        result = load_sharded([self.gml], self.shard_dir, "namespace", workers=2, log_every=0, wide_table="rcn_wide")
+        assert sorted(result["shards"]) == sorted(NAMESPACES)
+        assert sorted(list_shards(self.shard_dir)) == sorted(NAMESPACES)
+        assert not [name for name in os.listdir(self.shard_dir) if name.startswith("_split_")]
+
+        conn = sqlite3.connect(":memory:")
+        assert sorted(attach_shards(conn, self.shard_dir)) == sorted(NAMESPACES)
+        assert self._ids(conn) == expected
+        conn.close()
+
+        merged = os.path.join(self.temp_dir.name, "merged.sqlite")
+        merge_shards(self.shard_dir, merged)
+        conn = sqlite3.connect(merged)
+        assert self._ids(conn) == expected
+        assert conn.execute("SELECT COUNT(DISTINCT shard) FROM rcn_wide").fetchone()[0] == len(NAMESPACES)
+        conn.close()
+
+    def test_reprocessing_touches_only_its_shard(self):
+        load_sharded([self.gml], self.shard_dir, workers=1, log_every=0, wide_table="rcn_wide")
+        merged = os.path.join(self.temp_dir.name, "merged.sqlite")
+        merge_shards(self.shard_dir, merged)
+        untouched = list_shards(self.shard_dir)["PL.PZGiK.0201.RCN"]
+        mtime = os.path.getmtime(untouched)
+
+        county = os.path.join(self.temp_dir.name, "county.gml")
+        generate_gml(county, transactions=5, seed=9, namespaces=("PL.PZGiK.1465.RCN",))
+        result = load_sharded([county], self.shard_dir, workers=1, log_every=0, wide_table="rcn_wide")
+        assert list(result["shards"]) == ["PL.PZGiK.1465.RCN"]
+        assert os.path.getmtime(untouched) == mtime
+
+        merge_shards(self.shard_dir, merged, shards=["PL.PZGiK.1465.RCN"])
+        conn = sqlite3.connect(merged)
+        counts = dict(conn.execute("SELECT shard, COUNT(*) FROM rcn_wide GROUP BY shard"))
+        conn.close()
+        conn = sqlite3.connect(":memory:")
+        attach_shards(conn, self.shard_dir)
+        assert counts == dict(conn.execute("SELECT shard, COUNT(*) FROM rcn_wide GROUP BY shard"))
+        conn.close()
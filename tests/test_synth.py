@@ -0,0 +1,58 @@
+"""
+Tests for synthetic GML generator and benchmark runner.
+"""
+import os
+import sqlite3
+import tempfile
+
+from src.synth import generate_gml
+from src.load_rcn import load_rcn, count_features
+from src.build_wide import build_wide
+from src.bench import run_benchmark, compare
+
+
+class TestSynth:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gml = os.path.join(self.temp_dir.name, "synthetic.gml")
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def test_generate_is_deterministic(self):
+        other = os.path.join(self.temp_dir.name, "other.gml")
+        generate_gml(self.gml, transactions=20, seed=7)
+        generate_gml(other, transactions=20, seed=7)
+
+        with open(self.gml, "rb") as a, open(other, "rb") as b:
+            assert a.read() == b.read()
+
+    def test_generate_target_bytes(self):
+        result = generate_gml(self.gml, target_bytes=200_000, seed=1)
+
+        assert os.path.getsize(self.gml) >= 200_000
+        assert count_features(self.gml) == sum(result["by_type"].values())
+
+    def test_load_and_build_wide(self):
+        result = generate_gml(self.gml, transactions=30, seed=3, max_links=3)
+        load_rcn(self.gml, self.db, batch_size=50, log_every=0)
+        wide = build_wide(self.db, drop=True)
+
+        conn = sqlite3.connect(self.db)
+        n_tx = conn.execute("SELECT COUNT(*) FROM raw_transakcja").fetchone()[0]
+        n_links = conn.execute("SELECT COUNT(*) FROM raw_nieruchomosc_dzialka").fetchone()[0]
+        conn.close()
+
+        assert n_tx == result["transactions"] == 30
+        # every nieruchomosc has at least one dzialka link, multi-link ones fan out in the wide table
+        assert n_links >= 30
+        assert wide["row_count"] >= n_tx
+
+    def test_benchmark_stages(self):
+        generate_gml(self.gml, transactions=10, seed=5)
+        result = run_benchmark(self.gml, self.db, batch_size=20, isolate=False)
+
+        assert set(result["stages"]) == {"count_features", "iter_features", "parse", "insert_many", "build_wide"}
+        assert result["stages"]["count_features"]["features"] == result["stages"]["parse"]["features"]
+        assert compare(result, result) == []
@@ -0,0 +1,84 @@
+"""
+Tests for the watch-folder ingest.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from src.synth import generate_gml
+from src.watch import FolderWatcher, watch
+
+
+class TestWatch:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.drop = os.path.join(self.temp_dir.name, "drop")
+        self.db = os.path.join(self.temp_dir.name, "test.sqlite")
+        os.makedirs(self.drop)
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def test_scan_waits_until_file_settles(self):
+        path = os.path.join(self.drop, "a.gml")
+        with open(path, "w") as f:
+            f.write("<partial")
+        watcher = FolderWatcher(self.drop, self.db, settle=10)
+
+        assert watcher.scan(now=100) == []
+        assert watcher.scan(now=105) == []
+        with open(path, "a") as f:
+            f.write(" more")
+        assert watcher.scan(now=112) == []  # changed: settle time starts again
+        assert watcher.scan(now=121) == []
+        assert watcher.scan(now=122) == [path]
+        assert watcher.scan(now=200) == []  # done, not queued again
+
+    def test_once_imports_new_files_and_refreshes_wide(self):
+        for i in range(2):
+            generate_gml(os.path.join(self.drop, f"county_{i}.gml"), transactions=5, seed=i)
+        open(os.path.join(self.drop, "notes.txt"), "w").close()
+
+        stats = watch(self.drop, self.db, once=True, interval=0.05, settle=0, log_every=0)
+        assert stats == {"imported": 2, "skipped": 0, "failed": 0, "wide_refreshes": 1, "refresh_failed": 0}
+        conn = sqlite3.connect(self.db)
+        assert conn.execute("SELECT COUNT(*) FROM _import_meta WHERE status = 'completed'").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM rcn_wide").fetchone()[0] > 0
+        conn.close()
+
+        # known imports are not queued again
+        generate_gml(os.path.join(self.drop, "county_2.gml"), transactions=5, seed=2)
+        watcher = FolderWatcher(self.drop, self.db, interval=0.05, settle=0, table=None, log_every=0)
+        stats = asyncio.run(watcher.run(once=True))
+        assert stats == {"imported": 1, "skipped": 0, "failed": 0, "wide_refreshes": 0, "refresh_failed": 0}
+
+    def test_failed_refresh_is_retried(self, monkeypatch):
+        module = sys.modules["src.watch"]
+        outcomes = [SystemExit("database is locked"), 42]
+
+        def refresh(db_path, table, profile):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+
+        monkeypatch.setattr(module, "_ingest_file", lambda path, *args: {"inserted": 1})
+        monkeypatch.setattr(module, "_refresh_wide", refresh)
+        watcher = FolderWatcher(self.drop, self.db)
+
+        async def run():
+            queue = asyncio.Queue()
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                ingest = asyncio.create_task(watcher._ingest(queue, executor))
+                queue.put_nowait("a.gml")
+                await queue.join()
+                assert not ingest.done()  # the watcher survives the failed refresh
+                queue.put_nowait(None)
+                await ingest
+
+        asyncio.run(run())
+        assert outcomes == []
+        assert watcher.stats == {"imported": 1, "skipped": 0, "failed": 0, "wide_refreshes": 1, "refresh_failed": 1}